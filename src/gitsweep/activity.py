@@ -0,0 +1,168 @@
+import time
+
+from .base import execute
+
+#: Seconds in each of the units an age can be given in
+AGE_UNITS = {
+    's': 1,
+    'm': 60,
+    'h': 60 * 60,
+    'd': 24 * 60 * 60,
+    'w': 7 * 24 * 60 * 60}
+
+#: What ``git for-each-ref`` writes for each ref, separated by tabs
+ACTIVITY_FORMAT = '%09'.join([
+    '%(refname)', '%(objectname)', '%(committerdate:raw)',
+    '%(authordate:raw)', '%(authoremail)'])
+
+
+class RefActivity(object):
+
+    """
+    When the tip of a branch was made, and by whom.
+
+    ``date`` is when the tip was committed, ``author_date`` when it was
+    written, both in seconds since the epoch. ``author`` is the author's email
+    address.
+
+    """
+    __slots__ = ('sha', 'date', 'author', 'author_date')
+
+    def __init__(self, sha, date, author, author_date):
+        self.sha = sha
+        self.date = date
+        self.author = author
+        self.author_date = author_date
+
+
+def parse_age(value):
+    """
+    Reads an age like ``90d`` and returns it in seconds.
+
+    The units are ``s``, ``m``, ``h``, ``d`` and ``w``, a number on its own is
+    a number of days.
+    """
+    value = value.strip()
+
+    unit = 'd'
+    if value[-1:] in AGE_UNITS:
+        (value, unit) = (value[:-1], value[-1])
+
+    try:
+        amount = int(value)
+    except ValueError:
+        amount = -1
+
+    if amount < 0:
+        raise ValueError('Not an age like 90d: {0}'.format(value + unit))
+
+    return amount * AGE_UNITS[unit]
+
+
+def read_activity(working_dir, remote_name):
+    """
+    Returns a dictionary of branch names to :py:class:`RefActivity`.
+
+    Every branch of ``remote_name`` is read with one ``git for-each-ref``,
+    no matter how many there are.
+    """
+    prefix = 'refs/remotes/{0}/'.format(remote_name)
+
+    (retcode, stdout, stderr) = execute(working_dir,
+        ['for-each-ref', '--format={0}'.format(ACTIVITY_FORMAT), prefix])
+
+    if retcode != 0:
+        raise RuntimeError('Could not read the branches of {0}: {1}'.format(
+            remote_name, stderr.strip()))
+
+    activity = {}
+    for line in stdout.splitlines():
+        fields = line.split('\t')
+        if len(fields) != 5 or not fields[0].startswith(prefix):
+            continue
+
+        (name, sha, date, author_date, author) = fields
+        activity[name[len(prefix):]] = RefActivity(
+            sha, _raw_date(date), author, _raw_date(author_date))
+
+    return activity
+
+
+def stale_refs(refs, activity, older_than=None, author_inactive=None,
+        cat_file=None, now=None):
+    """
+    Returns the ``refs`` that have not seen any work for a while.
+
+    With ``older_than`` a ref is kept if its tip was committed at least that
+    many seconds ago. With ``author_inactive`` it is kept if the author of its
+    tip has not written the tip of any branch in ``activity`` for that long.
+    Given both, a ref has to pass both.
+
+    ``activity`` is what :py:func:`read_activity` returned. A ref that points
+    somewhere else, like one the remote reported with ``git ls-remote``, is
+    looked up in ``cat_file`` instead.
+    """
+    if now is None:
+        now = time.time()
+
+    tips = []
+    for ref in refs:
+        found = activity.get(ref.remote_head)
+        if (found is None or found.sha != ref.sha) and cat_file is not None:
+            found = _commit_activity(cat_file, ref.sha)
+        tips.append((ref, found))
+
+    last_seen = {}
+    if author_inactive is not None:
+        for found in activity.values() + [i[1] for i in tips]:
+            if found is not None:
+                last_seen[found.author] = max(
+                    last_seen.get(found.author, 0), found.author_date)
+
+    stale = []
+    for ref, found in tips:
+        if found is None:
+            # Nothing is known about it, so it is not known to be stale
+            continue
+        if older_than is not None and now - found.date < older_than:
+            continue
+        if (author_inactive is not None and
+                now - last_seen[found.author] < author_inactive):
+            continue
+        stale.append(ref)
+
+    return stale
+
+
+def _commit_activity(cat_file, sha):
+    """
+    Reads the :py:class:`RefActivity` of commit ``sha`` or None.
+    """
+    obj = cat_file.read(sha)
+
+    if obj is None or obj[1] != 'commit':
+        return None
+
+    date = author = author_date = None
+    for line in obj[2].split('\n'):
+        if not line:
+            # The headers end at the first empty line
+            break
+        if line.startswith('committer '):
+            date = _raw_date(' '.join(line.rsplit(' ', 2)[1:]))
+        elif line.startswith('author '):
+            (who, author_date) = line[len('author '):].rsplit(' ', 2)[0:2]
+            author = who[who.rfind('<'):]
+            author_date = _raw_date(author_date)
+
+    if date is None or author is None:
+        return None
+
+    return RefActivity(sha, date, author, author_date)
+
+
+def _raw_date(value):
+    """
+    Returns the seconds since the epoch of a date like ``1330000000 +0100``.
+    """
+    return int(value.split()[0]) if value.strip() else 0
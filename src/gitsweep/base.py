@@ -1,3 +1,13 @@
+from array import array
+from subprocess import Popen, PIPE
+from threading import Thread
+
+from . import timings
+from .patterns import RefMatcher
+from .plumbing import CatFile
+from .refs import RefTable, RefList
+
+
 class MissingRemote(Exception):
 
     """
@@ -16,47 +26,186 @@ class MissingMasterBranch(Exception):
     pass
 
 
+def execute(working_dir, args, input=None):
+    """
+    Runs the git binary with ``args`` in ``working_dir``.
+
+    If ``input`` is given it is written to git's stdin. It is a string, or
+    an iterable of strings that are written as they come so they never have
+    to be held at once. Returns a tuple of ``(retcode, stdout, stderr)``, git
+    failing does not raise.
+    """
+    timings.command(args)
+
+    proc = Popen(['git'] + list(args), cwd=working_dir,
+        stdin=PIPE if input is not None else None, stdout=PIPE, stderr=PIPE)
+
+    if input is None or isinstance(input, basestring):
+        (stdout, stderr) = proc.communicate(input)
+    else:
+        # Feed git from another thread while its output is read, the stdin
+        # is taken away from communicate so it does not close it
+        stdin = proc.stdin
+        proc.stdin = None
+        feeder = Thread(target=_feed, args=(stdin, input))
+        feeder.start()
+        (stdout, stderr) = proc.communicate()
+        feeder.join()
+
+    return (proc.returncode, stdout, stderr)
+
+
+def _feed(stdin, pieces):
+    """
+    Writes each of ``pieces`` to ``stdin`` and closes it.
+    """
+    try:
+        for piece in pieces:
+            stdin.write(piece)
+        stdin.close()
+    except IOError:
+        # Git stopped reading, it will say why when it exits
+        pass
+
+
+def is_ancestor(working_dir, ancestor, descendant):
+    """
+    Returns True if commit ``ancestor`` is reachable from ``descendant``.
+    """
+    (retcode, stdout, stderr) = execute(working_dir,
+        ['merge-base', ancestor, descendant])
+
+    return retcode == 0 and stdout.strip() == ancestor
+
+
 class BaseOperation(object):
 
     """
     Base class for all Git-related operations.
 
+    The remote refs are read from the repository unless a list of
+    ``gitsweep.refs.RefRecord`` is given as ``refs``, for instance the ones
+    the remote reported with ``git ls-remote``, or a
+    :py:class:`gitsweep.refs.RefTable` that is shared with other operations.
     """
-    def __init__(self, repo, remote_name='origin', master_branch='master'):
+    def __init__(self, repo, remote_name='origin', master_branch='master',
+            refs=None):
         self.repo = repo
         self.remote_name = remote_name
         self.master_branch = master_branch
+        self.refs = refs
+        self._cat_file = None
+        self._remote = None
+        self._table = None
+
+    @property
+    def cat_file(self):
+        """
+        A :py:class:`gitsweep.plumbing.CatFile` for looking up objects.
 
-    def _filtered_remotes(self, origin, skip=[]):
+        It is kept open until :py:meth:`close` is called.
         """
-        Returns a list of remote refs, skipping ones you don't need.
+        if self._cat_file is None:
+            self._cat_file = CatFile(self.repo.working_dir)
+
+        return self._cat_file
+
+    def close(self):
+        """
+        Stops the git processes that were kept open.
+        """
+        if self._cat_file is not None:
+            self._cat_file.close()
+
+    def ref_table(self, origin):
+        """
+        Returns a :py:class:`gitsweep.refs.RefTable` of the refs of origin.
+
+        The table given as ``refs`` is returned as it is and a list of refs is
+        made into a table once. Otherwise the refs are read from the
+        repository on each call, so every run sees where they are now.
+        """
+        if isinstance(self.refs, RefTable):
+            return self.refs
+
+        if self.refs is not None:
+            if self._table is None:
+                self._table = RefTable.from_records(origin.name, self.refs)
+            return self._table
+
+        return RefTable.read(self.repo.git_dir, origin.name)
+
+    def _filtered_remotes(self, origin, skip=[], include=[], table=None):
+        """
+        Returns the remote refs, skipping ones you don't need.
+
+        ``skip`` and ``include`` are lists of branch names or patterns, see
+        :py:class:`gitsweep.patterns.RefMatcher`. Refs matching ``skip`` are
+        left out and, if there is an ``include``, so are refs that don't match
+        it.
 
         If ``skip`` is empty, it will default to ``['HEAD',
-        self.master_branch]``.
+        self.master_branch]``. The refs are taken from ``table`` if it is
+        given, see :py:meth:`ref_table`, and returned as a
+        :py:class:`gitsweep.refs.RefList` of it.
         """
         if not skip:
             skip = ['HEAD', self.master_branch]
 
-        refs = [i for i in origin.refs if not i.remote_head in skip]
+        skipped = RefMatcher(skip)
+        included = RefMatcher(include)
 
-        return refs
+        if table is None:
+            table = self.ref_table(origin)
 
-    def _master_ref(self, origin):
+        # Only the names that can match an include are looked at, and no
+        # records are made for them.
+        prefixes = (included and included.prefixes()) or ['']
+        starts = []
+        for prefix in sorted(set(prefixes)):
+            if not starts or not prefix.startswith(starts[-1]):
+                starts.append(prefix)
+
+        positions = array('i')
+        for prefix in starts:
+            for position, name in table.positions(prefix):
+                if not skipped.matches(name) and (
+                        not included or included.matches(name)):
+                    positions.append(position)
+
+        return RefList(table, positions)
+
+    def _master_ref(self, origin, table=None):
         """
-        Finds the master ref object that matches master branch.
+        Finds the master ref record that matches master branch.
         """
-        for ref in origin.refs:
-            if ref.remote_head == self.master_branch:
-                return ref
+        if table is None:
+            table = self.ref_table(origin)
 
-        raise MissingMasterBranch(
-            'Could not find ref for {0}'.format(self.master_branch))
+        master = table.get(self.master_branch)
+
+        if master is None:
+            raise MissingMasterBranch(
+                'Could not find ref for {0}'.format(self.master_branch))
+
+        return master
+
+    def _execute(self, args, input=None):
+        """
+        Runs the git binary in this repository, see :py:func:`execute`.
+        """
+        return execute(self.repo.working_dir, args, input=input)
 
     @property
     def _origin(self):
         """
         Gets the remote that references origin by name self.origin_name.
+
+        The remote is only looked for the first time.
         """
+        if self._remote is not None:
+            return self._remote
+
         origin = None
 
         for remote in self.repo.remotes:
@@ -67,4 +216,6 @@ class BaseOperation(object):
             raise MissingRemote('Could not find the remote named {0}'.format(
                 self.remote_name))
 
+        self._remote = origin
+
         return origin
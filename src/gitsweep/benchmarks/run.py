@@ -0,0 +1,271 @@
+import sys
+import json
+import time
+import platform
+import subprocess
+from os import chdir, getcwd, devnull
+from os.path import join, exists
+from shutil import copytree, rmtree
+from tempfile import mkdtemp
+from argparse import ArgumentParser
+from StringIO import StringIO
+
+from git import Repo
+
+from gitsweep.base import execute
+from gitsweep.inspector import Inspector
+from gitsweep.deleter import Deleter
+from gitsweep.cli import CommandLine
+from gitsweep.benchmarks.synthetic import KINDS, DEFAULT_MIX, generate, check
+
+#: Version of the format of the results file
+RESULTS_VERSION = 1
+
+#: What the startup case runs in a new interpreter
+STARTUP_SCRIPT = """
+import sys
+sys.argv = ['git-sweep', '-h']
+from gitsweep.entrypoints import main
+main()
+"""
+
+
+def parse_mix(value):
+    """
+    Reads a mix like ``merged=4,unmerged=3,squash=2,rebased=1``.
+    """
+    mix = {}
+    for item in value.split(','):
+        (kind, share) = item.split('=')
+        if not kind in KINDS:
+            raise ValueError('Unknown kind of branch: {0}'.format(kind))
+        mix[kind] = float(share)
+
+    return mix
+
+
+class Benchmark(object):
+
+    """
+    Times git-sweep against a :py:class:`SyntheticRepository`.
+
+    Each case is run ``repeat`` times. The cases that delete branches run on a
+    copy of the repositories made in ``workdir`` so every run starts from the
+    same branches.
+
+    """
+    def __init__(self, synthetic, workdir, repeat=3, jobs=1):
+        self.synthetic = synthetic
+        self.workdir = workdir
+        self.repeat = repeat
+        self.jobs = jobs
+
+    def cases(self):
+        """
+        Returns a list of ``(name, setup, run)`` for every case.
+
+        ``setup`` is called before each run, outside of the timing, and what
+        it returns is passed to ``run``.
+        """
+        clone_dir = self.synthetic.clone_dir
+
+        def inspector(**kwargs):
+            def run(repo):
+                Inspector(repo, **kwargs).merged_refs()
+            return run
+
+        return [
+            ('inspector.merged_refs', self._repo, inspector(
+                jobs=self.jobs, commit_graph=False)),
+            ('inspector.merged_refs[commit-graph]', self._commit_graph_repo,
+                inspector(jobs=self.jobs)),
+            ('inspector.merged_refs[patch-id]', self._repo, inspector(
+                jobs=self.jobs, detection='patch-id')),
+            ('deleter.remove_remote_refs', self._deleter_setup,
+                self._deleter_run),
+            ('cli.preview', lambda: clone_dir, self._cli_run(
+                ['preview', '--nofetch', '--no-cache', '--jobs',
+                str(self.jobs)])),
+            ('cli.cleanup', self._copy_clone, self._cli_run(
+                ['cleanup', '--force', '--no-cache', '--jobs',
+                str(self.jobs)])),
+            ('cli.startup', lambda: None, self._startup_run)]
+
+    def run(self, only=None):
+        """
+        Runs the cases and returns the results.
+
+        ``only`` is a list of case names to run, all of them by default.
+        """
+        results = []
+        for name, setup, run in self.cases():
+            if only and not name in only:
+                continue
+
+            seconds = []
+            for i in range(self.repeat):
+                arg = setup()
+                start = time.time()
+                run(arg)
+                seconds.append(time.time() - start)
+
+            results.append({
+                'name': name,
+                'seconds': seconds,
+                'best': min(seconds),
+                'mean': sum(seconds) / len(seconds)})
+
+        return results
+
+    def _repo(self):
+        return Repo(self.synthetic.clone_dir)
+
+    def _commit_graph_repo(self):
+        """
+        Writes the commit-graph of the clone so the case really reads it.
+        """
+        clone_dir = self.synthetic.clone_dir
+        check(execute(clone_dir, ['commit-graph', 'write', '--reachable']))
+
+        filename = join(clone_dir, '.git', 'objects', 'info', 'commit-graph')
+        if not exists(filename):
+            raise RuntimeError('No commit-graph was written to {0}'.format(
+                filename))
+
+        return Repo(clone_dir)
+
+    def _copy_clone(self):
+        """
+        Copies the remote and the clone and returns the new clone directory.
+        """
+        copy_dir = mkdtemp(dir=self.workdir)
+        remote_dir = join(copy_dir, 'remote.git')
+        clone_dir = join(copy_dir, 'clone')
+
+        copytree(self.synthetic.remote_dir, remote_dir)
+        copytree(self.synthetic.clone_dir, clone_dir)
+        check(execute(clone_dir, ['remote', 'set-url', 'origin', remote_dir]))
+
+        return clone_dir
+
+    def _deleter_setup(self):
+        """
+        Returns a Deleter for a copy and the refs it should delete.
+        """
+        repo = Repo(self._copy_clone())
+        refs = Inspector(repo, jobs=self.jobs).merged_refs()
+
+        return (Deleter(repo), refs)
+
+    def _deleter_run(self, arg):
+        (deleter, refs) = arg
+        deleter.remove_remote_refs(refs)
+
+    def _startup_run(self, arg):
+        """
+        Starts a new interpreter that shows the help, like a hook calling
+        ``git-sweep -h`` would.
+        """
+        with open(devnull, 'w') as fh:
+            subprocess.check_call([sys.executable, '-c', STARTUP_SCRIPT],
+                stdout=fh)
+
+    def _cli_run(self, args):
+        """
+        Returns a function that runs the command-line in a directory.
+        """
+        def run(directory):
+            cwd = getcwd()
+            stdout = sys.stdout
+            chdir(directory)
+            sys.stdout = StringIO()
+            try:
+                CommandLine(['git-sweep'] + args).run()
+            except SystemExit:
+                pass
+            finally:
+                sys.stdout = stdout
+                chdir(cwd)
+        return run
+
+
+def environment():
+    """
+    Describes what the benchmark ran on so results can be compared.
+    """
+    try:
+        import pkg_resources
+        version = pkg_resources.get_distribution('git-sweep').version
+    except Exception:
+        version = None
+
+    return {
+        'git-sweep': version,
+        'git': execute('.', ['--version'])[1].strip(),
+        'python': platform.python_version(),
+        'platform': platform.platform()}
+
+
+def main(argv=None):
+    """
+    Generates a synthetic repository, runs the benchmark and writes the
+    results as JSON.
+    """
+    parser = ArgumentParser(
+        description='Time git-sweep against a generated repository.')
+    parser.add_argument('--branches', type=int, default=1000,
+        help='Number of branches to generate')
+    parser.add_argument('--commits', type=int, default=1,
+        help='Number of commits on each branch')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+        help='Share of each kind of branch, like merged=4,unmerged=3,'
+            'squash=2,rebased=1')
+    parser.add_argument('--repeat', type=int, default=3,
+        help='Number of times each case is run')
+    parser.add_argument('--jobs', type=int, default=1,
+        help='Number of workers used to inspect the branches')
+    parser.add_argument('--case', action='append', dest='cases',
+        help='Only run this case, can be given more than once')
+    parser.add_argument('--output', default=None,
+        help='File to write the results to instead of stdout')
+    parser.add_argument('--workdir', default=None,
+        help='Directory to generate the repositories in, kept afterwards')
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or mkdtemp(prefix='git-sweep-benchmark-')
+    try:
+        start = time.time()
+        synthetic = generate(workdir, branches=args.branches, mix=args.mix,
+            commits_per_branch=args.commits)
+        generated = time.time() - start
+
+        benchmark = Benchmark(synthetic, workdir, repeat=args.repeat,
+            jobs=args.jobs)
+
+        output = {
+            'version': RESULTS_VERSION,
+            'environment': environment(),
+            'parameters': {
+                'branches': args.branches,
+                'commits': args.commits,
+                'mix': args.mix,
+                'repeat': args.repeat,
+                'jobs': args.jobs},
+            'generate_seconds': generated,
+            'results': benchmark.run(only=args.cases)}
+    finally:
+        if not args.workdir:
+            rmtree(workdir)
+
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(output, fh, indent=2, sort_keys=True)
+    else:
+        json.dump(output, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+    return output
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+from os.path import join
+from subprocess import Popen, PIPE
+
+from gitsweep.base import execute
+
+#: The kinds of branches a synthetic repository can have
+KINDS = ('merged', 'unmerged', 'squash', 'rebased')
+
+#: The default share of each kind of branch
+DEFAULT_MIX = {'merged': 0.4, 'unmerged': 0.3, 'squash': 0.15, 'rebased': 0.15}
+
+
+class SyntheticRepository(object):
+
+    """
+    A generated remote with many branches and a clone that tracks it.
+
+    ``remote_dir`` is a bare repository, ``clone_dir`` a clone of it whose
+    ``origin`` remote points at it. ``kinds`` maps each branch name to the kind
+    of branch it is, see :py:data:`KINDS`:
+
+    merged
+        Merged into master with a merge commit.
+
+    unmerged
+        Has commits that are not in master.
+
+    squash
+        Its changes were added to master as a single new commit.
+
+    rebased
+        Each of its commits was added to master as a new commit with the same
+        patch.
+
+    """
+    def __init__(self, remote_dir, clone_dir, kinds):
+        self.remote_dir = remote_dir
+        self.clone_dir = clone_dir
+        self.kinds = kinds
+
+    def expected_merged(self, detection='cherry'):
+        """
+        Returns the sorted names of the branches git-sweep should find.
+
+        Squashed and rebased branches only count with ``'patch-id'`` detection
+        and a squash only when the branch had one commit, since the single
+        commit on master has a different patch than several small ones.
+        """
+        merged = []
+        for name, (kind, commits) in self.kinds.items():
+            if kind == 'merged':
+                merged.append(name)
+            elif detection == 'patch-id' and (kind == 'rebased' or
+                    (kind == 'squash' and commits == 1)):
+                merged.append(name)
+
+        return sorted(merged)
+
+
+def branch_kinds(branches, mix=None):
+    """
+    Returns a list of ``branches`` kinds in the proportions of ``mix``.
+
+    The kinds are spread evenly through the list, so any run of branches has
+    about the same mix.
+    """
+    mix = mix or DEFAULT_MIX
+    total = float(sum(mix.values()))
+    counts = dict([(kind, 0) for kind in KINDS])
+
+    kinds = []
+    for i in range(branches):
+        # Pick the kind that is furthest behind its share
+        kind = max(KINDS, key=lambda k: (mix.get(k, 0) / total) * (i + 1) -
+            counts[k])
+        counts[kind] += 1
+        kinds.append(kind)
+
+    return kinds
+
+
+def generate(directory, branches=1000, mix=None, commits_per_branch=1):
+    """
+    Generates a :py:class:`SyntheticRepository` inside ``directory``.
+
+    The history is written with ``git fast-import`` so that even 100,000
+    branches only take a couple of minutes. Every branch forks from master and
+    changes a file of its own, which keeps merges free of conflicts.
+    """
+    remote_dir = join(directory, 'remote.git')
+    clone_dir = join(directory, 'clone')
+
+    check(execute(directory, ['init', '--quiet', '--bare', remote_dir]))
+    check(execute(remote_dir, ['symbolic-ref', 'HEAD', 'refs/heads/master']))
+
+    stream = _FastImportStream()
+    stream.commit('master', 'Root commit', [('README', 'synthetic\n')])
+
+    kinds = {}
+    for i, kind in enumerate(branch_kinds(branches, mix)):
+        name = 'branch{0:06d}'.format(i)
+        kinds[name] = (kind, commits_per_branch)
+
+        # Move master along so branches fork from different places
+        stream.commit('master', 'Work on master {0}'.format(i),
+            [('master.txt', 'master {0}\n'.format(i))])
+        fork = stream.head('master')
+
+        # Spread the files over directories so master's trees stay small
+        path = 'branches/{0:03d}/{1}.txt'.format(i // 1000, name)
+
+        changes = []
+        for j in range(commits_per_branch):
+            change = (path,
+                ''.join(['{0} change {1}\n'.format(name, k)
+                    for k in range(j + 1)]))
+            changes.append(change)
+            stream.commit(name, '{0} commit {1}'.format(name, j), [change],
+                parent=fork if j == 0 else None)
+
+        if kind == 'merged':
+            stream.commit('master', 'Merge {0}'.format(name), [changes[-1]],
+                merge=stream.head(name))
+        elif kind == 'squash':
+            stream.commit('master', 'Squashed {0}'.format(name), [changes[-1]])
+        elif kind == 'rebased':
+            for j, change in enumerate(changes):
+                stream.commit('master', 'Rebased {0} commit {1}'.format(
+                    name, j), [change])
+
+    proc = Popen(['git', 'fast-import', '--quiet'], cwd=remote_dir,
+        stdin=PIPE, stdout=PIPE, stderr=PIPE)
+    (stdout, stderr) = proc.communicate(stream.getvalue())
+    if proc.returncode != 0:
+        raise RuntimeError('git fast-import failed: {0}'.format(stderr))
+
+    check(execute(directory, ['clone', '--quiet', remote_dir, clone_dir]))
+
+    return SyntheticRepository(remote_dir, clone_dir, kinds)
+
+
+def check(result):
+    """
+    Raises if the ``execute`` result is for a git command that failed.
+    """
+    (retcode, stdout, stderr) = result
+
+    if retcode != 0:
+        raise RuntimeError(stderr)
+
+    return stdout
+
+
+class _FastImportStream(object):
+
+    """
+    Builds the input for ``git fast-import``.
+
+    """
+    def __init__(self):
+        self._chunks = []
+        self._mark = 0
+        self._heads = {}
+        self._time = 1300000000
+
+    def head(self, branch):
+        """
+        Returns the mark of the last commit on ``branch``.
+        """
+        return self._heads[branch]
+
+    def commit(self, branch, message, changes, parent=None, merge=None):
+        """
+        Adds a commit to ``branch`` with ``changes`` as (path, content) pairs.
+
+        The commit follows the last one on the branch unless a ``parent`` mark
+        is given. ``merge`` is the mark of a second parent.
+        """
+        self._mark += 1
+        self._time += 60
+
+        chunks = [
+            'commit refs/heads/{0}\n'.format(branch),
+            'mark :{0}\n'.format(self._mark),
+            'committer Git Sweep <sweep@example.com> {0} +0000\n'.format(
+                self._time),
+            'data {0}\n{1}\n'.format(len(message), message)]
+
+        parent = parent or self._heads.get(branch)
+        if parent:
+            chunks.append('from :{0}\n'.format(parent))
+        if merge:
+            chunks.append('merge :{0}\n'.format(merge))
+
+        for path, content in changes:
+            chunks.append('M 100644 inline {0}\ndata {1}\n{2}\n'.format(
+                path, len(content), content))
+
+        self._chunks.append(''.join(chunks))
+        self._heads[branch] = self._mark
+
+    def getvalue(self):
+        return ''.join(self._chunks)
@@ -0,0 +1,97 @@
+from os.path import join, exists
+
+from .files import atomic_write
+
+
+class MergeCache(object):
+
+    """
+    Remembers whether a branch tip has been merged into a master tip.
+
+    Whether a branch is merged depends only on these two commits so the answer
+    can be kept between runs. Entries are stored in ``filename``, one per line,
+    oldest first. Once there are more than ``max_entries`` the ones that were
+    used least recently are dropped when saving.
+
+    """
+    def __init__(self, filename, max_entries=100000):
+        self.filename = filename
+        self.max_entries = max_entries
+        self._entries = {}
+        self._clock = 0
+        self._dirty = False
+
+        self._load()
+
+    @classmethod
+    def for_repo(cls, repo, detection='cherry', **kwargs):
+        """
+        Creates the cache that lives in the Git directory of ``repo``.
+
+        Each way of detecting merged refs gets a cache of its own since they
+        can give different answers, see ``detection`` on the Inspector.
+        """
+        filename = 'merge-cache'
+        if detection != 'cherry':
+            filename = '{0}-{1}'.format(filename, detection)
+
+        return cls(join(repo.git_dir, 'git-sweep', filename), **kwargs)
+
+    def get(self, branch_sha, master_sha):
+        """
+        Returns True or False if the answer is known, None if it is not.
+        """
+        entry = self._entries.get((branch_sha, master_sha))
+
+        if entry is None:
+            return None
+
+        self._clock += 1
+        self._entries[(branch_sha, master_sha)] = (entry[0], self._clock)
+
+        return entry[0]
+
+    def set(self, branch_sha, master_sha, merged):
+        """
+        Records whether ``branch_sha`` is merged into ``master_sha``.
+        """
+        self._clock += 1
+        self._entries[(branch_sha, master_sha)] = (bool(merged), self._clock)
+        self._dirty = True
+
+    def save(self):
+        """
+        Writes the cache to disk if anything was added to it.
+        """
+        if not self._dirty:
+            return
+
+        entries = sorted(self._entries.items(), key=lambda i: i[1][1])
+        entries = entries[-self.max_entries:]
+
+        with atomic_write(self.filename) as fh:
+            for (branch_sha, master_sha), (merged, used) in entries:
+                fh.write('{0} {1} {2}\n'.format(
+                    branch_sha, master_sha, int(merged)))
+
+        self._entries = dict(entries)
+        self._dirty = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _load(self):
+        """
+        Reads the entries saved by an earlier run, ignoring damaged lines.
+        """
+        if not exists(self.filename):
+            return
+
+        with open(self.filename) as fh:
+            for line in fh:
+                fields = line.split()
+                if len(fields) != 3 or fields[2] not in ('0', '1'):
+                    continue
+                self._clock += 1
+                self._entries[(fields[0], fields[1])] = (
+                    fields[2] == '1', self._clock)
@@ -1,12 +1,9 @@
 import sys
 from os import getcwd
-from argparse import ArgumentParser
+from os.path import abspath
 from textwrap import dedent
 
-from git import Repo, InvalidGitRepositoryError
-
-from gitsweep.inspector import Inspector
-from gitsweep.deleter import Deleter
+from gitsweep import timings
 
 
 class CommandLine(object):
@@ -15,16 +12,9 @@ class CommandLine(object):
     Main interface to the command-line for running git-sweep.
 
     """
-    parser = ArgumentParser(
-        description='Clean up your Git remote branches.',
-        usage='git-sweep <action> [-h]',
-        )
-
-    _sub_parsers = parser.add_subparsers(title='action',
-        description='Preview changes or perform clean up')
-
     _origin_kwargs = {
-        'help': 'The name of the remote you wish to clean up',
+        'help': 'The name of the remote you wish to clean up, or a '
+            'comma-separated list of remotes',
         'dest': 'origin',
         'default': 'origin'}
 
@@ -34,10 +24,133 @@ class CommandLine(object):
         'default': 'master'}
 
     _skip_kwargs = {
-        'help': 'Comma-separated list of branches to skip',
+        'help': 'Comma-separated list of branches to skip, can be globs like '
+            'release/* or regular expressions like re:^tmp-',
         'dest': 'skips',
         'default': ''}
 
+    _include_kwargs = {
+        'help': 'Comma-separated list of branches or patterns, only the '
+            'branches that match are looked at',
+        'dest': 'includes',
+        'default': ''}
+
+    _patterns_kwargs = {
+        'help': 'File with more patterns, one "skip <pattern>" or "include '
+            '<pattern>" on each line',
+        'dest': 'patterns_file',
+        'metavar': 'FILE',
+        'default': None}
+
+    _narrow_fetch_kwargs = {
+        'help': 'Only fetch the branches, without tags, and prune the ones '
+            'that are gone',
+        'dest': 'narrow_fetch',
+        'action': 'store_true',
+        'default': False}
+
+    _fetch_filter_kwargs = {
+        'help': 'Partial clone filter to fetch with, like blob:none',
+        'dest': 'fetch_filter',
+        'default': None}
+
+    _allow_partial_clone_kwargs = {
+        'help': 'Let --fetch-filter make this a partial clone',
+        'dest': 'allow_partial_clone',
+        'action': 'store_true',
+        'default': False}
+
+    _fetch_depth_kwargs = {
+        'help': 'In a shallow clone, also fetch this many more commits of '
+            'history',
+        'dest': 'fetch_depth',
+        'type': int,
+        'default': None}
+
+    _ls_remote_kwargs = {
+        'help': 'Instead of fetching, list the branches on the remote and '
+            'only fetch the commits that are missing',
+        'dest': 'ls_remote',
+        'action': 'store_true',
+        'default': False}
+
+    _jobs_kwargs = {
+        'help': 'Number of workers used to inspect the branches',
+        'dest': 'jobs',
+        'type': int,
+        'default': 1}
+
+    _delete_jobs_kwargs = {
+        'help': 'Number of pushes that delete branches at once',
+        'dest': 'delete_jobs',
+        'type': int,
+        'default': 4}
+
+    _detect_kwargs = {
+        'help': 'How to treat branches that are not reachable from master, '
+            'patch-id also finds branches that were rebased or cherry-picked',
+        'dest': 'detect',
+        'choices': ['cherry', 'patch-id'],
+        'default': 'cherry'}
+
+    _older_than_kwargs = {
+        'help': 'Only look at branches whose last commit is at least this '
+            'old, like 90d or 12w',
+        'dest': 'older_than',
+        'metavar': 'AGE',
+        'default': None}
+
+    _author_inactive_kwargs = {
+        'help': 'Only look at branches whose author has not committed the '
+            'tip of any branch for this long, like 180d',
+        'dest': 'author_inactive',
+        'metavar': 'AGE',
+        'default': None}
+
+    _no_cache_kwargs = {
+        'help': 'Do not use or update the results saved by earlier runs',
+        'dest': 'cache',
+        'action': 'store_false',
+        'default': True}
+
+    _format_kwargs = {
+        'help': 'How to write the results, json and ndjson write a record '
+            'for each branch as soon as it is decided',
+        'dest': 'format',
+        'choices': ['text', 'json', 'ndjson'],
+        'default': 'text'}
+
+    _timings_kwargs = {
+        'help': 'Show how long each phase took and how many git commands were '
+            'run, on stderr',
+        'dest': 'timings',
+        'action': 'store_true',
+        'default': False}
+
+    _timings_json_kwargs = {
+        'help': 'Write the timings to this file as JSON',
+        'dest': 'timings_json',
+        'default': None}
+
+    _profile_kwargs = {
+        'help': 'Profile the run with cProfile and write the stats to this '
+            'file',
+        'dest': 'profile',
+        'default': None}
+
+    _write_plan_kwargs = {
+        'help': 'Save the merged branches to this file for cleanup --plan',
+        'dest': 'write_plan',
+        'metavar': 'FILE',
+        'default': None}
+
+    _plan_kwargs = {
+        'help': 'Delete the branches saved by preview --write-plan instead '
+            'of fetching and inspecting, if they have not moved',
+        'dest': 'plan',
+        'metavar': 'FILE',
+        'default': None}
+
     _no_fetch_kwargs = {
         'help': 'Do not fetch from the remote',
         'dest': 'fetch',
@@ -45,34 +158,220 @@ class CommandLine(object):
         'default': True}
 
     _preview_usage = dedent('''
-        git-sweep preview [-h] [--nofetch] [--skip SKIPS]
+        git-sweep preview [-h] [--nofetch] [--skip SKIPS] [--include INCLUDES]
+                              [--patterns FILE] [--write-plan FILE]
+                              [--jobs JOBS] [--older-than AGE]
+                              [--author-inactive AGE]
+                              [--no-cache] [--detect {cherry,patch-id}]
+                              [--narrow-fetch] [--fetch-filter FETCH_FILTER]
+                              [--allow-partial-clone]
+                              [--fetch-depth FETCH_DEPTH] [--ls-remote]
+                              [--format {text,json,ndjson}] [--timings]
+                              [--timings-json TIMINGS_JSON] [--profile PROFILE]
                               [--master MASTER] [--origin ORIGIN]
         '''.strip())
 
-    _preview = _sub_parsers.add_parser('preview',
-        help='Preview the branches that will be deleted',
-        usage=_preview_usage)
-    _preview.add_argument('--origin', **_origin_kwargs)
-    _preview.add_argument('--master', **_master_kwargs)
-    _preview.add_argument('--nofetch', **_no_fetch_kwargs)
-    _preview.add_argument('--skip', **_skip_kwargs)
-    _preview.set_defaults(action='preview')
-
     _cleanup_usage = dedent('''
-        git-sweep cleanup [-h] [--nofetch] [--skip SKIPS] [--force]
+        git-sweep cleanup [-h] [--nofetch] [--skip SKIPS] [--include INCLUDES]
+                              [--patterns FILE] [--plan FILE] [--force]
+                              [--jobs JOBS] [--batch-size BATCH_SIZE]
+                              [--atomic] [--delete-jobs DELETE_JOBS]
+                              [--older-than AGE] [--author-inactive AGE]
+                              [--no-cache] [--detect {cherry,patch-id}]
+                              [--narrow-fetch] [--fetch-filter FETCH_FILTER]
+                              [--allow-partial-clone]
+                              [--fetch-depth FETCH_DEPTH] [--ls-remote]
+                              [--format {text,json,ndjson}] [--timings]
+                              [--timings-json TIMINGS_JSON] [--profile PROFILE]
                               [--master MASTER] [--origin ORIGIN]
         '''.strip())
 
-    _cleanup = _sub_parsers.add_parser('cleanup',
-        help='Delete merged branches from the remote',
-        usage=_cleanup_usage)
-    _cleanup.add_argument('--force', action='store_true', default=False,
-        dest='force', help='Do not ask, cleanup immediately')
-    _cleanup.add_argument('--origin', **_origin_kwargs)
-    _cleanup.add_argument('--master', **_master_kwargs)
-    _cleanup.add_argument('--nofetch', **_no_fetch_kwargs)
-    _cleanup.add_argument('--skip', **_skip_kwargs)
-    _cleanup.set_defaults(action='cleanup')
+    _repos_usage = dedent('''
+        git-sweep repos [-h] {preview,cleanup} [PATH [PATH ...]]
+                            [--discover DISCOVER] [--processes PROCESSES]
+                            [--nofetch] [--skip SKIPS] [--include INCLUDES]
+                            [--patterns FILE] [--force] [--jobs JOBS]
+                            [--older-than AGE] [--author-inactive AGE]
+                            [--no-cache] [--detect {cherry,patch-id}]
+                            [--master MASTER] [--origin ORIGIN]
+        '''.strip())
+
+    _serve_usage = dedent('''
+        git-sweep serve [-h] [--socket SOCKET] [--fetch-interval SECONDS]
+                            [--jobs JOBS] [--no-cache]
+                            [--detect {cherry,patch-id}] [--master MASTER]
+                            [--origin ORIGIN]
+        '''.strip())
+
+    _watch_usage = dedent('''
+        git-sweep watch [-h] [--skip SKIPS] [--include INCLUDES]
+                            [--patterns FILE] [--jobs JOBS] [--no-cache]
+                            [--detect {cherry,patch-id}]
+                            [--format {text,ndjson}] [--master MASTER]
+                            [--origin ORIGIN]
+        '''.strip())
+
+    #: The parser for the command-line, see :py:meth:`_build_parser`
+    _parser = None
+
+    @property
+    def parser(self):
+        """
+        The ``ArgumentParser``, built the first time it is needed.
+        """
+        if CommandLine._parser is None:
+            CommandLine._parser = self._build_parser()
+
+        return CommandLine._parser
+
+    @classmethod
+    def _build_parser(cls):
+        """
+        Builds the ``ArgumentParser`` for all of the actions.
+        """
+        from argparse import ArgumentParser
+
+        from gitsweep.activity import parse_age
+
+        parser = ArgumentParser(
+            description='Clean up your Git remote branches.',
+            usage='git-sweep <action> [-h]',
+            )
+
+        sub_parsers = parser.add_subparsers(title='action',
+            description='Preview changes or perform clean up')
+
+        preview = sub_parsers.add_parser('preview',
+            help='Preview the branches that will be deleted',
+            usage=cls._preview_usage)
+        preview.add_argument('--origin', **cls._origin_kwargs)
+        preview.add_argument('--master', **cls._master_kwargs)
+        preview.add_argument('--nofetch', **cls._no_fetch_kwargs)
+        preview.add_argument('--narrow-fetch', **cls._narrow_fetch_kwargs)
+        preview.add_argument('--fetch-filter', **cls._fetch_filter_kwargs)
+        preview.add_argument('--allow-partial-clone',
+            **cls._allow_partial_clone_kwargs)
+        preview.add_argument('--fetch-depth', **cls._fetch_depth_kwargs)
+        preview.add_argument('--ls-remote', **cls._ls_remote_kwargs)
+        preview.add_argument('--skip', **cls._skip_kwargs)
+        preview.add_argument('--include', **cls._include_kwargs)
+        preview.add_argument('--patterns', **cls._patterns_kwargs)
+        preview.add_argument('--jobs', **cls._jobs_kwargs)
+        preview.add_argument('--older-than', type=parse_age,
+            **cls._older_than_kwargs)
+        preview.add_argument('--author-inactive', type=parse_age,
+            **cls._author_inactive_kwargs)
+        preview.add_argument('--no-cache', **cls._no_cache_kwargs)
+        preview.add_argument('--detect', **cls._detect_kwargs)
+        preview.add_argument('--format', **cls._format_kwargs)
+        preview.add_argument('--timings', **cls._timings_kwargs)
+        preview.add_argument('--timings-json', **cls._timings_json_kwargs)
+        preview.add_argument('--profile', **cls._profile_kwargs)
+        preview.add_argument('--write-plan', **cls._write_plan_kwargs)
+        preview.set_defaults(action='preview', plan=None)
+
+        cleanup = sub_parsers.add_parser('cleanup',
+            help='Delete merged branches from the remote',
+            usage=cls._cleanup_usage)
+        cleanup.add_argument('--force', action='store_true', default=False,
+            dest='force', help='Do not ask, cleanup immediately')
+        # A plan knows its remote and master, see _cleanup_plan
+        cleanup.add_argument('--origin',
+            **dict(cls._origin_kwargs, default=None))
+        cleanup.add_argument('--master',
+            **dict(cls._master_kwargs, default=None))
+        cleanup.add_argument('--nofetch', **cls._no_fetch_kwargs)
+        cleanup.add_argument('--narrow-fetch', **cls._narrow_fetch_kwargs)
+        cleanup.add_argument('--fetch-filter', **cls._fetch_filter_kwargs)
+        cleanup.add_argument('--allow-partial-clone',
+            **cls._allow_partial_clone_kwargs)
+        cleanup.add_argument('--fetch-depth', **cls._fetch_depth_kwargs)
+        cleanup.add_argument('--ls-remote', **cls._ls_remote_kwargs)
+        cleanup.add_argument('--skip', **cls._skip_kwargs)
+        cleanup.add_argument('--include', **cls._include_kwargs)
+        cleanup.add_argument('--patterns', **cls._patterns_kwargs)
+        cleanup.add_argument('--jobs', **cls._jobs_kwargs)
+        cleanup.add_argument('--older-than', type=parse_age,
+            **cls._older_than_kwargs)
+        cleanup.add_argument('--author-inactive', type=parse_age,
+            **cls._author_inactive_kwargs)
+        cleanup.add_argument('--no-cache', **cls._no_cache_kwargs)
+        cleanup.add_argument('--detect', **cls._detect_kwargs)
+        cleanup.add_argument('--format', **cls._format_kwargs)
+        cleanup.add_argument('--timings', **cls._timings_kwargs)
+        cleanup.add_argument('--timings-json', **cls._timings_json_kwargs)
+        cleanup.add_argument('--profile', **cls._profile_kwargs)
+        cleanup.add_argument('--batch-size', type=int, default=None,
+            dest='batch_size',
+            help='Number of branches deleted with each push')
+        cleanup.add_argument('--atomic', action='store_true', default=False,
+            dest='atomic',
+            help='Delete all the branches of a push or none of them')
+        cleanup.add_argument('--delete-jobs', **cls._delete_jobs_kwargs)
+        cleanup.add_argument('--plan', **cls._plan_kwargs)
+        cleanup.set_defaults(action='cleanup', write_plan=None)
+
+        repos = sub_parsers.add_parser('repos',
+            help='Preview or clean up many repositories at once',
+            usage=cls._repos_usage)
+        repos.add_argument('repos_action', choices=['preview', 'cleanup'],
+            help='What to do with each repository')
+        repos.add_argument('paths', nargs='*', metavar='PATH',
+            help='The repositories to sweep')
+        repos.add_argument('--discover', dest='discover', default=None,
+            help='Also sweep every repository found below this directory')
+        repos.add_argument('--processes', type=int, default=4,
+            dest='processes',
+            help='Number of repositories swept at the same time')
+        repos.add_argument('--force', action='store_true', default=False,
+            dest='force', help='Do not ask, cleanup immediately')
+        repos.add_argument('--origin', **cls._origin_kwargs)
+        repos.add_argument('--master', **cls._master_kwargs)
+        repos.add_argument('--nofetch', **cls._no_fetch_kwargs)
+        repos.add_argument('--skip', **cls._skip_kwargs)
+        repos.add_argument('--include', **cls._include_kwargs)
+        repos.add_argument('--patterns', **cls._patterns_kwargs)
+        repos.add_argument('--jobs', **cls._jobs_kwargs)
+        repos.add_argument('--older-than', type=parse_age,
+            **cls._older_than_kwargs)
+        repos.add_argument('--author-inactive', type=parse_age,
+            **cls._author_inactive_kwargs)
+        repos.add_argument('--no-cache', **cls._no_cache_kwargs)
+        repos.add_argument('--detect', **cls._detect_kwargs)
+        repos.set_defaults(action='repos')
+
+        serve = sub_parsers.add_parser('serve',
+            help='Keep answering previews on a Unix socket',
+            usage=cls._serve_usage)
+        serve.add_argument('--socket', dest='socket', default=None,
+            help='Where to listen, .git/git-sweep/serve.sock by default')
+        serve.add_argument('--fetch-interval', type=float, default=None,
+            dest='fetch_interval', metavar='SECONDS',
+            help='Fetch from the remote this often')
+        serve.add_argument('--origin', **cls._origin_kwargs)
+        serve.add_argument('--master', **cls._master_kwargs)
+        serve.add_argument('--jobs', **cls._jobs_kwargs)
+        serve.add_argument('--no-cache', **cls._no_cache_kwargs)
+        serve.add_argument('--detect', **cls._detect_kwargs)
+        serve.set_defaults(action='serve')
+
+        watch = sub_parsers.add_parser('watch',
+            help='Show the branches as they become merged',
+            usage=cls._watch_usage)
+        watch.add_argument('--origin', **cls._origin_kwargs)
+        watch.add_argument('--master', **cls._master_kwargs)
+        watch.add_argument('--skip', **cls._skip_kwargs)
+        watch.add_argument('--include', **cls._include_kwargs)
+        watch.add_argument('--patterns', **cls._patterns_kwargs)
+        watch.add_argument('--jobs', **cls._jobs_kwargs)
+        watch.add_argument('--no-cache', **cls._no_cache_kwargs)
+        watch.add_argument('--detect', **cls._detect_kwargs)
+        watch.add_argument('--format', dest='format',
+            choices=['text', 'ndjson'], default='text',
+            help='How to write the changes, ndjson writes a record for each')
+        watch.set_defaults(action='watch')
+
+        return parser
 
     def __init__(self, args):
         self.args = args[1:]
@@ -86,13 +385,15 @@ class CommandLine(object):
                 self.parser.print_help()
                 sys.exit(1)
 
-            self._sweep()
-
-            sys.exit(0)
-        except InvalidGitRepositoryError:
-            sys.stdout.write('This is not a Git repository\n')
+            sys.exit(self._sweep() or 0)
         except Exception as e:
-            sys.stdout.write(str(e) + '\n')
+            # GitPython is only imported once an action needs it
+            from git import InvalidGitRepositoryError
+
+            if isinstance(e, InvalidGitRepositoryError):
+                sys.stdout.write('This is not a Git repository\n')
+            else:
+                sys.stdout.write(str(e) + '\n')
 
         sys.exit(1)
 
@@ -102,65 +403,612 @@ class CommandLine(object):
         """
         args = self.parser.parse_args(self.args)
 
+        if args.action == 'repos':
+            return self._sweep_repos(args)
+        if args.action == 'serve':
+            return self._serve(args)
+        if args.action == 'watch':
+            return self._watch(args)
+
+        recorded = None
+        if args.timings or args.timings_json:
+            recorded = timings.start()
+
+        profiler = None
+        if args.profile:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        try:
+            with timings.phase('total'):
+                self._sweep_remote(args)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(args.profile)
+
+            if recorded is not None:
+                timings.stop()
+                if args.timings:
+                    sys.stderr.write('\n' + recorded.report())
+                if args.timings_json:
+                    import json
+                    with open(args.timings_json, 'w') as fh:
+                        json.dump(recorded.as_dict(), fh, indent=2)
+
+    def _sweep_remote(self, args):
+        """
+        Finds the merged branches of the remote and deletes them.
+        """
+        from git import Repo
+
+        from gitsweep.inspector import Inspector
+        from gitsweep.deleter import Deleter
+        from gitsweep.fetcher import Fetcher
+        from gitsweep.cache import MergeCache
+        from gitsweep.snapshot import RefSnapshot
+        from gitsweep.output import RecordWriter
+        from gitsweep.refs import RefTable
+        from gitsweep.plan import Plan
+
+        if args.plan:
+            return self._cleanup_plan(args)
+
+        args.origin = args.origin or self._origin_kwargs['default']
+        args.master = args.master or self._master_kwargs['default']
+
+        remote_names = [i.strip() for i in args.origin.split(',')
+            if i.strip()]
+        if len(remote_names) > 1:
+            if args.write_plan:
+                raise ValueError(
+                    '--write-plan can only be used with a single remote')
+            return self._sweep_remotes(args, remote_names)
+
         dry_run = True if args.action == 'preview' else False
         fetch = args.fetch
-        skips = [i.strip() for i in args.skips.split(',')]
+        (skips, includes) = self._patterns(args)
+
+        # Records go to stdout, anything meant for people goes to stderr
+        records = None
+        say = sys.stdout.write
+        if args.format != 'text':
+            records = RecordWriter(sys.stdout, format=args.format)
+            say = sys.stderr.write
 
         # Is this a Git repository?
         repo = Repo(getcwd())
 
         remote_name = args.origin
 
-        # Fetch from the remote so that we have the latest commits
-        if fetch:
-            for remote in repo.remotes:
-                if remote.name == remote_name:
-                    sys.stdout.write('Fetching from the remote\n')
-                    remote.fetch()
-
         master_branch = args.master
 
+        fetcher = Fetcher(repo, remote_name=remote_name,
+            master_branch=master_branch)
+
+        refs = None
+        if args.ls_remote:
+            # Ask the remote where its branches are and only fetch the
+            # commits we don't already have
+            say('Listing the branches on the remote\n')
+            with timings.phase('ls-remote'):
+                refs = fetcher.fetch_missing(fetcher.ls_remote())
+        elif fetch:
+            # Fetch from the remote so that we have the latest commits
+            say('Fetching from the remote\n')
+            with timings.phase('fetch'):
+                fetcher.fetch(narrow=args.narrow_fetch,
+                    filter=args.fetch_filter, depth=args.fetch_depth,
+                    partial=args.allow_partial_clone)
+
+        # Read the refs once, the inspector and the deleter share them
+        if refs is None:
+            refs = RefTable.read(repo.git_dir, remote_name)
+        else:
+            refs = RefTable.from_records(remote_name, refs)
+
+        # Remember what we find out for the next run
+        cache = None
+        snapshot = None
+        if args.cache:
+            cache = MergeCache.for_repo(repo, detection=args.detect)
+            snapshot = RefSnapshot.for_repo(
+                repo, remote_name, detection=args.detect)
+
         # Find branches that could be merged
         inspector = Inspector(repo, remote_name=remote_name,
-            master_branch=master_branch)
-        ok_to_delete = inspector.merged_refs(skip=skips)
+            master_branch=master_branch, jobs=args.jobs, cache=cache,
+            snapshot=snapshot, detection=args.detect, refs=refs,
+            older_than=args.older_than, author_inactive=args.author_inactive)
+
+        # Show each branch as soon as it is found, a preview doesn't have to
+        # hold on to any of them.
+        inspected = 0
+        found = 0
+        ok_to_delete = []
+        with timings.phase('inspect'):
+            for ref, merged, method, seconds in inspector.iter_verdicts(
+                    skip=skips, include=includes):
+                inspected += 1
+                if records:
+                    records.write({'type': 'ref', 'remote': remote_name,
+                        'name': ref.remote_head, 'sha': ref.sha,
+                        'merged': merged, 'method': method,
+                        'seconds': seconds})
+
+                if not merged:
+                    continue
+
+                if not found and not records:
+                    sys.stdout.write(
+                        'These branches have been merged into {0}:\n\n'.format(
+                            master_branch))
+                found += 1
+
+                if not records:
+                    sys.stdout.write('  {0}\n'.format(ref.remote_head))
+                    sys.stdout.flush()
+
+                if not dry_run or args.write_plan:
+                    ok_to_delete.append(ref)
+
+        if not found:
+            say('No remote branches are available for cleaning up\n')
+
+        if args.write_plan:
+            Plan(remote_name, master_branch, refs.get(master_branch).sha,
+                ok_to_delete, detection=args.detect).save(args.write_plan)
+
+        deleted = 0
+        failed = 0
+        if not dry_run:
+            deleter = Deleter(repo, remote_name=remote_name,
+                master_branch=master_branch, refs=refs)
+
+            (deleted, failed) = self._delete(args, {remote_name: deleter},
+                ok_to_delete, records, lease=args.ls_remote)
+        elif found and args.write_plan:
+            say('\nTo delete them, run `git-sweep cleanup '
+                '--plan={0}`\n'.format(args.write_plan))
+        elif found:
+            # Replace the first argument with cleanup
+            sysv_copy = self.args[:]
+            sysv_copy[0] = 'cleanup'
+            command = 'git-sweep {0}'.format(' '.join(sysv_copy))
+
+            say('\nTo delete them, run again with `{0}`\n'.format(command))
+
+        if records:
+            records.write({'type': 'summary', 'action': args.action,
+                'remote': remote_name, 'master': master_branch,
+                'inspected': inspected, 'merged': found, 'deleted': deleted,
+                'failed': failed})
+            records.close()
+
+    def _confirm(self, args, say):
+        """
+        Asks whether to delete the branches that were shown, unless forced.
+
+        Returns True if they should be deleted.
+        """
+        if args.force:
+            return True
+
+        say('\nDelete these branches? (y/n) ')
+        if raw_input().lower().startswith('y'):
+            return True
+
+        say('\nOK, aborting.\n')
+        return False
+
+    def _delete(self, args, deleters, refs, records=None, lease=False):
+        """
+        Asks whether to delete ``refs``, unless forced, and deletes them.
+
+        ``deleters`` is a dictionary of remote names to the
+        :py:class:`gitsweep.deleter.Deleter` that deletes their refs, the
+        remotes are done one after the other. Each ref is shown as soon as its
+        push is done, and a terminal is shown how fast the refs are being
+        deleted and how long is left. Returns the number of refs that were and
+        were not deleted.
+        """
+        from gitsweep.output import Progress
+
+        say = sys.stderr.write if records else sys.stdout.write
+
+        if not self._confirm(args, say):
+            return (0, 0)
+
+        say('\n')
+        progress = Progress(len(refs), sys.stderr)
+
+        remote_names = []
+        for ref in refs:
+            if not ref.remote_name in remote_names:
+                remote_names.append(ref.remote_name)
+
+        deleted = 0
+        failed = 0
+        with timings.phase('delete'):
+            for remote_name in remote_names:
+                deleter = deleters[remote_name]
+                for ref, push in deleter.iter_remove_remote_refs(
+                        [i for i in refs if i.remote_name == remote_name],
+                        chunk_size=args.batch_size, atomic=args.atomic,
+                        lease=lease, jobs=args.delete_jobs):
+                    if deleter.deleted(push):
+                        deleted += 1
+                        status = 'done'
+                    else:
+                        failed += 1
+                        status = 'failed'
+                    progress.clear()
+                    if records:
+                        records.write({'type': 'delete',
+                            'remote': ref.remote_name,
+                            'name': ref.remote_head, 'sha': ref.sha,
+                            'deleted': status == 'done'})
+                    else:
+                        sys.stdout.write('  deleting {0} ({1})\n'.format(
+                            ref.name if len(deleters) > 1 else
+                            ref.remote_head, status))
+                        sys.stdout.flush()
+                    progress.update()
+        progress.clear()
+
+        say('\nAll done!\n')
+        say('\nTell everyone to run `git fetch --prune` to sync with '
+            '{0}.\n'.format('these remotes' if len(deleters) > 1 else
+            'this remote'))
+        say('(you don\'t have to, yours is synced)\n')
+
+        return (deleted, failed)
+
+    def _cleanup_plan(self, args):
+        """
+        Deletes the branches of a plan written by ``preview --write-plan``.
+
+        Nothing is fetched or inspected. Each branch is deleted with a lease
+        on the commit it was at when the plan was made, so a branch that
+        moved since then is left alone and reported as failed. If master was
+        moved anywhere but forward since then, nothing is deleted.
+        """
+        from git import Repo
+
+        from gitsweep.base import is_ancestor
+        from gitsweep.deleter import Deleter
+        from gitsweep.output import RecordWriter
+        from gitsweep.plan import Plan
+
+        plan = Plan.load(args.plan)
+
+        for option, value, planned in (
+                ('--origin', args.origin, plan.remote_name),
+                ('--master', args.master, plan.master_branch)):
+            if value is not None and value != planned:
+                raise ValueError('{0} {1} does not match the plan, which was '
+                    'made with {0} {2}'.format(option, value, planned))
 
-        if ok_to_delete:
+        records = None
+        say = sys.stdout.write
+        if args.format != 'text':
+            records = RecordWriter(sys.stdout, format=args.format)
+            say = sys.stderr.write
+
+        repo = Repo(getcwd())
+
+        if plan.refs:
+            deleter = Deleter(repo, remote_name=plan.remote_name,
+                master_branch=plan.master_branch)
+
+            # The branches were only merged into master as it was then
+            master_sha = deleter.remote_master_sha()
+            if master_sha != plan.master_sha and not (master_sha and
+                    is_ancestor(repo.working_dir, plan.master_sha,
+                    master_sha)):
+                raise ValueError('{0} of {1} moved since the plan was made, '
+                    'run preview again'.format(plan.master_branch,
+                    plan.remote_name))
+
+            if not records:
+                sys.stdout.write('These branches of {0} were merged into {1} '
+                    'when the plan was made:\n\n'.format(
+                    plan.remote_name, plan.master_branch))
+                for ref in plan.refs:
+                    sys.stdout.write('  {0}\n'.format(ref.remote_head))
+
+            (deleted, failed) = self._delete(args,
+                {plan.remote_name: deleter}, plan.refs, records, lease=True)
+        else:
+            say('No remote branches are available for cleaning up\n')
+            (deleted, failed) = (0, 0)
+
+        if records:
+            records.write({'type': 'summary', 'action': args.action,
+                'remote': plan.remote_name, 'master': plan.master_branch,
+                'inspected': 0, 'merged': len(plan.refs),
+                'deleted': deleted, 'failed': failed})
+            records.close()
+
+    def _sweep_remotes(self, args, remote_names):
+        """
+        Finds the merged branches of several remotes and deletes them.
+
+        The remotes are fetched at the same time and inspected together, see
+        :py:class:`gitsweep.remotes.MultiRemoteInspector`.
+        """
+        from git import Repo
+
+        from gitsweep.deleter import Deleter
+        from gitsweep.cache import MergeCache
+        from gitsweep.output import RecordWriter
+        from gitsweep.remotes import MultiRemoteInspector, fetch_remotes, \
+            list_remotes
+
+        dry_run = True if args.action == 'preview' else False
+        (skips, includes) = self._patterns(args)
+
+        records = None
+        say = sys.stdout.write
+        if args.format != 'text':
+            records = RecordWriter(sys.stdout, format=args.format)
+            say = sys.stderr.write
+
+        repo = Repo(getcwd())
+
+        master_branch = args.master
+
+        refs = None
+        if args.ls_remote:
+            say('Listing the branches on the remotes\n')
+            with timings.phase('ls-remote'):
+                refs = list_remotes(repo, remote_names,
+                    master_branch=master_branch)
+        elif args.fetch:
+            say('Fetching from the remotes\n')
+            with timings.phase('fetch'):
+                fetch_remotes(repo, remote_names, narrow=args.narrow_fetch,
+                    filter=args.fetch_filter, depth=args.fetch_depth,
+                    partial=args.allow_partial_clone)
+
+        cache = None
+        if args.cache:
+            cache = MergeCache.for_repo(repo, detection=args.detect)
+
+        inspector = MultiRemoteInspector(repo, remote_names,
+            master_branch=master_branch, jobs=args.jobs, cache=cache,
+            detection=args.detect, refs=refs, older_than=args.older_than,
+            author_inactive=args.author_inactive)
+
+        with timings.phase('inspect'):
+            verdicts = inspector.verdicts(skip=skips, include=includes)
+
+        ok_to_delete = [ref for ref, merged in verdicts if merged]
+
+        if records:
+            for ref, merged in verdicts:
+                records.write({'type': 'ref', 'remote': ref.remote_name,
+                    'name': ref.remote_head, 'sha': ref.sha,
+                    'merged': merged, 'method': None, 'seconds': None})
+        elif ok_to_delete:
             sys.stdout.write(
                 'These branches have been merged into {0}:\n\n'.format(
                     master_branch))
-        else:
-            sys.stdout.write('No remote branches are available for '
-                'cleaning up\n')
+            for ref in ok_to_delete:
+                sys.stdout.write('  {0}\n'.format(ref.name))
 
-        for ref in ok_to_delete:
-            sys.stdout.write('  {0}\n'.format(ref.remote_head))
+        if not ok_to_delete:
+            say('No remote branches are available for cleaning up\n')
 
+        deleted = 0
+        failed = 0
         if not dry_run:
-            deleter = Deleter(repo, remote_name=remote_name,
-                master_branch=master_branch)
-
-            if not args.force:
-                sys.stdout.write('\nDelete these branches? (y/n) ')
-                answer = raw_input()
-            if args.force or answer.lower().startswith('y'):
-                sys.stdout.write('\n')
-                for ref in ok_to_delete:
-                    sys.stdout.write('  deleting {0}'.format(ref.remote_head))
-                    deleter.remove_remote_refs([ref])
-                    sys.stdout.write(' (done)\n')
-
-                sys.stdout.write('\nAll done!\n')
-                sys.stdout.write('\nTell everyone to run `git fetch --prune` '
-                    'to sync with this remote.\n')
-                sys.stdout.write('(you don\'t have to, yours is synced)\n')
-            else:
-                sys.stdout.write('\nOK, aborting.\n')
+            deleters = dict([(i, Deleter(repo, remote_name=i,
+                master_branch=master_branch, refs=refs and refs[i]))
+                for i in remote_names])
+
+            (deleted, failed) = self._delete(args, deleters, ok_to_delete,
+                records, lease=args.ls_remote)
         elif ok_to_delete:
             # Replace the first argument with cleanup
             sysv_copy = self.args[:]
             sysv_copy[0] = 'cleanup'
             command = 'git-sweep {0}'.format(' '.join(sysv_copy))
 
+            say('\nTo delete them, run again with `{0}`\n'.format(command))
+
+        if records:
+            records.write({'type': 'summary', 'action': args.action,
+                'remote': ','.join(remote_names), 'master': master_branch,
+                'inspected': len(verdicts), 'merged': len(ok_to_delete),
+                'deleted': deleted, 'failed': failed})
+            records.close()
+
+    def _patterns(self, args):
+        """
+        Returns the lists of skip and include patterns for ``args``.
+
+        They are the ones given with ``--skip`` and ``--include`` followed by
+        the ones in the ``--patterns`` file.
+        """
+        from gitsweep.patterns import load_patterns, split_patterns
+
+        skips = split_patterns(args.skips)
+        includes = split_patterns(args.includes)
+
+        if args.patterns_file:
+            (more_skips, more_includes) = load_patterns(args.patterns_file)
+            skips.extend(more_skips)
+            includes.extend(more_includes)
+
+        return (skips, includes)
+
+    def _serve(self, args):
+        """
+        Answers previews of the remote on a Unix socket until stopped, see
+        :py:class:`gitsweep.server.SweepServer`.
+        """
+        from os import makedirs
+        from os.path import join, dirname, exists
+
+        from gitsweep.server import SweepServer
+
+        index = self._merge_index(args)
+
+        socket_path = args.socket or join(
+            index.repo.git_dir, 'git-sweep', 'serve.sock')
+        if not exists(dirname(abspath(socket_path))):
+            makedirs(dirname(abspath(socket_path)))
+
+        server = SweepServer(socket_path, index,
+            fetch_interval=args.fetch_interval)
+
+        sys.stdout.write('Answering previews of {0} on {1}\n'.format(
+            args.origin, socket_path))
+        sys.stdout.flush()
+
+        try:
+            server.serve()
+        except KeyboardInterrupt:
+            pass
+
+    def _watch(self, args):
+        """
+        Shows the changes to the merged branches as the refs move, see
+        :py:class:`gitsweep.watcher.RefWatcher`.
+        """
+        from gitsweep.watcher import RefWatcher
+        from gitsweep.output import RecordWriter
+
+        (skips, includes) = self._patterns(args)
+
+        watcher = RefWatcher(self._merge_index(args), skip=skips,
+            include=includes)
+
+        records = None
+        say = sys.stdout.write
+        if args.format != 'text':
+            records = RecordWriter(sys.stdout, format=args.format)
+            say = sys.stderr.write
+
+        say('Watching {0} for branches merged into {1}, stop with '
+            'Ctrl-C\n\n'.format(args.origin, args.master))
+
+        try:
+            for added, removed in watcher.watch():
+                for ref, merged in ([(i, False) for i in removed] +
+                        [(i, True) for i in added]):
+                    if records:
+                        records.write({
+                            'type': 'merged' if merged else 'unmerged',
+                            'remote': ref.remote_name,
+                            'name': ref.remote_head, 'sha': ref.sha})
+                    else:
+                        sys.stdout.write('{0} {1}\n'.format(
+                            '+' if merged else '-', ref.remote_head))
+                sys.stdout.flush()
+        except KeyboardInterrupt:
+            pass
+
+    def _merge_index(self, args):
+        """
+        Returns a :py:class:`gitsweep.server.MergeIndex` of the remote in
+        the current directory.
+        """
+        from git import Repo
+
+        from gitsweep.cache import MergeCache
+        from gitsweep.snapshot import RefSnapshot
+        from gitsweep.server import MergeIndex
+
+        repo = Repo(getcwd())
+
+        cache = None
+        snapshot = None
+        if args.cache:
+            cache = MergeCache.for_repo(repo, detection=args.detect)
+            snapshot = RefSnapshot.for_repo(
+                repo, args.origin, detection=args.detect)
+
+        return MergeIndex(repo, remote_name=args.origin,
+            master_branch=args.master, jobs=args.jobs,
+            detection=args.detect, cache=cache, snapshot=snapshot)
+
+    def _sweep_repos(self, args):
+        """
+        Runs git-sweep on many repositories, see
+        :py:class:`gitsweep.orchestrator.Orchestrator`.
+
+        Returns 1 if any of the repositories could not be swept.
+        """
+        from gitsweep.orchestrator import Orchestrator, discover
+
+        dry_run = True if args.repos_action == 'preview' else False
+        (skips, includes) = self._patterns(args)
+
+        paths = [abspath(i) for i in args.paths]
+        if args.discover:
+            paths.extend([i for i in discover(args.discover)
+                if not i in paths])
+
+        if not paths:
+            sys.stdout.write('No repositories to sweep\n')
+            return 1
+
+        orchestrator = Orchestrator(paths, processes=args.processes,
+            remote_name=args.origin, master_branch=args.master, skip=skips,
+            include=includes, fetch=args.fetch, jobs=args.jobs,
+            cache=args.cache, detection=args.detect,
+            older_than=args.older_than, author_inactive=args.author_inactive)
+
+        sys.stdout.write('Sweeping {0} repositories\n'.format(len(paths)))
+
+        # Report each repository as soon as it is done
+        results = []
+        for result in orchestrator.inspect():
+            sys.stdout.write('\n{0}\n'.format(result.path))
+            if not result.ok:
+                sys.stdout.write('  failed: {0}\n'.format(result.error))
+            elif not result.merged:
+                sys.stdout.write('  No remote branches are available for '
+                    'cleaning up\n')
+            for name, sha in result.merged:
+                sys.stdout.write('  {0}\n'.format(name))
+            sys.stdout.flush()
+
+            results.append(result)
+
+        found = sum([len(i.merged) for i in results])
+        errors = len([i for i in results if not i.ok])
+
+        sys.stdout.write('\nFound {0} merged branches in {1} repositories, '
+            '{2} failed\n'.format(found, len(results), errors))
+
+        if found and dry_run:
+            # Replace the action with cleanup, options can come before it
+            sysv_copy = self.args[:]
+            sysv_copy[sysv_copy.index(args.repos_action, 1)] = 'cleanup'
+            command = 'git-sweep {0}'.format(' '.join(sysv_copy))
+
             sys.stdout.write(
                 '\nTo delete them, run again with `{0}`\n'.format(command))
+        elif found and self._confirm(args, sys.stdout.write):
+            deleted = 0
+            for result in orchestrator.delete(results):
+                sys.stdout.write('\n{0}\n'.format(result.path))
+                if not result.ok:
+                    sys.stdout.write('  failed: {0}\n'.format(result.error))
+                    errors += 1
+                for name in result.deleted:
+                    sys.stdout.write('  deleting {0} (done)\n'.format(name))
+                for name in result.failed:
+                    sys.stdout.write('  deleting {0} (failed)\n'.format(name))
+                sys.stdout.flush()
+
+                deleted += len(result.deleted)
+
+            sys.stdout.write('\nDeleted {0} of {1} branches\n'.format(
+                deleted, found))
+
+        return 1 if errors else 0
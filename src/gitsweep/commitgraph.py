@@ -0,0 +1,183 @@
+import mmap
+import struct
+from binascii import unhexlify
+from os.path import join, exists
+
+from .refs import common_dir
+
+#: Parent position meaning there is no parent
+_PARENT_NONE = 0x70000000
+
+#: Set on the second parent when the commit has more than two parents
+_OCTOPUS = 0x80000000
+
+_HASH_LENGTHS = {1: 20, 2: 32}
+
+
+class CommitGraph(object):
+
+    """
+    Reads Git's commit-graph file to answer ancestry questions in process.
+
+    The file is memory-mapped and never changed. Commits are referred to by
+    their position in the file, see :py:meth:`position`.
+
+    Use :py:meth:`open` to create one, it returns None when there is no
+    commit-graph the engine can read.
+
+    """
+    def __init__(self, mm):
+        self._mm = mm
+
+        (signature, version, hash_version, num_chunks, num_bases) = \
+            struct.unpack_from('>4sBBBB', mm, 0)
+
+        if signature != 'CGPH' or version != 1 or num_bases != 0 or \
+                not hash_version in _HASH_LENGTHS:
+            raise ValueError('Unsupported commit-graph file')
+
+        self._hash_length = _HASH_LENGTHS[hash_version]
+
+        chunks = {}
+        for i in range(num_chunks):
+            (chunk_id, offset) = struct.unpack_from('>4sQ', mm, 8 + i * 12)
+            chunks[chunk_id] = offset
+
+        for chunk_id in ('OIDF', 'OIDL', 'CDAT'):
+            if not chunk_id in chunks:
+                raise ValueError('Commit-graph is missing {0}'.format(chunk_id))
+
+        self._fanout = struct.unpack_from('>256I', mm, chunks['OIDF'])
+        self._oids = chunks['OIDL']
+        self._data = chunks['CDAT']
+        self._edges = chunks.get('EDGE')
+        self._data_width = self._hash_length + 16
+
+    def __len__(self):
+        return self._fanout[255]
+
+    @classmethod
+    def open(cls, git_dir):
+        """
+        Returns the commit-graph of the repository in ``git_dir`` or None.
+
+        None is returned if there is no single commit-graph file or if it is
+        in a format this reader does not know. Split commit-graph chains are
+        not read.
+        """
+        filename = join(common_dir(git_dir), 'objects', 'info', 'commit-graph')
+
+        if not exists(filename):
+            return None
+
+        with open(filename, 'rb') as fh:
+            try:
+                mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, EnvironmentError):
+                return None
+
+        try:
+            return cls(mm)
+        except (ValueError, struct.error):
+            mm.close()
+            return None
+
+    def close(self):
+        self._mm.close()
+
+    def position(self, sha):
+        """
+        Returns the position of the commit with hex ``sha`` or None.
+        """
+        binsha = unhexlify(sha)
+        first = ord(binsha[0])
+
+        lo = self._fanout[first - 1] if first else 0
+        hi = self._fanout[first]
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = self._oids + mid * self._hash_length
+            found = self._mm[start:start + self._hash_length]
+            if found < binsha:
+                lo = mid + 1
+            elif found > binsha:
+                hi = mid
+            else:
+                return mid
+
+        return None
+
+    def generation(self, position):
+        """
+        Returns the generation number of a commit, 0 if it was not computed.
+        """
+        offset = self._data + position * self._data_width + \
+            self._hash_length + 8
+        return struct.unpack_from('>I', self._mm, offset)[0] >> 2
+
+    def parents(self, position):
+        """
+        Returns the positions of the parents of a commit.
+        """
+        offset = self._data + position * self._data_width + self._hash_length
+        (first, second) = struct.unpack_from('>II', self._mm, offset)
+
+        parents = []
+        if first != _PARENT_NONE:
+            parents.append(first)
+
+        if second == _PARENT_NONE:
+            return parents
+
+        if not second & _OCTOPUS:
+            parents.append(second)
+            return parents
+
+        # The rest of the parents are listed in the EDGE chunk, the last one
+        # has the high bit set.
+        index = second & ~_OCTOPUS
+        while True:
+            (edge, ) = struct.unpack_from(
+                '>I', self._mm, self._edges + index * 4)
+            parents.append(edge & ~_OCTOPUS)
+            if edge & _OCTOPUS:
+                return parents
+            index += 1
+
+    def reachable(self, start, targets):
+        """
+        Returns the subset of ``targets`` reachable from position ``start``.
+
+        Everything reachable from ``start`` is marked in one walk. Parents
+        always have a lower generation than their children, so the walk does
+        not go below the lowest generation of the targets.
+        """
+        targets = set(targets)
+        generations = [self.generation(i) for i in targets]
+
+        # Commits written by old versions of git have no generation number
+        if not targets or 0 in generations:
+            lowest = 0
+        else:
+            lowest = min(generations)
+
+        found = set()
+        seen = set([start])
+        stack = [start]
+
+        while stack and len(found) < len(targets):
+            position = stack.pop()
+
+            if position in targets:
+                found.add(position)
+
+            for parent in self.parents(position):
+                if parent in seen:
+                    continue
+                seen.add(parent)
+                if lowest and self.generation(parent) < lowest:
+                    continue
+                stack.append(parent)
+
+        return found
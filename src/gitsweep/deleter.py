@@ -1,3 +1,8 @@
+from multiprocessing.pool import ThreadPool
+
+from git import GitCommandError, PushInfo
+
+from . import timings
 from .base import BaseOperation
 
 
@@ -7,16 +12,192 @@ class Deleter(BaseOperation):
     Removes remote branches from the remote.
 
     """
-    def remove_remote_refs(self, refs):
+    #: Number of refs deleted by each push unless told otherwise
+    chunk_size = 500
+
+    #: Number of pushes that run at once unless told otherwise
+    jobs = 4
+
+    def remove_remote_refs(self, refs, chunk_size=None, atomic=False,
+            lease=False, jobs=None):
         """
         Removes the remote refs from the remote.
 
-        ``refs`` should be a lit of ``git.RemoteRefs`` objects.
+        ``refs`` should be a list of ``gitsweep.refs.RefRecord`` objects.
+
+        The refs are deleted with one push for every ``chunk_size`` refs, and
+        up to ``jobs`` of those pushes run at once. If ``atomic`` is True the
+        remote is asked to delete all the refs of a push or none of them.
+
+        With ``lease`` a ref is only deleted if the remote branch still points
+        at the commit in the ref's ``sha``. A branch that moved is reported as
+        not deleted. When the refs were read from the repository, the ones
+        whose remote-tracking branch has moved since are not pushed at all,
+        see :py:meth:`moved_refs`.
+
+        Returns a list with one ``git.PushInfo`` for each ref, in the same order
+        as ``refs``. The entry is None if the remote said nothing about the ref.
+        Use :py:meth:`deleted` to tell if it was removed. When a push that is
+        not atomic fails as a whole, its refs are retried one at a time so that
+        each of them gets its own result.
+        """
+        pushes = [None] * len(refs)
+        for positions, results in self._iter_pushes(refs, chunk_size, atomic,
+                lease, jobs):
+            for i, result in zip(positions, results):
+                pushes[i] = result
+
+        return pushes
+
+    def iter_remove_remote_refs(self, refs, chunk_size=None, atomic=False,
+            lease=False, jobs=None):
+        """
+        Removes the remote refs and yields ``(ref, push)`` as each push ends.
+
+        This works like :py:meth:`remove_remote_refs` but the results come
+        in the order the pushes finished, so they can be shown while the
+        others are still running.
+        """
+        for positions, results in self._iter_pushes(refs, chunk_size, atomic,
+                lease, jobs):
+            for i, push in zip(positions, results):
+                yield (refs[i], push)
+
+    def deleted(self, push):
+        """
+        Returns True if ``push`` reports a ref that was removed from the remote.
+        """
+        if push is None or push.flags & PushInfo.ERROR:
+            return False
+
+        return bool(push.flags & PushInfo.DELETED)
+
+    def moved_refs(self, refs):
+        """
+        Returns the positions in ``refs`` of the refs whose remote-tracking
+        branch no longer points at the ref's ``sha``.
+
+        The branches are resolved with one batch of :py:attr:`cat_file`
+        lookups. A branch that is gone from the repository is left for the
+        remote to decide.
         """
         origin = self._origin
+        infos = self.cat_file.infos(['refs/remotes/{0}/{1}'.format(
+            origin.name, i.remote_head) for i in refs])
 
-        pushes = []
-        for ref in refs:
-            pushes.append(origin.push(':{0}'.format(ref.remote_head)))
+        return set([i for i, (ref, info) in enumerate(zip(refs, infos))
+            if info is not None and info[0] != ref.sha])
 
-        return pushes
+    def remote_master_sha(self):
+        """
+        Asks the remote where its master branch is now.
+
+        This is a single ``git ls-remote``, nothing is fetched. Returns the
+        commit, or None if the remote has no such branch.
+        """
+        origin = self._origin
+        name = 'refs/heads/{0}'.format(self.master_branch)
+        args = ['ls-remote', origin.name, name]
+
+        (retcode, stdout, stderr) = self._execute(args)
+
+        if retcode != 0:
+            raise GitCommandError(['git'] + args, retcode, stderr)
+
+        for line in stdout.splitlines():
+            (sha, ref) = line.split('\t', 1)
+            if ref == name:
+                return sha
+
+        return None
+
+    def _iter_pushes(self, refs, chunk_size, atomic, lease, jobs):
+        """
+        Pushes the deletes a chunk at a time with up to ``jobs`` threads.
+
+        Yields ``(positions, results)`` for each chunk as soon as it is done,
+        where ``positions`` are the positions of its refs in ``refs``. Each
+        push is a git process that spends its time waiting on the network,
+        so threads are enough to keep several of them going.
+        """
+        origin = self._origin
+        chunk_size = chunk_size or self.chunk_size
+        positions = range(len(refs))
+
+        if lease and self.refs is None:
+            # The remote would refuse these anyway, don't ask it
+            with timings.phase('delete.moved'):
+                moved = self.moved_refs(refs)
+            if moved:
+                yield (sorted(moved), [None] * len(moved))
+                positions = [i for i in positions if not i in moved]
+
+        chunks = [positions[i:i + chunk_size]
+            for i in range(0, len(positions), chunk_size)]
+        jobs = min(jobs or self.jobs, len(chunks))
+
+        def push(chunk):
+            return (chunk, self._push_chunk(origin, [refs[i] for i in chunk],
+                atomic, lease))
+
+        try:
+            if jobs <= 1:
+                for chunk in chunks:
+                    yield push(chunk)
+                return
+
+            pool = ThreadPool(jobs)
+            try:
+                for result in pool.imap_unordered(push, chunks):
+                    yield result
+            finally:
+                # Stops the workers early if the caller went away
+                pool.terminate()
+                pool.join()
+        finally:
+            self.close()
+
+    def _push_chunk(self, origin, chunk, atomic, lease):
+        """
+        Deletes the refs of ``chunk`` and returns a result for each of them.
+        """
+        with timings.phase('delete.push'):
+            results = self._push_deletes(origin, chunk, atomic, lease)
+
+        if not atomic and len(chunk) > 1 and None in results:
+            # Git refuses the whole push if one of the refs is already
+            # gone, find out which refs that was by trying each of them.
+            with timings.phase('delete.retry'):
+                results = [
+                    result or self._push_deletes(
+                        origin, [ref], atomic, lease)[0]
+                    for ref, result in zip(chunk, results)]
+
+        return results
+
+    def _push_deletes(self, origin, refs, atomic, lease):
+        """
+        Deletes ``refs`` with a single push and matches the results to them.
+        """
+        refspecs = [':{0}'.format(i.remote_head) for i in refs]
+        if lease:
+            refspecs = ['--force-with-lease=refs/heads/{0}:{1}'.format(
+                i.remote_head, i.sha) for i in refs] + refspecs
+        kwargs = {'atomic': True} if atomic else {}
+
+        timings.command(['push'])
+        try:
+            infos = origin.push(refspecs, **kwargs)
+        except GitCommandError:
+            # The push failed as a whole, the remote did not tell us anything
+            # about the individual refs.
+            infos = []
+
+        by_name = {}
+        for info in infos:
+            name = info.remote_ref_string
+            if name.startswith('refs/heads/'):
+                name = name[len('refs/heads/'):]
+            by_name[name] = info
+
+        return [by_name.get(i.remote_head) for i in refs]
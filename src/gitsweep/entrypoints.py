@@ -18,3 +18,12 @@ def test():
     import sys
 
     nose.main(argv=['nose'] + sys.argv[1:])
+
+
+def benchmark():
+    """
+    Run git-sweep's benchmarks against a generated repository.
+    """
+    from gitsweep.benchmarks.run import main
+
+    main()
@@ -0,0 +1,146 @@
+from os.path import join, exists
+
+from git import GitCommandError
+
+from . import timings
+from .base import BaseOperation, execute
+from .refs import RefRecord, common_dir
+
+
+def fetch_kwargs(repo, remote_names, filter=None, depth=None,
+        partial=False):
+    """
+    Returns the ``git fetch`` options for ``filter`` and ``depth``.
+
+    Raises ValueError if they would change what kind of clone the repository
+    is, see :py:meth:`Fetcher.fetch`.
+    """
+    kwargs = {}
+
+    if filter:
+        if not partial and not all([_is_promisor(repo, i)
+                for i in remote_names]):
+            raise ValueError('Fetching with a filter makes this a partial '
+                'clone, use --allow-partial-clone if that is what you want')
+        kwargs['filter'] = filter
+
+    if depth:
+        if not exists(join(common_dir(repo.git_dir), 'shallow')):
+            raise ValueError('Fetching with a depth would make this full '
+                'clone shallow, it can only be used with shallow clones')
+        kwargs['deepen'] = depth
+
+    return kwargs
+
+
+def _is_promisor(repo, remote_name):
+    """
+    Returns True if objects may already be missing from ``remote_name``.
+    """
+    (retcode, stdout, stderr) = execute(repo.working_dir,
+        ['config', '--bool', 'remote.{0}.promisor'.format(remote_name)])
+
+    return stdout.strip() == 'true'
+
+
+class Fetcher(BaseOperation):
+
+    """
+    Fetches from the remote before it is inspected.
+
+    """
+    def fetch(self, narrow=False, filter=None, depth=None, partial=False):
+        """
+        Fetches from the remote and returns the ``git.FetchInfo`` list.
+
+        By default this is a plain ``git fetch`` of the remote. With ``narrow``
+        only the branches are fetched, into the remote-tracking refs, without
+        tags. Branches that are gone from the remote are pruned so they are
+        not offered for deletion again.
+
+        ``filter`` is a partial clone filter such as ``blob:none``, git-sweep
+        never looks at file contents unless it has to compare patches. Git
+        marks the remote as a promisor for good, so unless it already is one
+        ``partial`` has to be True.
+
+        ``depth`` is only for shallow clones, it fetches the new commits and
+        that many more commits of history. A full clone is never made shallow
+        and history that was fetched before is never cut off again, so
+        branches found to be merged once are still found on the next run.
+        Raises ValueError if ``filter`` or ``depth`` can't be used.
+        """
+        origin = self._origin
+
+        kwargs = fetch_kwargs(self.repo, [origin.name], filter=filter,
+            depth=depth, partial=partial)
+
+        timings.command(['fetch'])
+
+        if not narrow:
+            return origin.fetch(**kwargs)
+
+        refspec = '+refs/heads/*:refs/remotes/{0}/*'.format(origin.name)
+
+        return origin.fetch(refspec, no_tags=True, prune=True, **kwargs)
+
+    def ls_remote(self):
+        """
+        Returns a ``gitsweep.refs.RefRecord`` for every branch on the remote.
+
+        This is a single ``git ls-remote`` that only asks for ``refs/heads/``,
+        nothing is fetched. The records carry the commits the remote reported,
+        which may not be in the repository yet, see :py:meth:`fetch_missing`.
+        """
+        origin = self._origin
+
+        (retcode, stdout, stderr) = self._execute(
+            ['ls-remote', '--heads', origin.name])
+
+        if retcode != 0:
+            raise GitCommandError(
+                ['git', 'ls-remote', '--heads', origin.name], retcode, stderr)
+
+        refs = []
+        for line in stdout.splitlines():
+            (sha, name) = line.split('\t', 1)
+            if name.startswith('refs/heads/'):
+                refs.append(RefRecord(
+                    origin.name, name[len('refs/heads/'):], sha))
+
+        return sorted(refs, key=lambda i: i.remote_head)
+
+    def fetch_missing(self, refs):
+        """
+        Fetches the branches of ``refs`` whose commits are not in the
+        repository and returns the refs that can be inspected.
+
+        Only the branches that are missing their commit are fetched. A branch
+        that moved on the remote since it was listed still lacks the commit
+        that was seen and is left out, it will be looked at on the next run.
+        """
+        origin = self._origin
+
+        missing = self._missing_objects([i.sha for i in refs])
+
+        if missing:
+            refspecs = ['+refs/heads/{0}:refs/remotes/{1}/{0}'.format(
+                i.remote_head, origin.name) for i in refs if i.sha in missing]
+            timings.command(['fetch'])
+            try:
+                origin.fetch(refspecs, no_tags=True)
+            except GitCommandError:
+                pass
+            missing = self._missing_objects(list(missing))
+
+        self.close()
+
+        return [i for i in refs if not i.sha in missing]
+
+    def _missing_objects(self, shas):
+        """
+        Returns the set of ``shas`` that are not in the object database.
+
+        They are looked up with the ``git cat-file --batch-check`` that is kept
+        open by :py:attr:`cat_file`.
+        """
+        return self.cat_file.missing(shas)
@@ -0,0 +1,22 @@
+from contextlib import contextmanager
+from os import makedirs, rename
+from os.path import exists, dirname
+
+
+@contextmanager
+def atomic_write(filename):
+    """
+    Opens a file to write that only replaces ``filename`` once it is closed.
+
+    The data goes to ``<filename>.tmp`` which is moved into place when the
+    block finishes, so a run that gets interrupted never leaves a half
+    written file behind. The directory is made if it does not exist.
+    """
+    directory = dirname(filename)
+    if directory and not exists(directory):
+        makedirs(directory)
+
+    tmp_filename = '{0}.tmp'.format(filename)
+    with open(tmp_filename, 'w') as fh:
+        yield fh
+    rename(tmp_filename, filename)
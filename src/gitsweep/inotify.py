@@ -0,0 +1,121 @@
+import os
+import errno
+import struct
+import select
+import ctypes
+import ctypes.util
+
+#: Events that can be asked for, see inotify(7)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+
+#: Flags the kernel sets on events
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+#: The fixed part of each event: wd, mask, cookie and the length of the name
+_EVENT = struct.Struct('iIII')
+
+_libc = None
+
+
+class InotifyUnavailable(Exception):
+
+    """
+    Raise when the system has no inotify.
+
+    """
+    pass
+
+
+class Inotify(object):
+
+    """
+    A thin wrapper around Linux's inotify, through ctypes.
+
+    Only what git-sweep needs is here: watching paths and reading the events
+    that happened to them. Events are tuples of ``(wd, mask, name)`` where
+    ``wd`` is what :py:meth:`add_watch` returned for the path.
+
+    """
+    def __init__(self):
+        libc = _load_libc()
+
+        self.fd = libc.inotify_init()
+        if self.fd < 0:
+            raise InotifyUnavailable(os.strerror(ctypes.get_errno()))
+
+    def add_watch(self, path, mask):
+        """
+        Watches ``path`` for the events in ``mask`` and returns its wd.
+
+        Returns None if ``path`` does not exist.
+        """
+        wd = _libc.inotify_add_watch(self.fd, path, mask)
+
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error in (errno.ENOENT, errno.ENOTDIR):
+                return None
+            raise OSError(error, os.strerror(error), path)
+
+        return wd
+
+    def read(self, timeout=None):
+        """
+        Returns the events that happened, waiting for up to ``timeout``
+        seconds for the first one. Returns an empty list if none came.
+        """
+        (readable, writable, errors) = select.select(
+            [self.fd], [], [], timeout)
+
+        if not readable:
+            return []
+
+        data = os.read(self.fd, 64 * 1024)
+
+        events = []
+        offset = 0
+        while offset < len(data):
+            (wd, mask, cookie, length) = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip('\0')
+            offset += length
+            events.append((wd, mask, name))
+
+        return events
+
+    def close(self):
+        """
+        Stops watching everything.
+        """
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def _load_libc():
+    """
+    Loads the C library and checks that it has inotify.
+    """
+    global _libc
+
+    if _libc is None:
+        name = ctypes.util.find_library('c')
+        try:
+            libc = ctypes.CDLL(name, use_errno=True)
+            libc.inotify_init
+        except (OSError, AttributeError):
+            raise InotifyUnavailable('This system has no inotify')
+
+        libc.inotify_add_watch.argtypes = [
+            ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        _libc = libc
+
+    return _libc
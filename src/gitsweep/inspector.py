@@ -1,6 +1,11 @@
-from git import Git
+import time
+from multiprocessing.pool import ThreadPool
 
-from .base import BaseOperation
+from . import timings
+from .activity import read_activity, stale_refs
+from .base import BaseOperation, is_ancestor
+from .commitgraph import CommitGraph
+from .patchindex import PatchIndex
 
 
 class Inspector(BaseOperation):
@@ -8,36 +13,448 @@ class Inspector(BaseOperation):
     """
     Used to introspect a Git repository.
 
+    ``jobs`` is the number of worker threads used for the checks that have to
+    be made for each ref. The results are the same, and in the same order, no
+    matter how many workers there are.
+
+    ``cache`` is an optional :py:class:`gitsweep.cache.MergeCache`. Refs it
+    already knows about are answered from it without running git at all.
+
+    ``snapshot`` is an optional :py:class:`gitsweep.snapshot.RefSnapshot`.
+    Refs that have not moved since the snapshot was taken reuse the verdict
+    from that run, and a new snapshot is saved once the refs are inspected.
+
+    If ``commit_graph`` is True and the repository has a commit-graph file,
+    refs that are reachable from master are found by reading it instead of
+    running git.
+
+    ``detection`` decides what happens to refs that are not reachable from
+    master. With ``'cherry'`` a ref is merged only if ``git cherry`` finds no
+    commits in it that master does not have. With ``'patch-id'`` a commit that
+    was rebased or cherry-picked into master counts as merged too, and the
+    patch-ids of master are kept in a :py:class:`gitsweep.patchindex.PatchIndex`
+    instead of being worked out again for every ref. ``patch_index`` is the
+    index to use instead of the one kept in the repository, so that several
+    inspectors can share one.
+
+    ``older_than`` and ``author_inactive`` are ages in seconds. When they are
+    given only the refs that have been left alone that long are inspected, see
+    :py:func:`gitsweep.activity.stale_refs`. They are picked out before any
+    other work is done.
     """
-    def merged_refs(self, skip=[]):
+    def __init__(self, repo, remote_name='origin', master_branch='master',
+            jobs=1, cache=None, snapshot=None, commit_graph=True,
+            detection='cherry', refs=None, older_than=None,
+            author_inactive=None, patch_index=None):
+        super(Inspector, self).__init__(repo, remote_name=remote_name,
+            master_branch=master_branch, refs=refs)
+        self.jobs = jobs
+        self.cache = cache
+        self.snapshot = snapshot
+        self.commit_graph = commit_graph
+        self.detection = detection
+        self.older_than = older_than
+        self.author_inactive = author_inactive
+        self.patch_index = patch_index
+
+    def merged_refs(self, skip=[], include=[]):
         """
         Returns a list of remote refs that have been merged into the master
         branch.
 
         The "master" branch may have a different name than master. The value of
         ``self.master_name`` is used to determine what this name is.
+
+        ``skip`` and ``include`` are branch names or patterns, see
+        :py:class:`gitsweep.patterns.RefMatcher`. Only the branches that
+        match ``include``, if it is given, and not ``skip`` are inspected.
+        """
+        return list(self.iter_merged_refs(skip=skip, include=include))
+
+    def iter_merged_refs(self, skip=[], include=[]):
+        """
+        Yields the remote refs that have been merged into the master branch.
+
+        Each ref is yielded as soon as it has been decided, in the same order
+        :py:meth:`merged_refs` returns them.
+        """
+        for ref, merged, method, seconds in self.iter_verdicts(skip,
+                include):
+            if merged:
+                yield ref
+
+    def iter_verdicts(self, skip=[], include=[]):
+        """
+        Yields ``(ref, merged, method, seconds)`` for every remote ref that is
+        not skipped, in the same order as :py:meth:`iter_merged_refs`.
+
+        ``method`` says how the ref was decided: ``'snapshot'`` or ``'cache'``
+        if an earlier run already knew, ``'commit-graph'`` or ``'rev-list'``
+        if it was found to be reachable from master, otherwise the
+        ``detection`` that was used. ``seconds`` is the time spent on the
+        ref on its own, refs that were decided together take no time.
+
+        Refs that the snapshot or the cache can answer for come out right
+        away, the others as soon as git has decided them. Both are saved once
+        every ref has been yielded.
         """
         origin = self._origin
+        (master, refs) = self.candidates(skip, include)
+
+        master_sha = master.sha
+
+        known = {}
+        with timings.phase('inspect.known'):
+            if self.snapshot is not None:
+                for name, merged in self._unchanged_verdicts(master_sha,
+                        dict([(i.remote_head, i.sha) for i in refs])).items():
+                    known[name] = (merged, 'snapshot')
+
+            if self.cache is not None:
+                for ref in refs:
+                    if ref.remote_head in known:
+                        continue
+                    merged = self.cache.get(ref.sha, master_sha)
+                    if merged is not None:
+                        known[ref.remote_head] = (merged, 'cache')
+
+        # Only the refs we have not seen at these commits cost us anything
+        pending = refs
+        if known:
+            pending = [i for i in refs if not i.remote_head in known]
+        if pending:
+            decided = self._inspect(origin, master, pending)
+
+        seen = {}
+        for ref in refs:
+            if ref.remote_head in known:
+                (merged, method) = known[ref.remote_head]
+                seconds = 0.0
+            else:
+                (merged, method, seconds) = next(decided)
+                if self.cache is not None:
+                    self.cache.set(ref.sha, master_sha, merged)
+
+            if self.snapshot is not None:
+                seen[ref.remote_head] = (ref.sha, merged)
+
+            yield (ref, merged, method, seconds)
+
+        with timings.phase('inspect.save'):
+            if self.cache is not None:
+                self.cache.save()
+
+            if self.snapshot is not None:
+                self.snapshot.save(self.master_branch, master_sha, seen)
+
+        self.close()
+
+    def candidates(self, skip=[], include=[]):
+        """
+        Returns ``(master, refs)``, the master ref and the refs that would be
+        inspected.
+
+        They are the refs that are not skipped, see :py:meth:`merged_refs`,
+        and that have been left alone long enough when ``older_than`` or
+        ``author_inactive`` are given. Nothing is inspected yet.
+        """
+        with timings.phase('inspect.refs'):
+            origin = self._origin
+
+            # The refs are read once for everything below
+            table = self.ref_table(origin)
+            master = self._master_ref(origin, table)
+            refs = self._filtered_remotes(origin,
+                skip=['HEAD', self.master_branch] + skip, include=include,
+                table=table)
+
+        return (master, self._stale_refs(origin, refs))
+
+    def _stale_refs(self, origin, refs):
+        """
+        Returns the ``refs`` that are old enough to be inspected.
+
+        All of them are if neither ``older_than`` nor ``author_inactive`` was
+        given.
+        """
+        if self.older_than is None and self.author_inactive is None:
+            return refs
+
+        with timings.phase('inspect.activity'):
+            activity = read_activity(self.repo.working_dir, origin.name)
+
+            return stale_refs(refs, activity, older_than=self.older_than,
+                author_inactive=self.author_inactive, cat_file=self.cat_file)
+
+    def _unchanged_verdicts(self, master_sha, tips):
+        """
+        Returns the verdicts from the last run that still hold.
+
+        ``tips`` is a dictionary of branch names to the commits they point to
+        now. A ref that has not moved keeps its verdict if master has not moved
+        either. If master only moved forward, a merged ref is still merged but
+        the others have to be inspected again.
+        """
+        previous = self.snapshot.load(self.master_branch)
+
+        if previous is None:
+            return {}
+
+        (previous_master, previous_refs) = previous
+
+        if previous_master == master_sha:
+            keep_unmerged = True
+        elif is_ancestor(self.repo.working_dir, previous_master, master_sha):
+            keep_unmerged = False
+        else:
+            # Master was rewritten, nothing from the last run can be trusted
+            return {}
+
+        verdicts = {}
+        for name, sha in tips.items():
+            if not name in previous_refs:
+                continue
+            (previous_sha, merged) = previous_refs[name]
+            if previous_sha == sha and (merged or keep_unmerged):
+                verdicts[name] = merged
+
+        return verdicts
+
+    def _inspect(self, origin, master, refs):
+        """
+        Asks the git binary which of the ``refs`` are merged into ``master``.
 
-        master = self._master_ref(origin)
-        refs = self._filtered_remotes(
-            origin, skip=['HEAD', self.master_branch] + skip)
-        merged = []
+        Yields ``(merged, method, seconds)`` for each of the refs, in order,
+        see :py:meth:`iter_verdicts`.
+        """
+        # Any branch whose tip is reachable from master is merged. This is
+        # worked out for every ref at once instead of asking for each one,
+        # without leaving Python if there is a commit-graph to read.
+        with timings.phase('inspect.reachable'):
+            unreachable = None
+            parents = None
+            if self.commit_graph:
+                unreachable = self._graph_unreachable_tips(master, refs)
+                reachable_method = 'commit-graph'
+            if unreachable is None:
+                (unreachable, parents) = self._unreachable_tips(master, refs)
+                reachable_method = 'rev-list'
+
+        undecided = [i for i in refs if i.sha in unreachable]
+
+        # The commits that only the unreachable refs have decide most of them
+        # at once, only the ones they can't speak for are left to git cherry.
+        verdicts = {}
+        if undecided:
+            with timings.phase('inspect.unmerged'):
+                if reachable_method == 'commit-graph':
+                    parents = self._unreachable_tips(master, undecided)[1]
+                if parents is not None and self.detection == 'patch-id':
+                    verdicts = self._patch_id_verdicts(master, undecided,
+                        parents)
+                elif parents is not None:
+                    verdicts = self._cherry_verdicts(undecided, parents)
+
+        if self.detection == 'patch-id':
+            check = lambda ref: self._cherry(master, ref, equivalent=True)
+        else:
+            check = lambda ref: self._cherry(master, ref)
+
+        # Anything still undecided is asked about one ref at a time, spread
+        # across the workers.
+        undecided = [i for i in undecided if verdicts.get(i.sha) is None]
+
+        def decide(ref):
+            start = time.time()
+            merged = check(ref)
+            seconds = time.time() - start
+            timings.ref(ref.remote_head, seconds)
+            return (merged, self.detection, seconds)
+
+        cherries = self._imap(decide, undecided)
 
         for ref in refs:
-            upstream = '{origin}/{master}'.format(
-                origin=origin.name, master=master.remote_head)
-            head = '{origin}/{branch}'.format(
-                origin=origin.name, branch=ref.remote_head)
-            cmd = Git(self.repo.working_dir)
-            # Drop to the git binary to do this, it's just easier to work with
-            # at this level.
-            (retcode, stdout, stderr) = cmd.execute(
-                ['git', 'cherry', upstream, head],
-                with_extended_output=True, with_exceptions=False)
-            if retcode == 0 and not stdout:
-                # This means there are no commits in the branch that are not
-                # also in the master branch. This is ready to be deleted.
-                merged.append(ref)
-
-        return merged
+            if not ref.sha in unreachable:
+                yield (True, reachable_method, 0.0)
+            elif verdicts.get(ref.sha) is not None:
+                yield (verdicts[ref.sha], self.detection, 0.0)
+            else:
+                yield next(cherries)
+
+    def _imap(self, func, items):
+        """
+        Calls ``func`` for each of the items, using up to ``self.jobs`` threads.
+
+        The results are yielded in the same order as ``items``, each one as
+        soon as it and the ones before it are done. The work is almost all
+        spent waiting on the git binary so threads are enough.
+        """
+        jobs = min(self.jobs or 1, len(items))
+
+        if jobs <= 1:
+            for item in items:
+                yield func(item)
+            return
+
+        pool = ThreadPool(jobs)
+        try:
+            for result in pool.imap(func, items):
+                yield result
+        finally:
+            # Stops the workers early if the caller went away
+            pool.terminate()
+            pool.join()
+
+    def _unreachable_tips(self, master, refs):
+        """
+        Returns ``(unreachable, parents)``, the set of tips of ``refs`` that
+        are not reachable from master and a dictionary of the commits that
+        are in one of the refs but not in master to their parents.
+
+        This takes a single call to the git binary no matter how many remote
+        refs there are. It lists every commit that is in one of the refs but
+        not in master, and the tips that are listed are the unreachable ones.
+        The tips are written to git as the refs are read, they are never all
+        held at once. If that call fails every tip is returned with no
+        parents, which leaves every ref to the ``git cherry`` check.
+        """
+        def tips():
+            yield '^{0}\n'.format(master.sha)
+            for ref in refs:
+                yield '{0}\n'.format(ref.sha)
+
+        (retcode, stdout, stderr) = self._execute(
+            ['rev-list', '--parents', '--stdin'], input=tips())
+
+        if retcode != 0:
+            return (set([i.sha for i in refs]), None)
+
+        parents = {}
+        for line in stdout.splitlines():
+            shas = line.split()
+            parents[shas[0]] = shas[1:]
+
+        return (set([i.sha for i in refs if i.sha in parents]), parents)
+
+    def _graph_unreachable_tips(self, master, refs):
+        """
+        Returns the set of tips not reachable from master or None.
+
+        The answer comes from the commit-graph file. None means the file is
+        missing or does not know about the master commit yet, in which case
+        the git binary has to be asked instead.
+        """
+        graph = CommitGraph.open(self.repo.git_dir)
+
+        if graph is None:
+            return None
+
+        try:
+            start = graph.position(master.sha)
+            if start is None:
+                return None
+
+            # The graph holds every ancestor of the commits in it, so a tip
+            # that is missing from it cannot be reachable from master.
+            positions = set()
+            unreachable = set()
+            for ref in refs:
+                position = graph.position(ref.sha)
+                if position is None:
+                    unreachable.add(ref.sha)
+                else:
+                    positions.add(position)
+
+            reachable = graph.reachable(start, positions)
+            if len(reachable) < len(positions):
+                for ref in refs:
+                    if not graph.position(ref.sha) in reachable:
+                        unreachable.add(ref.sha)
+
+            return unreachable
+        finally:
+            graph.close()
+
+    def _cherry_verdicts(self, refs, parents):
+        """
+        Returns a dictionary of the tips of ``refs`` to False if they have a
+        commit that is not a merge and that master does not have, or to None
+        if the commits only they have are all merges.
+
+        ``parents`` has the parents of each commit that one of the refs has
+        but master does not, see :py:meth:`_unreachable_tips`. ``git cherry``
+        lists every such commit that is not a merge, so a ref with one is not
+        merged. The others are left to ``git cherry``.
+        """
+        # Whether each commit or one of its ancestors is such a commit
+        found = {}
+
+        for tip in set([i.sha for i in refs if i.sha in parents]):
+            pending = [tip]
+            while pending:
+                sha = pending[-1]
+                if sha in found:
+                    pending.pop()
+                    continue
+
+                shas = parents[sha]
+                if len(shas) < 2:
+                    found[sha] = True
+                    pending.pop()
+                    continue
+
+                # Parents that are not listed are in master
+                todo = [i for i in shas if i in parents and not i in found]
+                if todo:
+                    pending.extend(todo)
+                else:
+                    found[sha] = bool([i for i in shas if found.get(i)])
+                    pending.pop()
+
+        return dict([(i.sha, False if found.get(i.sha) else None)
+            for i in refs])
+
+    def _patch_id_verdicts(self, master, refs, parents):
+        """
+        Returns a dictionary of the tips of ``refs`` to True if every commit
+        in them has an equivalent patch in master, False if one does not and
+        None if the patch-id index does not go back far enough to tell.
+
+        ``parents`` has the parents of each commit that one of the refs has
+        but master does not, see :py:meth:`_unreachable_tips`. The patch-ids
+        of all of them are worked out together, see
+        :py:meth:`gitsweep.patchindex.PatchIndex.merged_tips`.
+        """
+        with timings.phase('inspect.patch-index'):
+            index = self.patch_index
+            if index is None:
+                index = PatchIndex.for_repo(self.repo, self.master_branch)
+            index.update(self.repo.working_dir, master.sha)
+
+        with timings.phase('inspect.patch-ids'):
+            tips = sorted(set([i.sha for i in refs]))
+
+            return dict(zip(tips, index.merged_tips(self.repo.working_dir,
+                tips, parents=parents)))
+
+    def _cherry(self, master, ref, equivalent=False):
+        """
+        Returns True if every commit in ``ref`` has an equivalent in master.
+
+        Unless ``equivalent`` is True, a commit counts only if it is in
+        master itself. Otherwise a rebased or cherry-picked copy of it in
+        master is enough.
+        """
+        # Drop to the git binary to do this, it's just easier to work with
+        # at this level.
+        (retcode, stdout, stderr) = self._execute(
+            ['cherry', master.sha, ref.sha])
+
+        if equivalent:
+            # Commits that have an equivalent in master start with a "-"
+            return retcode == 0 and not [i for i in stdout.splitlines()
+                if i.startswith('+')]
+
+        # No output means there are no commits in the branch that are not
+        # also in the master branch. This is ready to be deleted.
+        return retcode == 0 and not stdout
@@ -0,0 +1,200 @@
+from os import listdir
+from os.path import join, isdir, abspath
+from multiprocessing import Pool
+
+from git import Repo
+
+from .inspector import Inspector
+from .deleter import Deleter
+from .fetcher import Fetcher
+from .cache import MergeCache
+from .snapshot import RefSnapshot
+from .refs import RefRecord
+
+
+class RepoResult(object):
+
+    """
+    What happened to one repository of a multi-repository sweep.
+
+    ``merged`` is a list of ``(branch, sha)`` for the merged branches that
+    were found, ``deleted`` and ``failed`` the names of the branches that were
+    or were not deleted. ``error`` is the message of whatever went wrong if
+    the repository could not be swept at all.
+
+    """
+    def __init__(self, path, merged=None, deleted=None, failed=None,
+            error=None):
+        self.path = path
+        self.merged = merged or []
+        self.deleted = deleted or []
+        self.failed = failed or []
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def discover(directory):
+    """
+    Returns the sorted paths of the Git repositories below ``directory``.
+
+    A directory with a ``.git`` in it is a repository, the directories inside
+    a repository are not searched.
+    """
+    found = []
+
+    def search(path):
+        if isdir(join(path, '.git')):
+            found.append(path)
+            return
+        for name in sorted(listdir(path)):
+            child = join(path, name)
+            if isdir(child) and not name.startswith('.'):
+                search(child)
+
+    search(abspath(directory))
+
+    return found
+
+
+class Orchestrator(object):
+
+    """
+    Sweeps many repositories with a pool of worker processes.
+
+    Each repository is inspected, and later cleaned up, in a process of its
+    own with the same :py:class:`gitsweep.inspector.Inspector` and
+    :py:class:`gitsweep.deleter.Deleter` a single sweep uses. Anything that
+    goes wrong is caught in the worker and reported in the repository's
+    :py:class:`RepoResult`, the other repositories carry on.
+
+    ``options`` are the settings every repository is swept with, see
+    :py:data:`DEFAULT_OPTIONS`.
+
+    """
+    #: Settings used for the options that are not given
+    DEFAULT_OPTIONS = {
+        'remote_name': 'origin',
+        'master_branch': 'master',
+        'skip': [],
+        'include': [],
+        'fetch': True,
+        'jobs': 1,
+        'cache': True,
+        'detection': 'cherry',
+        'older_than': None,
+        'author_inactive': None}
+
+    def __init__(self, paths, processes=4, **options):
+        self.paths = paths
+        self.processes = processes
+        self.options = dict(self.DEFAULT_OPTIONS)
+        self.options.update(options)
+
+    def inspect(self):
+        """
+        Yields a :py:class:`RepoResult` with the merged branches of each
+        repository, in the same order as ``paths``.
+        """
+        return self._map(_inspect_repo,
+            [(i, self.options) for i in self.paths])
+
+    def delete(self, results):
+        """
+        Deletes the merged branches found by :py:meth:`inspect`.
+
+        Yields a :py:class:`RepoResult` for each of the ``results`` that found
+        anything. A branch is only deleted if it still points at the commit
+        that was inspected.
+        """
+        return self._map(_delete_repo,
+            [(i.path, i.merged, self.options) for i in results
+            if i.ok and i.merged])
+
+    def _map(self, func, items):
+        """
+        Calls ``func`` for each item in the pool and yields the results in
+        order as they come in.
+        """
+        if not items:
+            return
+
+        pool = Pool(min(self.processes, len(items)))
+        try:
+            for result in pool.imap(func, items):
+                yield result
+        finally:
+            pool.terminate()
+            pool.join()
+
+
+def _inspect_repo(item):
+    """
+    Finds the merged branches of one repository, in a worker process.
+    """
+    (path, options) = item
+
+    try:
+        repo = Repo(path)
+        kwargs = {
+            'remote_name': options['remote_name'],
+            'master_branch': options['master_branch']}
+
+        if options['fetch']:
+            Fetcher(repo, **kwargs).fetch()
+
+        cache = None
+        snapshot = None
+        if options['cache']:
+            cache = MergeCache.for_repo(repo, detection=options['detection'])
+            snapshot = RefSnapshot.for_repo(repo, options['remote_name'],
+                detection=options['detection'])
+
+        inspector = Inspector(repo, jobs=options['jobs'], cache=cache,
+            snapshot=snapshot, detection=options['detection'],
+            older_than=options['older_than'],
+            author_inactive=options['author_inactive'], **kwargs)
+
+        merged = [(i.remote_head, i.sha)
+            for i in inspector.merged_refs(skip=options['skip'],
+                include=options['include'])]
+    except Exception as e:
+        return RepoResult(path, error=_message(e))
+
+    return RepoResult(path, merged=merged)
+
+
+def _delete_repo(item):
+    """
+    Deletes the merged branches of one repository, in a worker process.
+    """
+    (path, merged, options) = item
+
+    try:
+        repo = Repo(path)
+        refs = [RefRecord(options['remote_name'], name, sha)
+            for name, sha in merged]
+
+        deleter = Deleter(repo, remote_name=options['remote_name'],
+            master_branch=options['master_branch'])
+        pushes = deleter.remove_remote_refs(refs, lease=True)
+    except Exception as e:
+        return RepoResult(path, merged=merged, error=_message(e))
+
+    result = RepoResult(path, merged=merged)
+    for ref, push in zip(refs, pushes):
+        if deleter.deleted(push):
+            result.deleted.append(ref.remote_head)
+        else:
+            result.failed.append(ref.remote_head)
+
+    return result
+
+
+def _message(exception):
+    """
+    Returns something to tell the user about ``exception``.
+    """
+    return str(exception).strip() or exception.__class__.__name__
@@ -0,0 +1,99 @@
+import json
+import time
+
+
+class RecordWriter(object):
+
+    """
+    Writes records to ``stream`` as soon as they are made.
+
+    With the ``'ndjson'`` format each record is a line of JSON. With
+    ``'json'`` the records make up one JSON array, which is written a record
+    at a time so it never has to be held in memory. Call :py:meth:`close` to
+    finish it.
+
+    """
+    def __init__(self, stream, format='ndjson'):
+        self.stream = stream
+        self.format = format
+        self._count = 0
+
+    def write(self, record):
+        """
+        Writes ``record``, a dictionary, and flushes the stream.
+        """
+        data = json.dumps(record, sort_keys=True)
+
+        if self.format == 'json':
+            data = '{0}  {1}'.format('[\n' if not self._count else ',\n', data)
+        else:
+            data += '\n'
+
+        self.stream.write(data)
+        self.stream.flush()
+        self._count += 1
+
+    def close(self):
+        """
+        Finishes what was written, the stream itself is left open.
+        """
+        if self.format == 'json':
+            self.stream.write('\n]\n' if self._count else '[]\n')
+            self.stream.flush()
+
+
+class Progress(object):
+
+    """
+    Shows how many of ``total`` things are done, how fast and what is left.
+
+    The progress is written to ``stream`` as a single line that is rewritten
+    as :py:meth:`update` is called, so nothing is shown unless the stream is
+    a terminal. Call :py:meth:`clear` before writing anything else to the
+    terminal, and at the end.
+
+    """
+    def __init__(self, total, stream, label='deleted', clock=time.time):
+        self.total = total
+        self.stream = stream
+        self.label = label
+        self.clock = clock
+        self.done = 0
+        self.started = clock()
+        self.enabled = hasattr(stream, 'isatty') and stream.isatty()
+        self._width = 0
+
+    def update(self, count=1):
+        """
+        Adds ``count`` to the things that are done and shows the progress.
+        """
+        self.done += count
+        self._show(self.line())
+
+    def line(self):
+        """
+        Returns the progress, like ``12/40 deleted, 3.0/s, about 9s left``.
+        """
+        elapsed = self.clock() - self.started
+        line = '{0}/{1} {2}'.format(self.done, self.total, self.label)
+
+        if self.done and elapsed > 0:
+            rate = self.done / elapsed
+            line += ', {0:.1f}/s, about {1:.0f}s left'.format(
+                rate, (self.total - self.done) / rate)
+
+        return line
+
+    def clear(self):
+        """
+        Removes the progress line from the terminal.
+        """
+        self._show('')
+
+    def _show(self, line):
+        if not self.enabled:
+            return
+
+        self.stream.write('\r{0}\r{1}'.format(' ' * self._width, line))
+        self.stream.flush()
+        self._width = len(line)
@@ -0,0 +1,369 @@
+import json
+from os.path import join, exists
+from subprocess import Popen, PIPE
+from threading import Thread
+
+from . import timings
+from .base import execute, is_ancestor
+from .files import atomic_write
+
+#: Version of the format of index files
+INDEX_VERSION = 2
+
+
+class PatchIndex(object):
+
+    """
+    The patch-ids of the recent history of the master branch.
+
+    ``git cherry`` works out the patch-ids of master's side of the range again
+    for every branch it is asked about. The index works them out once, keeps
+    them in ``filename`` and only adds the commits master gained since the last
+    run. A branch is then checked by working out the patch-ids of its own
+    commits and looking them up.
+
+    The index covers the newest ``max_commits`` commits of master, in
+    topological order, and drops the oldest ones as master grows. A branch can
+    be decided from the index if the commits where it forked from master are
+    covered, since every commit master gained after that is then covered too.
+
+    The index is kept by master branch, not by remote. When it is moved to
+    a master that is not a descendant of the last one, such as the master of
+    a fork, the patch-ids of the commits the two have in common are kept and
+    only the others are worked out.
+
+    """
+    def __init__(self, filename, max_commits=10000):
+        self.filename = filename
+        self.max_commits = max_commits
+        self.master_sha = None
+        # The commits of master, newest first, and the patch-id of each
+        self._order = []
+        self._commits = {}
+        # The commits of master that have each patch-id
+        self._patch_ids = {}
+        # Where each commit is in _order
+        self._positions = {}
+
+        self._load()
+
+    @classmethod
+    def for_repo(cls, repo, master_branch, **kwargs):
+        """
+        Creates the index for a master branch in the Git directory of repo.
+
+        Every remote's master branch of that name shares the index.
+        """
+        return cls(join(repo.git_dir, 'git-sweep', 'patch-ids-{0}'.format(
+            master_branch).replace('/', '-')), **kwargs)
+
+    def update(self, working_dir, master_sha):
+        """
+        Brings the index up to date with the master commit ``master_sha``.
+
+        If the master commit the index was built for is an ancestor of the new
+        one, only the new commits are added. Otherwise it is built again, with
+        the patch-ids it already has for any of the commits. Either way it is
+        then trimmed to the newest ``max_commits`` commits.
+        """
+        if master_sha == self.master_sha:
+            return
+
+        revisions = master_sha
+        if self.master_sha and is_ancestor(
+                working_dir, self.master_sha, master_sha):
+            revisions = '{0}..{1}'.format(self.master_sha, master_sha)
+        else:
+            self._order = []
+
+        commits = _git(working_dir, ['rev-list', '--topo-order',
+            '--max-count={0}'.format(self.max_commits), revisions]).split()
+        patch_ids = dict([(commit, patch_id)
+            for (patch_id, commit) in _patch_ids(working_dir,
+                [i for i in commits if not i in self._commits])])
+
+        self._order = (commits + self._order)[:self.max_commits]
+        self._commits = dict([(i, self._commits[i] if i in self._commits
+            else patch_ids.get(i)) for i in self._order])
+        self._index_patch_ids()
+        self.master_sha = master_sha
+
+        self._save()
+
+    def merged(self, working_dir, tip_sha, cat_file=None):
+        """
+        Returns True if every commit of the branch at ``tip_sha`` has an
+        equivalent patch in master, False if one does not and None if the index
+        can't tell.
+
+        Like ``git cherry``, only the commits master gained after the branch
+        forked count. A patch that is only in the history the branch shares
+        with master, such as the commit that a revert of a revert brings
+        back, leaves the branch to ``git cherry``.
+
+        If a :py:class:`gitsweep.plumbing.CatFile` is given the commits of the
+        branch are found with it instead of starting ``git rev-list``.
+        """
+        return self.merged_tips(working_dir, [tip_sha], cat_file=cat_file)[0]
+
+    def merged_tips(self, working_dir, tip_shas, cat_file=None,
+            parents=None):
+        """
+        Returns a list with what :py:meth:`merged` would say for each of the
+        branches at ``tip_shas``.
+
+        The patch-ids of the commits of every branch are worked out together,
+        with one ``git diff-tree`` and one ``git patch-id`` however many
+        branches there are. ``parents`` can be a dictionary with the parents
+        of each commit that one of the branches has but master does not, as
+        ``git rev-list --parents`` lists them, and the branches are then
+        found in it without running git.
+        """
+        branches = [self._branch(working_dir, i, cat_file, parents)
+            for i in tip_shas]
+
+        commits = set()
+        for branch in branches:
+            if branch is not None:
+                commits.update(branch[0])
+        patch_ids = dict([(commit, patch_id) for (patch_id, commit)
+            in _patch_ids(working_dir, sorted(commits))])
+
+        return [None if branch is None else self._merged(working_dir, tip_sha,
+            branch[0], branch[1], patch_ids)
+            for tip_sha, branch in zip(tip_shas, branches)]
+
+    def _merged(self, working_dir, tip_sha, commits, boundary, patch_ids):
+        """
+        Decides the branch at ``tip_sha``, see :py:meth:`merged`.
+
+        ``commits`` are the commits of the branch that are not in the index,
+        ``boundary`` the commits of the index they have as parents and
+        ``patch_ids`` the patch-id of each commit that has one.
+        """
+        matches = []
+        for commit in commits:
+            if not commit in patch_ids:
+                continue
+            if not patch_ids[commit] in self._patch_ids:
+                return False
+            matches.append(self._patch_ids[patch_ids[commit]])
+
+        if not matches:
+            return True
+
+        after_fork = self._after_fork(working_dir, tip_sha, boundary,
+            set([i for candidates in matches for i in candidates]))
+        for candidates in matches:
+            if after_fork.isdisjoint(candidates):
+                return None
+
+        return True
+
+    def _after_fork(self, working_dir, tip_sha, boundary, commits):
+        """
+        Returns the set of ``commits`` of the index that are not reachable
+        from ``tip_sha``.
+
+        The only commits of master the branch can reach are its ``boundary``
+        commits and their ancestors, which all come after them in the index.
+        Commits that come before every boundary commit are after the fork,
+        git is only asked about the others.
+        """
+        first = min([self._positions[i] for i in boundary] or
+            [len(self._order)])
+        after = set([i for i in commits if self._positions[i] < first])
+
+        return after | _not_ancestors(working_dir, tip_sha, commits - after)
+
+    def _branch(self, working_dir, tip_sha, cat_file, parents):
+        """
+        Returns ``(commits, boundary)`` for the branch at ``tip_sha``, see
+        :py:meth:`_merged`, or None if the index does not go back far enough.
+        """
+        if parents is not None:
+            return self._listed_commits(parents, tip_sha)
+
+        if cat_file is not None:
+            return self._branch_commits(cat_file, tip_sha)
+
+        revlist = _git(working_dir, ['rev-list', '--boundary',
+            tip_sha, '^{0}'.format(self.master_sha)]).split()
+
+        boundary = [i[1:] for i in revlist if i.startswith('-')]
+        commits = [i for i in revlist if not i.startswith('-')]
+
+        if [i for i in boundary if not i in self._commits]:
+            return None
+
+        return (commits, boundary)
+
+    def __len__(self):
+        return len(self._patch_ids)
+
+    def _branch_commits(self, cat_file, tip_sha, limit=1000):
+        """
+        Returns ``(commits, boundary)``, the commits of the branch at
+        ``tip_sha`` that are not in the index and the commits of the index
+        they reach, or None if they can't be told apart from older history.
+
+        The parents are followed from the tip until they reach commits in the
+        index. Every ancestor of a commit the index does not cover is not
+        covered either, so a walk that goes on for more than ``limit`` commits
+        or reaches a root has left the branch for history the index can't
+        speak for.
+        """
+        commits = []
+        boundary = []
+        seen = set([tip_sha])
+        pending = [tip_sha]
+
+        while pending:
+            sha = pending.pop()
+            if sha in self._commits:
+                boundary.append(sha)
+                continue
+
+            commits.append(sha)
+            if len(commits) > limit:
+                return None
+
+            parents = cat_file.parents(sha)
+            if not parents:
+                return None
+
+            for parent in parents:
+                if not parent in seen:
+                    seen.add(parent)
+                    pending.append(parent)
+
+        return (commits, boundary)
+
+    def _listed_commits(self, parents, tip_sha):
+        """
+        Returns ``(commits, boundary)`` for the branch at ``tip_sha`` from
+        ``parents``, see :py:meth:`merged_tips`, or None if a commit of
+        master it reaches is not in the index.
+        """
+        commits = []
+        boundary = set()
+        seen = set([tip_sha])
+        pending = [tip_sha]
+
+        while pending:
+            sha = pending.pop()
+            if not sha in parents:
+                # Master has it, the branch joins master here
+                if not sha in self._commits:
+                    return None
+                boundary.add(sha)
+                continue
+
+            commits.append(sha)
+            for parent in parents[sha]:
+                if not parent in seen:
+                    seen.add(parent)
+                    pending.append(parent)
+
+        return (commits, list(boundary))
+
+    def _load(self):
+        """
+        Reads the index saved by an earlier run.
+        """
+        if not exists(self.filename):
+            return
+
+        try:
+            with open(self.filename) as fh:
+                data = json.load(fh)
+        except ValueError:
+            return
+
+        if not isinstance(data, dict) or data.get('version') != INDEX_VERSION:
+            # Built by an older git-sweep, it is built again
+            return
+
+        self.master_sha = data['master_sha']
+        self._order = [i[0] for i in data['commits']]
+        self._commits = dict([(i[0], i[1]) for i in data['commits']])
+        self._index_patch_ids()
+
+    def _index_patch_ids(self):
+        """
+        Maps each patch-id to the commits of master that have it.
+        """
+        self._patch_ids = {}
+        for commit in self._order:
+            patch_id = self._commits[commit]
+            if patch_id is not None:
+                self._patch_ids.setdefault(patch_id, []).append(commit)
+
+        self._positions = dict([(commit, i)
+            for i, commit in enumerate(self._order)])
+
+    def _save(self):
+        """
+        Writes the index so the next run can start from it.
+        """
+        data = {
+            'version': INDEX_VERSION,
+            'master_sha': self.master_sha,
+            'commits': [[i, self._commits[i]] for i in self._order]}
+
+        with atomic_write(self.filename) as fh:
+            json.dump(data, fh)
+
+
+def _git(working_dir, args):
+    """
+    Runs git with ``args`` and returns what it wrote to stdout.
+    """
+    return execute(working_dir, args)[1]
+
+
+def _not_ancestors(working_dir, tip_sha, commits):
+    """
+    Returns the set of ``commits`` that are not reachable from ``tip_sha``.
+    """
+    if not commits:
+        return set()
+
+    (retcode, stdout, stderr) = execute(working_dir, ['rev-list', '--stdin'],
+        input='^{0}\n{1}'.format(tip_sha,
+            ''.join(['{0}\n'.format(i) for i in commits])))
+
+    return commits.intersection(stdout.split())
+
+
+def _patch_ids(working_dir, commits):
+    """
+    Returns a list of ``(patch_id, commit)`` for the commits.
+
+    Merges and commits that change nothing have no patch-id.
+    """
+    if not commits:
+        return []
+
+    timings.command(['diff-tree'])
+    timings.command(['patch-id'])
+    difftree = Popen(
+        ['git', 'diff-tree', '-p', '--root', '--no-color', '--no-ext-diff',
+        '--stdin'], cwd=working_dir, stdin=PIPE, stdout=PIPE)
+    patchid = Popen(['git', 'patch-id'], cwd=working_dir,
+        stdin=difftree.stdout, stdout=PIPE)
+    difftree.stdout.close()
+
+    # Feed diff-tree from another thread, patch-id has to be read at the
+    # same time or the pipes fill up.
+    def feed():
+        difftree.stdin.write(''.join(['{0}\n'.format(i) for i in commits]))
+        difftree.stdin.close()
+
+    feeder = Thread(target=feed)
+    feeder.start()
+    (stdout, stderr) = patchid.communicate()
+    feeder.join()
+    difftree.wait()
+
+    return [tuple(i.split()) for i in stdout.splitlines()]
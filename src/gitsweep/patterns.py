@@ -0,0 +1,318 @@
+import re
+
+#: Patterns starting with this are regular expressions
+REGEX_PREFIX = 're:'
+
+#: Characters that make a pattern a glob, none of them can be in a ref name
+GLOB_CHARS = '*?['
+
+#: Most groups joined into one regular expression, Python 2 allows 100
+MAX_GROUPS = 99
+
+#: Anything that may refer back to a group by its number or name
+_BACKREFERENCE = re.compile(r'\\[1-9]|\(\?P=|\(\?\(')
+
+
+class RefMatcher(object):
+
+    """
+    Tells whether a branch name matches any of a list of patterns.
+
+    A pattern is a branch name, a glob like ``release/*`` or ``hotfix-?``, or
+    a regular expression after ``re:`` like ``re:^tmp-\\d+$``. A glob has to
+    match the whole name and ``*`` matches ``/`` too, a regular expression
+    only has to match somewhere in it.
+
+    The patterns are compiled once. Names go in a set and globs in a trie by
+    the text before their first special character, so a name is only tried
+    against the globs whose start it shares. Globs like ``feature/*-old``,
+    with a single ``*`` before the end, are kept by what follows it. Matching
+    a name against names and those globs takes about as long as reading it
+    however many there are. Other globs that share a start are tried as one
+    regular expression, so each of them adds a little. The regular
+    expressions are joined into as few as can be compiled.
+
+    """
+    def __init__(self, patterns=()):
+        self.names = set()
+        self.globs = _PrefixTrie()
+
+        expressions = []
+        for pattern in patterns:
+            pattern = pattern.strip()
+            if not pattern:
+                continue
+
+            if pattern.startswith(REGEX_PREFIX):
+                expressions.append(pattern[len(REGEX_PREFIX):])
+            elif not _is_glob(pattern):
+                self.names.add(pattern)
+            else:
+                self.globs.add(pattern)
+
+        self.globs.compile()
+
+        self.regexes = _join_regexes(expressions)
+
+    def __nonzero__(self):
+        return bool(self.names or self.globs or self.regexes)
+
+    def prefixes(self):
+        """
+        Returns the text that the names matching each pattern start with, or
+        None if a pattern can match names that start with anything.
+        """
+        if self.regexes:
+            return None
+
+        prefixes = list(self.names) + self.globs.prefixes
+        if '' in prefixes:
+            return None
+
+        return prefixes
+
+    def matches(self, name):
+        """
+        Returns True if ``name`` matches one of the patterns.
+        """
+        if name in self.names:
+            return True
+
+        if self.globs.matches(name):
+            return True
+
+        for regex in self.regexes:
+            if regex.search(name) is not None:
+                return True
+
+        return False
+
+
+def load_patterns(filename):
+    """
+    Reads the skip and include patterns from a file.
+
+    Each line is ``skip <pattern>`` or ``include <pattern>``. Empty lines and
+    lines starting with ``#`` are left out. Returns a tuple of the ``(skip,
+    include)`` lists.
+    """
+    patterns = {'skip': [], 'include': []}
+
+    with open(filename) as fh:
+        for number, line in enumerate(fh, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+
+            fields = line.split(None, 1)
+            if len(fields) != 2 or not fields[0] in patterns:
+                raise ValueError('{0}:{1}: expected "skip <pattern>" or '
+                    '"include <pattern>"'.format(filename, number))
+
+            patterns[fields[0]].append(fields[1])
+
+    return (patterns['skip'], patterns['include'])
+
+
+def split_patterns(value):
+    """
+    Splits a comma-separated list of patterns from the command-line.
+
+    A comma inside the braces or brackets of a ``re:`` pattern is part of
+    the regular expression, so ``re:^tmp-\\d{2,4}$`` stays one pattern.
+    """
+    patterns = []
+    start = 0
+    regex = value.lstrip().startswith('re:')
+    depth = 0
+    escaped = False
+
+    for position, char in enumerate(value):
+        if escaped:
+            escaped = False
+        elif char == ',' and not depth:
+            patterns.append(value[start:position])
+            start = position + 1
+            regex = value[start:].lstrip().startswith('re:')
+        elif not regex:
+            continue
+        elif char == '\\':
+            escaped = True
+        elif char in '{[':
+            depth += 1
+        elif char in '}]' and depth:
+            depth -= 1
+    patterns.append(value[start:])
+
+    return [i.strip() for i in patterns if i.strip()]
+
+
+def _join_regexes(expressions):
+    """
+    Compiles the regular expressions ``expressions`` into as few as it can.
+
+    Joining them renumbers their groups, so an expression that refers back to
+    a group starts a new one, as does one whose groups would go over
+    :py:data:`MAX_GROUPS` or clash by name.
+    """
+    regexes = []
+    chunk = []
+    groups = 0
+    names = set()
+
+    for expression in expressions:
+        compiled = re.compile(expression)
+        if chunk and (_BACKREFERENCE.search(expression) or
+                groups + compiled.groups > MAX_GROUPS or
+                names.intersection(compiled.groupindex)):
+            regexes.append(_join(chunk))
+            chunk = []
+            groups = 0
+            names = set()
+
+        chunk.append(expression)
+        groups += compiled.groups
+        names.update(compiled.groupindex)
+
+    if chunk:
+        regexes.append(_join(chunk))
+
+    return regexes
+
+
+def _join(expressions):
+    """
+    Compiles a regular expression that matches if any of ``expressions`` do.
+    """
+    return re.compile('|'.join(['(?:{0})'.format(i) for i in expressions]))
+
+
+class _PrefixTrie(object):
+
+    """
+    A set of globs kept by the text before their first special character.
+
+    A glob that is that text followed by ``*`` matches every name that gets
+    to its node, and one followed by ``*`` and more text matches the names
+    that end with that text. The others are joined into one regular
+    expression for each node, tried on the rest of the name.
+
+    """
+    def __init__(self):
+        self._root = _Node()
+        self._size = 0
+        self.prefixes = []
+
+    def __nonzero__(self):
+        return bool(self._size)
+
+    def add(self, glob):
+        """
+        Adds ``glob``, :py:meth:`compile` has to be called afterwards.
+        """
+        prefix = glob
+        for char in GLOB_CHARS:
+            if char in prefix:
+                prefix = prefix[:prefix.index(char)]
+        rest = glob[len(prefix):]
+        self.prefixes.append(prefix)
+
+        node = self._root
+        for char in prefix:
+            node = node.children.setdefault(char, _Node())
+
+        if rest == '*':
+            node.everything = True
+        elif rest.startswith('*') and not _is_glob(rest[1:]):
+            node.suffixes.add(rest[1:])
+        else:
+            node.rests.append(_glob_to_regex(rest))
+        self._size += 1
+
+    def compile(self):
+        """
+        Compiles the globs of each node into one regular expression.
+        """
+        nodes = [self._root]
+        while nodes:
+            node = nodes.pop()
+            if node.rests:
+                node.regex = _join(node.rests)
+                node.rests = []
+            nodes.extend(node.children.values())
+
+    def matches(self, name):
+        """
+        Returns True if ``name`` matches one of the globs.
+        """
+        node = self._root
+        depth = 0
+        while node is not None:
+            if node.everything:
+                return True
+            if node.suffixes:
+                for start in range(depth, len(name)):
+                    if name[start:] in node.suffixes:
+                        return True
+            if node.regex is not None and node.regex.match(name, depth):
+                return True
+            if depth == len(name):
+                return False
+            node = node.children.get(name[depth])
+            depth += 1
+
+        return False
+
+
+class _Node(object):
+
+    """
+    A node of a :py:class:`_PrefixTrie`.
+
+    """
+    __slots__ = ('children', 'everything', 'suffixes', 'rests', 'regex')
+
+    def __init__(self):
+        self.children = {}
+        self.everything = False
+        self.suffixes = set()
+        self.rests = []
+        self.regex = None
+
+
+def _is_glob(pattern):
+    """
+    Returns True if ``pattern`` has any of the :py:data:`GLOB_CHARS`.
+    """
+    for char in GLOB_CHARS:
+        if char in pattern:
+            return True
+    return False
+
+
+def _glob_to_regex(pattern):
+    """
+    Turns the glob ``pattern`` into a regular expression that has to be
+    matched from where the glob starts to the end of the name.
+    """
+    parts = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        # A ] straight after the [ is one of the characters
+        end = pattern.find(']', i + 2) if char == '[' else -1
+        if char == '*':
+            parts.append('.*')
+        elif char == '?':
+            parts.append('.')
+        elif end != -1:
+            chars = pattern[i + 1:end]
+            if chars.startswith('!'):
+                chars = '^' + chars[1:]
+            parts.append('[{0}]'.format(chars.replace('\\', '\\\\')))
+            i = end
+        else:
+            parts.append(re.escape(char))
+        i += 1
+
+    return '{0}\\Z'.format(''.join(parts))
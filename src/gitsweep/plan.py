@@ -0,0 +1,66 @@
+import json
+
+from .files import atomic_write
+from .refs import RefRecord
+
+#: Version of the format of plan files
+PLAN_VERSION = 1
+
+
+class Plan(object):
+
+    """
+    The branches a preview decided to delete, saved for a later cleanup.
+
+    ``refs`` is a list of ``gitsweep.refs.RefRecord`` with the commit each
+    branch was at when it was inspected, and ``master_sha`` the commit master
+    was at. A cleanup from the plan only deletes a branch that is still at
+    that commit.
+
+    """
+    def __init__(self, remote_name, master_branch, master_sha, refs,
+            detection='cherry'):
+        self.remote_name = remote_name
+        self.master_branch = master_branch
+        self.master_sha = master_sha
+        self.refs = refs
+        self.detection = detection
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Reads a plan that :py:meth:`save` wrote.
+        """
+        with open(filename) as fh:
+            try:
+                data = json.load(fh)
+            except ValueError:
+                raise ValueError('{0} is not a plan'.format(filename))
+
+        if not isinstance(data, dict) or data.get('version') != PLAN_VERSION:
+            raise ValueError('{0} is not a plan this version of git-sweep '
+                'can read'.format(filename))
+
+        remote_name = data['remote']
+
+        return cls(remote_name, data['master_branch'], data['master_sha'],
+            [RefRecord(remote_name, i['name'], i['sha'])
+                for i in data['refs']],
+            detection=data.get('detection', 'cherry'))
+
+    def save(self, filename):
+        """
+        Writes the plan to ``filename`` as JSON.
+        """
+        data = {
+            'version': PLAN_VERSION,
+            'remote': self.remote_name,
+            'master_branch': self.master_branch,
+            'master_sha': self.master_sha,
+            'detection': self.detection,
+            'refs': [{'name': i.remote_head, 'sha': i.sha}
+                for i in self.refs]}
+
+        with atomic_write(filename) as fh:
+            json.dump(data, fh, indent=2, sort_keys=True)
+            fh.write('\n')
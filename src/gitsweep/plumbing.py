@@ -0,0 +1,160 @@
+from subprocess import Popen, PIPE
+from threading import Lock, Thread
+
+from . import timings
+
+
+class CatFile(object):
+
+    """
+    Long-lived ``git cat-file`` processes for looking up objects.
+
+    Starting git for every object that has to be looked at costs far more
+    than the lookup itself. A ``git cat-file --batch-check`` and a ``git
+    cat-file --batch`` process are started the first time they are needed
+    and answer every lookup after that, until :py:meth:`close` is called. It
+    can be used from several threads at once.
+
+    """
+    def __init__(self, working_dir):
+        self.working_dir = working_dir
+        self._procs = {}
+        self._lock = Lock()
+
+    def info(self, name):
+        """
+        Returns ``(sha, type, size)`` for the object ``name`` or None.
+
+        ``name`` can be anything git can turn into an object, like a commit
+        or a ref name.
+        """
+        with self._lock:
+            proc = self._proc('--batch-check')
+            proc.stdin.write('{0}\n'.format(name))
+            proc.stdin.flush()
+
+            return _header(proc.stdout.readline())
+
+    def infos(self, names):
+        """
+        Returns a list with what :py:meth:`info` would for each of ``names``.
+
+        The names are all sent before the answers are read, so the process
+        works through them without waiting on a round trip for each one.
+        """
+        if not names:
+            return []
+
+        with self._lock:
+            proc = self._proc('--batch-check')
+
+            # Write from another thread, if git's answers are not read at the
+            # same time the pipes fill up.
+            def feed():
+                proc.stdin.write(''.join(['{0}\n'.format(i) for i in names]))
+                proc.stdin.flush()
+
+            feeder = Thread(target=feed)
+            feeder.start()
+            headers = [_header(proc.stdout.readline()) for i in names]
+            feeder.join()
+
+            return headers
+
+    def read(self, name):
+        """
+        Returns ``(sha, type, data)`` for the object ``name`` or None.
+        """
+        with self._lock:
+            proc = self._proc('--batch')
+            proc.stdin.write('{0}\n'.format(name))
+            proc.stdin.flush()
+
+            header = _header(proc.stdout.readline())
+            if header is None:
+                return None
+
+            (sha, type, size) = header
+            data = proc.stdout.read(size + 1)[:size]
+
+            return (sha, type, data)
+
+    def resolve(self, name):
+        """
+        Returns the commit ``name`` points to, or None if there is none.
+        """
+        info = self.info(name)
+
+        return info[0] if info else None
+
+    def missing(self, shas):
+        """
+        Returns the set of ``shas`` that are not in the object database.
+        """
+        return set([sha for sha, info in zip(shas, self.infos(shas))
+            if info is None])
+
+    def parents(self, sha):
+        """
+        Returns the parents of commit ``sha`` or None if it isn't a commit.
+        """
+        obj = self.read(sha)
+
+        if obj is None or obj[1] != 'commit':
+            return None
+
+        parents = []
+        for line in obj[2].split('\n'):
+            if not line:
+                # The headers end at the first empty line
+                break
+            if line.startswith('parent '):
+                parents.append(line[len('parent '):])
+
+        return parents
+
+    def close(self):
+        """
+        Stops the processes, they are started again if they are needed.
+        """
+        with self._lock:
+            for proc in self._procs.values():
+                proc.stdin.close()
+                proc.wait()
+            self._procs = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _proc(self, mode):
+        """
+        Returns the ``git cat-file`` process for ``mode``, starting it first
+        if needed.
+        """
+        proc = self._procs.get(mode)
+
+        if proc is None:
+            timings.command(['cat-file', mode])
+            proc = Popen(['git', 'cat-file', mode], cwd=self.working_dir,
+                stdin=PIPE, stdout=PIPE)
+            self._procs[mode] = proc
+
+        return proc
+
+
+def _header(line):
+    """
+    Reads the line ``git cat-file`` writes before each object.
+
+    Returns ``(sha, type, size)`` or None if the object does not exist.
+    """
+    fields = line.split()
+
+    if len(fields) != 3:
+        # Objects that don't exist are reported as "<name> missing"
+        return None
+
+    return (fields[0], fields[1], int(fields[2]))
@@ -0,0 +1,201 @@
+from multiprocessing.pool import ThreadPool
+
+from git import GitCommandError
+
+from .base import execute
+from .inspector import Inspector
+from .fetcher import Fetcher, fetch_kwargs
+from .patchindex import PatchIndex
+from .refs import RefRecord
+
+
+def fetch_remotes(repo, remote_names, narrow=False, filter=None,
+        depth=None, partial=False):
+    """
+    Fetches all of ``remote_names`` at the same time.
+
+    This is a single ``git fetch --multiple`` that fetches up to one remote
+    per job, git takes care of keeping them out of each other's way. The
+    options are the ones of :py:meth:`gitsweep.fetcher.Fetcher.fetch`, with
+    ``narrow`` the remotes' own refspecs are used without tags.
+    """
+    kwargs = fetch_kwargs(repo, remote_names, filter=filter, depth=depth,
+        partial=partial)
+
+    args = ['fetch', '--multiple', '--jobs={0}'.format(len(remote_names))]
+    if narrow:
+        args.extend(['--no-tags', '--prune'])
+    for name, value in sorted(kwargs.items()):
+        args.append('--{0}={1}'.format(name, value))
+    args.extend(remote_names)
+
+    (retcode, stdout, stderr) = execute(repo.working_dir, args)
+
+    if retcode != 0:
+        raise GitCommandError(['git'] + args, retcode, stderr)
+
+
+def list_remotes(repo, remote_names, master_branch='master'):
+    """
+    Lists the branches of all of ``remote_names`` at the same time.
+
+    Returns a dictionary of remote names to the refs the remotes reported, see
+    :py:meth:`gitsweep.fetcher.Fetcher.ls_remote`. The commits that are
+    missing are fetched afterwards, one remote after the other.
+    """
+    fetchers = [Fetcher(repo, remote_name=i, master_branch=master_branch)
+        for i in remote_names]
+
+    pool = ThreadPool(len(fetchers))
+    try:
+        listed = pool.map(lambda i: i.ls_remote(), fetchers)
+    finally:
+        pool.terminate()
+        pool.join()
+
+    return dict([(fetcher.remote_name, fetcher.fetch_missing(refs))
+        for fetcher, refs in zip(fetchers, listed)])
+
+
+class MultiRemoteInspector(object):
+
+    """
+    Finds the merged refs of several remotes of the same repository.
+
+    Forks and mirrors share most of their history, so the work is shared too.
+    Remotes whose master branches point at the same commit are inspected
+    together, and a commit that is the tip of branches on more than one of
+    them is only looked at once. When the master branches differ, the tips
+    are first inspected against the commit all of them share, and only the
+    tips that are not merged into it are inspected for each master. With
+    ``detection='patch-id'`` one patch-id index is shared by all of the
+    masters, so the history they share is only worked out once.
+
+    The rest of the arguments are the same as for
+    :py:class:`gitsweep.inspector.Inspector`, ``refs`` is a dictionary of
+    remote names to their refs. ``older_than`` and ``author_inactive`` are
+    applied to each remote on its own.
+
+    Snapshots are kept per remote by branch name, they are not used here. The
+    merge cache is keyed by commits and is shared by all the remotes.
+
+    """
+    def __init__(self, repo, remote_names, master_branch='master', jobs=1,
+            cache=None, commit_graph=True, detection='cherry', refs=None,
+            older_than=None, author_inactive=None):
+        self.repo = repo
+        self.remote_names = remote_names
+        self.master_branch = master_branch
+        self.jobs = jobs
+        self.cache = cache
+        self.commit_graph = commit_graph
+        self.detection = detection
+        self.refs = refs or {}
+        self.older_than = older_than
+        self.author_inactive = author_inactive
+
+    def merged_refs(self, skip=[], include=[]):
+        """
+        Returns the merged refs of every remote.
+
+        They are in the order of ``remote_names``, and sorted by branch name
+        for each remote.
+        """
+        return [ref for ref, merged in self.verdicts(skip, include)
+            if merged]
+
+    def verdicts(self, skip=[], include=[]):
+        """
+        Returns a list of ``(ref, merged)`` for every ref that is inspected,
+        in the same order as :py:meth:`merged_refs`.
+        """
+        # Group the remotes by the commit their master branch is at
+        groups = []
+        by_master = {}
+        remote_refs = {}
+        for remote_name in self.remote_names:
+            reader = Inspector(self.repo, remote_name=remote_name,
+                master_branch=self.master_branch,
+                refs=self.refs.get(remote_name), older_than=self.older_than,
+                author_inactive=self.author_inactive)
+            (master, remote_refs[remote_name]) = reader.candidates(
+                skip=skip, include=include)
+            reader.close()
+
+            if not master.sha in by_master:
+                by_master[master.sha] = []
+                groups.append((master.sha, by_master[master.sha]))
+            by_master[master.sha].append(remote_name)
+
+        patch_index = None
+        if self.detection == 'patch-id':
+            patch_index = PatchIndex.for_repo(self.repo, self.master_branch)
+
+        # Tips merged into the commit every master has are merged into all of
+        # them, they only have to be inspected once.
+        shared = set()
+        base = self._merge_base([i[0] for i in groups])
+        if base is not None:
+            tips = set()
+            for refs in remote_refs.values():
+                tips.update([i.sha for i in refs])
+            shared = self._merged_tips(self.remote_names[0], base,
+                sorted(tips), patch_index)
+
+        merged = {}
+        for master_sha, remote_names in groups:
+            if master_sha == base:
+                # Every tip was already inspected against this commit
+                for remote_name in remote_names:
+                    merged[remote_name] = shared
+                continue
+
+            tips = set()
+            for remote_name in remote_names:
+                tips.update([i.sha for i in remote_refs[remote_name]
+                    if not i.sha in shared])
+
+            group_merged = shared | self._merged_tips(
+                remote_names[0], master_sha, sorted(tips), patch_index)
+            for remote_name in remote_names:
+                merged[remote_name] = group_merged
+
+        verdicts = []
+        for remote_name in self.remote_names:
+            verdicts.extend([(i, i.sha in merged[remote_name])
+                for i in remote_refs[remote_name]])
+
+        return verdicts
+
+    def _merge_base(self, master_shas):
+        """
+        Returns the best common ancestor of ``master_shas``, or None if there
+        is only one of them or they have nothing in common.
+        """
+        if len(master_shas) < 2:
+            return None
+
+        (retcode, stdout, stderr) = execute(self.repo.working_dir,
+            ['merge-base', '--octopus'] + list(master_shas))
+
+        return stdout.strip() or None
+
+    def _merged_tips(self, remote_name, master_sha, tips, patch_index=None):
+        """
+        Returns the set of ``tips`` that are merged into ``master_sha``.
+
+        The tips are inspected as if they were the branches of
+        ``remote_name``, each one named after its commit.
+        """
+        if not tips:
+            return set()
+
+        refs = [RefRecord(remote_name, self.master_branch, master_sha)]
+        refs.extend([RefRecord(remote_name, i, i) for i in tips])
+
+        inspector = Inspector(self.repo, remote_name=remote_name,
+            master_branch=self.master_branch, jobs=self.jobs,
+            cache=self.cache, commit_graph=self.commit_graph,
+            detection=self.detection, refs=refs, patch_index=patch_index)
+
+        return set([i.sha for i in inspector.merged_refs()])
@@ -0,0 +1,6 @@
+from gitsweep.entrypoints import benchmark
+
+__test__ = False
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,253 @@
+import json
+import time
+import socket
+from os import remove, stat
+from stat import S_ISSOCK
+from os.path import exists
+from threading import Lock, Thread
+from SocketServer import ThreadingMixIn, UnixStreamServer, StreamRequestHandler
+
+from .inspector import Inspector
+from .fetcher import Fetcher
+from .patterns import RefMatcher
+from .snapshot import MemorySnapshot
+
+
+class MergeIndex(object):
+
+    """
+    The verdict for every remote ref, kept up to date in memory.
+
+    Each :py:meth:`refresh` runs an :py:class:`gitsweep.inspector.Inspector`
+    with a :py:class:`gitsweep.snapshot.MemorySnapshot` of the last refresh,
+    so only the refs that moved since then are inspected again. If nothing
+    moved, that is reading the refs and nothing else. ``snapshot`` and
+    ``cache`` are the ones a single run would use, the index starts from what
+    they hold. The rest of the arguments are the ones of the Inspector.
+
+    """
+    def __init__(self, repo, remote_name='origin', master_branch='master',
+            jobs=1, detection='cherry', cache=None, snapshot=None):
+        self.repo = repo
+        self.remote_name = remote_name
+        self.master_branch = master_branch
+        self.jobs = jobs
+        self.detection = detection
+        self.cache = cache
+        self.snapshot = MemorySnapshot(initial=snapshot)
+        self.master_sha = None
+        self.verdicts = []
+        self.refreshed = None
+        self._lock = Lock()
+
+    def refresh(self):
+        """
+        Brings the verdicts up to date with the refs.
+
+        Returns the number of refs that had to be inspected.
+        """
+        with self._lock:
+            inspector = Inspector(self.repo, remote_name=self.remote_name,
+                master_branch=self.master_branch, jobs=self.jobs,
+                cache=self.cache, snapshot=self.snapshot,
+                detection=self.detection)
+
+            verdicts = []
+            inspected = 0
+            for ref, merged, method, seconds in inspector.iter_verdicts():
+                verdicts.append((ref, merged))
+                if not method in ('snapshot', 'cache'):
+                    inspected += 1
+
+            # The inspector saved the master it used with the verdicts
+            self.master_sha = self.snapshot.load(self.master_branch)[0]
+            self.verdicts = verdicts
+            self.refreshed = time.time()
+
+            return inspected
+
+    def merged_refs(self, skip=[], include=[]):
+        """
+        Returns the merged refs as of the last refresh.
+
+        ``skip`` and ``include`` are patterns, see
+        :py:class:`gitsweep.patterns.RefMatcher`.
+        """
+        skipped = RefMatcher(skip)
+        included = RefMatcher(include)
+
+        return [ref for ref, merged in self.verdicts
+            if merged and not skipped.matches(ref.remote_head) and
+            (not included or included.matches(ref.remote_head))]
+
+
+class SweepServer(ThreadingMixIn, UnixStreamServer):
+
+    """
+    Answers questions about a :py:class:`MergeIndex` on a Unix socket.
+
+    Requests and answers are JSON objects, one on each line, and a client can
+    send as many requests as it likes on one connection. See
+    :py:meth:`answer` for the requests. The index is refreshed before each
+    preview, and every ``fetch_interval`` seconds after fetching from the
+    remote if that is given.
+
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path, index, fetch_interval=None):
+        self.socket_path = socket_path
+        self.index = index
+        self.fetch_interval = fetch_interval
+        self._stopped = False
+
+        if exists(socket_path):
+            _remove_stale_socket(socket_path)
+
+        UnixStreamServer.__init__(self, socket_path, _RequestHandler)
+
+    def serve(self):
+        """
+        Warms the index up and answers requests until :py:meth:`stop`.
+        """
+        self.index.refresh()
+
+        if self.fetch_interval:
+            fetcher = Thread(target=self._fetch_periodically)
+            fetcher.daemon = True
+            fetcher.start()
+
+        try:
+            self.serve_forever()
+        finally:
+            self.server_close()
+            if exists(self.socket_path):
+                remove(self.socket_path)
+
+    def stop(self):
+        """
+        Stops :py:meth:`serve`, it can be called from any thread.
+        """
+        self._stopped = True
+        # shutdown() waits for serve_forever() so it can't run on its thread
+        Thread(target=self.shutdown).start()
+
+    def answer(self, request):
+        """
+        Returns the answer to ``request``, both dictionaries.
+
+        ``{"action": "preview"}`` answers with the ``merged`` branches, each
+        a dictionary with a ``name`` and a ``sha``. It can have ``skip`` and
+        ``include`` lists of patterns. ``{"action": "status"}`` describes the
+        index without refreshing it and ``{"action": "stop"}`` stops the
+        server.
+        """
+        action = request.get('action')
+        index = self.index
+
+        if action == 'preview':
+            start = time.time()
+            inspected = index.refresh()
+            refs = index.merged_refs(skip=request.get('skip') or [],
+                include=request.get('include') or [])
+            return {
+                'ok': True,
+                'remote': index.remote_name,
+                'master': index.master_sha,
+                'merged': [{'name': i.remote_head, 'sha': i.sha}
+                    for i in refs],
+                'inspected': inspected,
+                'seconds': time.time() - start}
+        elif action == 'status':
+            return {
+                'ok': True,
+                'remote': index.remote_name,
+                'master': index.master_sha,
+                'refs': len(index.verdicts),
+                'merged': len([i for i in index.verdicts if i[1]]),
+                'refreshed': index.refreshed}
+        elif action == 'stop':
+            self.stop()
+            return {'ok': True}
+
+        raise ValueError('Unknown action: {0}'.format(action))
+
+    def _fetch_periodically(self):
+        """
+        Fetches from the remote and refreshes the index until stopped.
+        """
+        index = self.index
+        fetcher = Fetcher(index.repo, remote_name=index.remote_name,
+            master_branch=index.master_branch)
+
+        while not self._stopped:
+            time.sleep(self.fetch_interval)
+            try:
+                fetcher.fetch()
+                index.refresh()
+            except Exception:
+                # The remote may be away for a while, try again next time
+                pass
+
+
+class _RequestHandler(StreamRequestHandler):
+
+    """
+    Answers the requests of one connection to a :py:class:`SweepServer`.
+
+    """
+    def handle(self):
+        for line in iter(self.rfile.readline, ''):
+            if not line.strip():
+                continue
+
+            try:
+                answer = self.server.answer(json.loads(line))
+            except Exception as e:
+                answer = {'ok': False, 'error': str(e)}
+
+            self.wfile.write(json.dumps(answer, sort_keys=True) + '\n')
+            self.wfile.flush()
+
+
+def query(socket_path, request):
+    """
+    Sends ``request`` to the server listening on ``socket_path``.
+
+    Returns the answer, see :py:meth:`SweepServer.answer`.
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+        client.sendall(json.dumps(request) + '\n')
+        fh = client.makefile('r')
+        try:
+            return json.loads(fh.readline())
+        finally:
+            fh.close()
+    finally:
+        client.close()
+
+
+def _remove_stale_socket(socket_path):
+    """
+    Removes the socket a server that is gone left behind.
+
+    Raises an error if a server is still listening on it, or if the path is
+    not a socket at all.
+    """
+    if not S_ISSOCK(stat(socket_path).st_mode):
+        raise RuntimeError('{0} exists and is not a socket'.format(
+            socket_path))
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except socket.error:
+        remove(socket_path)
+        return
+    finally:
+        client.close()
+
+    raise RuntimeError('A server is already listening on {0}'.format(
+        socket_path))
@@ -0,0 +1,102 @@
+import json
+from os.path import join, exists
+
+from .files import atomic_write
+
+
+class RefSnapshot(object):
+
+    """
+    The remote refs seen by the last run and what was decided about them.
+
+    The snapshot holds the master branch, the commit it pointed to and for
+    each ref its commit and whether it was merged. It lives in ``filename``.
+
+    """
+    def __init__(self, filename):
+        self.filename = filename
+
+    @classmethod
+    def for_repo(cls, repo, remote_name, detection='cherry'):
+        """
+        Creates the snapshot for ``remote_name`` in the Git directory of repo.
+
+        Like the merge cache, each way of detecting merged refs gets its own.
+        """
+        filename = 'refs-{0}'.format(remote_name.replace('/', '-'))
+        if detection != 'cherry':
+            filename = '{0}-{1}'.format(filename, detection)
+
+        return cls(join(repo.git_dir, 'git-sweep', filename))
+
+    def load(self, master_branch):
+        """
+        Returns ``(master_sha, refs)`` from the last run or None.
+
+        ``refs`` is a dictionary of branch names to ``(sha, merged)`` tuples.
+        If the last run used a different master branch there is nothing that
+        can be reused and None is returned.
+        """
+        if not exists(self.filename):
+            return None
+
+        try:
+            with open(self.filename) as fh:
+                data = json.load(fh)
+        except ValueError:
+            return None
+
+        if data.get('master_branch') != master_branch:
+            return None
+
+        refs = dict([(name, (sha, merged))
+            for name, (sha, merged) in data['refs'].items()])
+
+        return (data['master_sha'], refs)
+
+    def save(self, master_branch, master_sha, refs):
+        """
+        Writes the snapshot, ``refs`` is in the same form ``load`` returns.
+        """
+        data = {
+            'master_branch': master_branch,
+            'master_sha': master_sha,
+            'refs': dict([(name, [sha, merged])
+                for name, (sha, merged) in refs.items()])}
+
+        with atomic_write(self.filename) as fh:
+            json.dump(data, fh)
+
+
+class MemorySnapshot(object):
+
+    """
+    A :py:class:`RefSnapshot` that is only kept in memory.
+
+    A process that inspects the same refs over and over, like ``git-sweep
+    serve``, uses it to skip reading and writing the file every time. It
+    starts from what ``initial``, another snapshot, holds if it is given.
+
+    """
+    def __init__(self, initial=None):
+        self.initial = initial
+        self._data = None
+
+    def load(self, master_branch):
+        """
+        Returns ``(master_sha, refs)`` like :py:meth:`RefSnapshot.load`.
+        """
+        if self._data is None:
+            return self.initial.load(master_branch) if self.initial else None
+
+        (saved_branch, master_sha, refs) = self._data
+        if saved_branch != master_branch:
+            return None
+
+        return (master_sha, refs)
+
+    def save(self, master_branch, master_sha, refs):
+        """
+        Keeps ``refs``, in the same form ``load`` returns.
+        """
+        self._data = (master_branch, master_sha, dict(refs))
@@ -0,0 +1,150 @@
+import time
+from os.path import join, basename
+from unittest import TestCase
+from uuid import uuid4 as uuid
+
+from git import Actor
+
+from gitsweep import timings
+from gitsweep.activity import parse_age, read_activity, stale_refs
+from gitsweep.inspector import Inspector
+from gitsweep.plumbing import CatFile
+from gitsweep.refs import RefRecord
+from gitsweep.tests.testcases import GitSweepTestCase
+
+DAY = 24 * 60 * 60
+
+
+class TestParseAge(TestCase):
+
+    """
+    Ages are read from the command-line.
+
+    """
+    def test_units(self):
+        """
+        Each unit is turned into seconds.
+        """
+        self.assertEqual(90 * DAY, parse_age('90d'))
+        self.assertEqual(90 * DAY, parse_age('90'))
+        self.assertEqual(2 * 7 * DAY, parse_age('2w'))
+        self.assertEqual(3 * 60 * 60, parse_age('3h'))
+        self.assertEqual(5, parse_age('5s'))
+
+    def test_invalid(self):
+        """
+        Anything else is refused.
+        """
+        for value in ('', 'd', '-1d', '3y', 'ninety'):
+            self.assertRaises(ValueError, parse_age, value)
+
+
+class TestActivity(GitSweepTestCase):
+
+    """
+    Only branches that were left alone long enough are swept.
+
+    """
+    def setUp(self):
+        super(TestActivity, self).setUp()
+
+        self.now = time.time()
+
+        # An old branch by someone who has gone quiet, an old one by someone
+        # who still works on another branch and a new one.
+        self.branch('stale', 200, 'gone@example.com')
+        self.branch('old', 120, 'busy@example.com')
+        self.branch('new', 1, 'busy@example.com')
+
+    def tearDown(self):
+        super(TestActivity, self).tearDown()
+
+        timings.stop()
+
+    def branch(self, name, days, email):
+        """
+        Makes branch ``name`` with a commit ``days`` old by ``email``.
+        """
+        self.command('git checkout -b {0} master'.format(name))
+
+        filename = join(self.repodir, uuid().hex[:8])
+        with open(filename, 'w') as fh:
+            fh.write(uuid().hex)
+
+        date = '{0} +0000'.format(int(self.now - days * DAY))
+        author = Actor(email.split('@')[0], email)
+        self.repo.index.add([basename(filename)])
+        self.repo.index.commit('Adding {0}'.format(basename(filename)),
+            author=author, committer=author, author_date=date,
+            commit_date=date)
+
+        self.command('git checkout master')
+
+    def stale(self, **kwargs):
+        """
+        Returns the names of the stale branches of the clone.
+        """
+        activity = read_activity(self.remote.working_dir, 'origin')
+        refs = [RefRecord('origin', i, activity[i].sha)
+            for i in ('new', 'old', 'stale')]
+
+        return [i.remote_head for i in stale_refs(refs, activity,
+            now=self.now, **kwargs)]
+
+    def test_read_activity(self):
+        """
+        Reads every branch with one git command.
+        """
+        self.update_remote()
+        recorded = timings.start()
+        activity = read_activity(self.remote.working_dir, 'origin')
+
+        self.assertEqual(1, recorded.commands['for-each-ref'])
+        self.assertEqual(['HEAD', 'master', 'new', 'old', 'stale'],
+            sorted(activity))
+        self.assertEqual('<gone@example.com>', activity['stale'].author)
+        self.assertEqual(int(self.now - 200 * DAY), activity['stale'].date)
+
+    def test_older_than(self):
+        """
+        Only branches whose tip is old enough are kept.
+        """
+        self.assertEqual(['old', 'stale'], self.stale(older_than=90 * DAY))
+        self.assertEqual(['stale'], self.stale(older_than=180 * DAY))
+
+    def test_author_inactive(self):
+        """
+        Only branches whose author has not been seen for a while are kept.
+        """
+        self.assertEqual(['stale'], self.stale(author_inactive=90 * DAY))
+        self.assertEqual(['new', 'old', 'stale'],
+            self.stale(author_inactive=0))
+
+    def test_moved_refs(self):
+        """
+        A ref that points somewhere else than the local branch is read from
+        its commit.
+        """
+        activity = read_activity(self.remote.working_dir, 'origin')
+        refs = [RefRecord('origin', 'new', activity['stale'].sha)]
+
+        with CatFile(self.remote.working_dir) as cat_file:
+            self.assertEqual(['new'], [i.remote_head for i in stale_refs(
+                refs, activity, older_than=90 * DAY, cat_file=cat_file,
+                now=self.now)])
+
+        self.assertEqual([], stale_refs(refs, activity, older_than=90 * DAY,
+            now=self.now))
+
+    def test_inspector(self):
+        """
+        The inspector only looks at the branches that are old enough.
+        """
+        self.command('git merge stale new')
+
+        inspector = Inspector(self.remote, older_than=90 * DAY)
+
+        self.assertEqual(['stale'],
+            [i.remote_head for i in inspector.merged_refs()])
+        self.assertEqual(['old', 'stale'],
+            [i[0].remote_head for i in inspector.iter_verdicts()])
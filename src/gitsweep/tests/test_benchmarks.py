@@ -0,0 +1,113 @@
+import json
+from os.path import join, exists
+from tempfile import mkdtemp
+from shutil import rmtree
+from unittest import TestCase
+
+from git import Repo
+
+from gitsweep.inspector import Inspector
+from gitsweep.benchmarks.synthetic import generate, branch_kinds
+from gitsweep.benchmarks.run import Benchmark, main, parse_mix
+
+
+class TestSyntheticRepository(TestCase):
+
+    """
+    Generated repositories have the branches they claim to have.
+
+    """
+    def setUp(self):
+        self.workdir = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.workdir)
+
+    def merged_refs(self, synthetic, **kwargs):
+        repo = Repo(synthetic.clone_dir)
+        return [i.remote_head for i in Inspector(repo, **kwargs).merged_refs()]
+
+    def test_branch_kinds_follow_mix(self):
+        """
+        The kinds of branches are handed out in proportion to the mix.
+        """
+        kinds = branch_kinds(10, {'merged': 3, 'unmerged': 2})
+
+        self.assertEqual(6, kinds.count('merged'))
+        self.assertEqual(4, kinds.count('unmerged'))
+
+    def test_cherry_detection(self):
+        """
+        Only the branches merged with a merge commit are found by default.
+        """
+        synthetic = generate(self.workdir, branches=12)
+
+        self.assertEqual(12, len(synthetic.kinds))
+        self.assertEqual(synthetic.expected_merged(),
+            self.merged_refs(synthetic))
+
+    def test_patch_id_detection(self):
+        """
+        Rebased branches are found when comparing patches.
+        """
+        synthetic = generate(self.workdir, branches=12, commits_per_branch=2)
+
+        self.assertEqual(synthetic.expected_merged('patch-id'),
+            self.merged_refs(synthetic, detection='patch-id'))
+
+
+class TestBenchmarkRun(TestCase):
+
+    """
+    The benchmark writes its results as JSON.
+
+    """
+    def setUp(self):
+        self.workdir = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.workdir)
+
+    def test_parse_mix(self):
+        """
+        The mix is read from the command-line.
+        """
+        self.assertEqual({'merged': 2.0, 'squash': 1.0},
+            parse_mix('merged=2,squash=1'))
+        self.assertRaises(ValueError, parse_mix, 'octopus=1')
+
+    def test_results_file(self):
+        """
+        Every case is timed and the results are saved.
+        """
+        output = join(self.workdir, 'results.json')
+
+        main(['--branches', '8', '--repeat', '1', '--output', output,
+            '--workdir', self.workdir])
+
+        with open(output) as fh:
+            results = json.load(fh)
+
+        self.assertEqual(8, results['parameters']['branches'])
+        self.assertEqual(['inspector.merged_refs',
+            'inspector.merged_refs[commit-graph]',
+            'inspector.merged_refs[patch-id]', 'deleter.remove_remote_refs',
+            'cli.preview', 'cli.cleanup', 'cli.startup'],
+            [i['name'] for i in results['results']])
+        for result in results['results']:
+            self.assertEqual(1, len(result['seconds']))
+        self.assertTrue('git' in results['environment'])
+
+    def test_commit_graph_case_writes_graph(self):
+        """
+        The commit-graph case times a clone that has a commit-graph.
+        """
+        synthetic = generate(self.workdir, branches=4)
+        benchmark = Benchmark(synthetic, self.workdir, repeat=1)
+        setup = dict([(name, setup)
+            for name, setup, run in benchmark.cases()])
+
+        repo = setup['inspector.merged_refs[commit-graph]']()
+
+        self.assertTrue(exists(join(repo.git_dir, 'objects', 'info',
+            'commit-graph')))
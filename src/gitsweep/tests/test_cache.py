@@ -0,0 +1,93 @@
+from os.path import join, exists
+from tempfile import mkdtemp
+from shutil import rmtree
+from unittest import TestCase
+
+from gitsweep.cache import MergeCache
+
+
+class TestMergeCache(TestCase):
+
+    """
+    Merge results can be saved and read back between runs.
+
+    """
+    def setUp(self):
+        self.cachedir = mkdtemp()
+        self.filename = join(self.cachedir, 'git-sweep', 'merge-cache')
+
+    def tearDown(self):
+        rmtree(self.cachedir)
+
+    def test_unknown_entry(self):
+        """
+        An entry that was never set is not known.
+        """
+        cache = MergeCache(self.filename)
+
+        self.assertEqual(None, cache.get('a' * 40, 'b' * 40))
+
+    def test_keyed_by_both_commits(self):
+        """
+        The answer belongs to the pair of branch and master commits.
+        """
+        cache = MergeCache(self.filename)
+        cache.set('a' * 40, 'b' * 40, True)
+
+        self.assertEqual(True, cache.get('a' * 40, 'b' * 40))
+        self.assertEqual(None, cache.get('a' * 40, 'c' * 40))
+
+    def test_save_and_load(self):
+        """
+        Saved entries are there the next time the cache is created.
+        """
+        cache = MergeCache(self.filename)
+        cache.set('a' * 40, 'b' * 40, True)
+        cache.set('c' * 40, 'b' * 40, False)
+        cache.save()
+
+        cache = MergeCache(self.filename)
+
+        self.assertEqual(2, len(cache))
+        self.assertEqual(True, cache.get('a' * 40, 'b' * 40))
+        self.assertEqual(False, cache.get('c' * 40, 'b' * 40))
+
+    def test_nothing_to_save(self):
+        """
+        No file is written if nothing was added.
+        """
+        MergeCache(self.filename).save()
+
+        self.assertFalse(exists(self.filename))
+
+    def test_evicts_least_recently_used(self):
+        """
+        Only the most recently used entries are kept once it is full.
+        """
+        cache = MergeCache(self.filename, max_entries=2)
+        cache.set('a' * 40, 'f' * 40, True)
+        cache.set('b' * 40, 'f' * 40, True)
+        # Using the first entry makes the second one the oldest
+        cache.get('a' * 40, 'f' * 40)
+        cache.set('c' * 40, 'f' * 40, True)
+        cache.save()
+
+        cache = MergeCache(self.filename, max_entries=2)
+
+        self.assertEqual(2, len(cache))
+        self.assertEqual(None, cache.get('b' * 40, 'f' * 40))
+        self.assertEqual(True, cache.get('a' * 40, 'f' * 40))
+        self.assertEqual(True, cache.get('c' * 40, 'f' * 40))
+
+    def test_ignores_damaged_lines(self):
+        """
+        Lines that cannot be read are skipped.
+        """
+        cache = MergeCache(self.filename)
+        cache.set('a' * 40, 'b' * 40, True)
+        cache.save()
+
+        with open(self.filename, 'a') as fh:
+            fh.write('garbage\n{0} {1} 2\n'.format('c' * 40, 'b' * 40))
+
+        self.assertEqual(1, len(MergeCache(self.filename)))
@@ -1,4 +1,12 @@
+import sys
+import json
+from os.path import join, exists
+from subprocess import Popen, PIPE
+from textwrap import dedent
+from unittest import TestCase
+
 from mock import patch
+from git import Repo
 
 from gitsweep.tests.testcases import CommandTestCase
 
@@ -21,14 +29,17 @@ class TestHelpMenu(CommandTestCase):
             Clean up your Git remote branches.
 
             optional arguments:
-              -h, --help         show this help message and exit
+              -h, --help            show this help message and exit
 
             action:
               Preview changes or perform clean up
 
-              {preview,cleanup}
-                preview          Preview the branches that will be deleted
-                cleanup          Delete merged branches from the remote
+              {preview,cleanup,repos,serve,watch}
+                preview             Preview the branches that will be deleted
+                cleanup             Delete merged branches from the remote
+                repos               Preview or clean up many repositories at once
+                serve               Keep answering previews on a Unix socket
+                watch               Show the branches as they become merged
             ''', stdout)
 
     def test_fetch(self):
@@ -218,6 +229,217 @@ class TestHelpMenu(CommandTestCase):
             To delete them, run again with `{0}`
             '''.format(cleanup), stdout)
 
+    def test_will_skip_by_pattern(self):
+        """
+        Can skip and include branches by pattern, also from a file.
+        """
+        for i in range(1, 6):
+            self.command('git checkout -b branch{0}'.format(i))
+            self.make_commit()
+            self.command('git checkout master')
+            self.make_commit()
+            self.command('git merge branch{0}'.format(i))
+
+        patterns = join(self.remote.git_dir, 'patterns')
+        with open(patterns, 'w') as fh:
+            fh.write('# Keep the first ones\nskip re:^branch[12]$\n')
+
+        (retcode, stdout, stderr) = self.gscommand(
+            'git-sweep preview --include=branch* --skip=branch5 '
+            '--patterns={0}'.format(patterns))
+
+        self.assertResults('''
+            Fetching from the remote
+            These branches have been merged into master:
+
+              branch3
+              branch4
+
+            To delete them, run again with `git-sweep cleanup --include=branch* --skip=branch5 --patterns={0}`
+            '''.format(patterns), stdout)
+
+    def test_will_preview_with_jobs(self):
+        """
+        Several workers give the same preview as one.
+        """
+        for i in range(1, 6):
+            self.command('git checkout -b branch{0}'.format(i))
+            self.make_commit()
+            self.command('git checkout master')
+            self.make_commit()
+            self.command('git merge branch{0}'.format(i))
+
+        (retcode, stdout, stderr) = self.gscommand(
+            'git-sweep preview --jobs=3')
+
+        self.assertResults('''
+            Fetching from the remote
+            These branches have been merged into master:
+
+              branch1
+              branch2
+              branch3
+              branch4
+              branch5
+
+            To delete them, run again with `git-sweep cleanup --jobs=3`
+            ''', stdout)
+
+    def test_will_preview_old_branches(self):
+        """
+        Only branches that are old enough are previewed.
+        """
+        self.command('git checkout -b branch1')
+        self.make_commit()
+        self.command('git checkout master')
+        self.command('git merge branch1')
+
+        (retcode, stdout, stderr) = self.gscommand(
+            'git-sweep preview --older-than=90d')
+
+        self.assertResults('''
+            Fetching from the remote
+            No remote branches are available for cleaning up
+            ''', stdout)
+
+        (retcode, stdout, stderr) = self.gscommand(
+            'git-sweep preview --older-than=0d')
+
+        self.assertTrue('  branch1' in stdout)
+
+    def test_will_cleanup_plan(self):
+        """
+        Will delete the branches of a plan without inspecting again.
+        """
+        for i in range(1, 4):
+            self.command('git checkout -b branch{0}'.format(i))
+            self.make_commit()
+            self.command('git checkout master')
+            self.command('git merge branch{0}'.format(i))
+
+        filename = join(self.remote.working_dir, 'plan.json')
+
+        (retcode, stdout, stderr) = self.gscommand(
+            'git-sweep preview --write-plan={0}'.format(filename))
+
+        self.assertTrue('To delete them, run `git-sweep cleanup '
+            '--plan={0}`'.format(filename) in stdout)
+
+        # branch2 moves after the plan was made
+        self.command('git checkout branch2')
+        self.make_commit()
+        self.command('git checkout master')
+
+        with patch('gitsweep.inspector.Inspector.__init__',
+                side_effect=AssertionError):
+            (retcode, stdout, stderr) = self.gscommand(
+                'git-sweep cleanup --force --plan={0}'.format(filename))
+
+        self.assertResults('''
+            These branches of origin were merged into master when the plan was made:
+
+              branch1
+              branch2
+              branch3
+
+              deleting branch1 (done)
+              deleting branch2 (failed)
+              deleting branch3 (done)
+
+            All done!
+
+            Tell everyone to run `git fetch --prune` to sync with this remote.
+            (you don't have to, yours is synced)
+            ''', stdout)
+
+        self.assertEqual(['branch2', 'master'],
+            sorted([i.name for i in self.repo.branches]))
+
+    def test_will_check_plan(self):
+        """
+        Will not delete the branches of a plan that no longer applies.
+        """
+        self.command('git checkout -b branch1')
+        self.make_commit()
+        self.command('git checkout master')
+        self.command('git merge --no-ff -m "Merge branch1" branch1')
+
+        filename = join(self.remote.working_dir, 'plan.json')
+
+        self.gscommand('git-sweep preview --write-plan={0}'.format(filename))
+
+        (retcode, stdout, stderr) = self.gscommand(
+            'git-sweep cleanup --force --origin=upstream --plan={0}'.format(
+            filename))
+
+        self.assertEqual(1, retcode)
+        self.assertResults('''
+            --origin upstream does not match the plan, which was made with --origin origin
+            ''', stdout)
+
+        # Master is rewound so branch1 is not merged any more
+        planned = self.repo.commit('master').hexsha
+        self.command('git reset --hard HEAD~1')
+
+        (retcode, stdout, stderr) = self.gscommand(
+            'git-sweep cleanup --force --plan={0}'.format(filename))
+
+        self.assertEqual(1, retcode)
+        self.assertResults('''
+            master of origin moved since the plan was made, run preview again
+            ''', stdout)
+        self.assertEqual(['branch1', 'master'],
+            sorted([i.name for i in self.repo.branches]))
+
+        # Moving forward from where it was is fine
+        self.command('git reset --hard {0}'.format(planned))
+        self.make_commit()
+        self.update_remote()
+
+        (retcode, stdout, stderr) = self.gscommand(
+            'git-sweep cleanup --force --master=master --plan={0}'.format(
+            filename))
+
+        self.assertEqual(0, retcode)
+        self.assertEqual(['master'], [i.name for i in self.repo.branches])
+
+    def test_will_delete_concurrently(self):
+        """
+        Will run several pushes at once and show each branch when it is done.
+        """
+        for i in range(1, 6):
+            self.command('git checkout -b branch{0}'.format(i))
+            self.make_commit()
+            self.command('git checkout master')
+            self.command('git merge branch{0}'.format(i))
+
+        (retcode, stdout, stderr) = self.gscommand(
+            'git-sweep cleanup --force --batch-size=1 --delete-jobs=3')
+
+        self.assertEqual(['  deleting branch{0} (done)'.format(i)
+            for i in range(1, 6)], sorted([i for i in stdout.splitlines()
+                if i.startswith('  deleting ')]))
+        self.assertEqual(['master'], [i.name for i in self.repo.branches])
+
+    def test_will_watch(self):
+        """
+        Shows the merged branches until stopped.
+        """
+        self.command('git checkout -b branch1')
+        self.make_commit()
+        self.command('git checkout master')
+        self.command('git merge branch1')
+        self.update_remote()
+        with patch('gitsweep.watcher.RefWatcher.changes',
+                side_effect=KeyboardInterrupt):
+            (retcode, stdout, stderr) = self.gscommand('git-sweep watch')
+
+        self.assertResults('''
+            Watching origin for branches merged into master, stop with Ctrl-C
+
+            + branch1
+            ''', stdout)
+
     def test_will_force_clean(self):
         """
         Will cleanup immediately if forced.
@@ -252,3 +474,314 @@ class TestHelpMenu(CommandTestCase):
             Tell everyone to run `git fetch --prune` to sync with this remote.
             (you don't have to, yours is synced)
             ''', stdout)
+
+    def test_will_force_clean_in_batches(self):
+        """
+        Deletes in atomic batches and reports each branch.
+        """
+        for i in range(1, 4):
+            self.command('git checkout -b branch{0}'.format(i))
+            self.make_commit()
+            self.command('git checkout master')
+            self.make_commit()
+            self.command('git merge branch{0}'.format(i))
+
+        (retcode, stdout, stderr) = self.gscommand(
+            'git-sweep cleanup --force --batch-size=2 --atomic '
+            '--delete-jobs=1')
+
+        self.assertResults('''
+            Fetching from the remote
+            These branches have been merged into master:
+
+              branch1
+              branch2
+              branch3
+
+              deleting branch1 (done)
+              deleting branch2 (done)
+              deleting branch3 (done)
+
+            All done!
+
+            Tell everyone to run `git fetch --prune` to sync with this remote.
+            (you don't have to, yours is synced)
+            ''', stdout)
+        self.assertEqual(['master'], [i.name for i in self.repo.refs])
+
+    def test_will_cache_results(self):
+        """
+        Results are kept in the Git directory unless told not to.
+        """
+        cachefile = join(self.remote.git_dir, 'git-sweep', 'merge-cache')
+
+        self.command('git checkout -b branch1')
+        self.command('git checkout master')
+
+        self.gscommand('git-sweep preview --no-cache')
+
+        self.assertFalse(exists(cachefile))
+
+        self.gscommand('git-sweep preview')
+
+        self.assertTrue(exists(cachefile))
+
+    def test_will_preview_from_ls_remote(self):
+        """
+        Can list the remote branches instead of fetching.
+
+        The branches are made after the clone, it has to get them itself.
+        """
+        for i in range(1, 3):
+            self.command('git checkout -b branch{0}'.format(i))
+            self.make_commit()
+            self.command('git checkout master')
+            self.make_commit()
+            self.command('git merge branch{0}'.format(i))
+
+        (retcode, stdout, stderr) = self.gscommand(
+            'git-sweep cleanup --ls-remote --force')
+
+        self.assertResults('''
+            Listing the branches on the remote
+            These branches have been merged into master:
+
+              branch1
+              branch2
+
+              deleting branch1 (done)
+              deleting branch2 (done)
+
+            All done!
+
+            Tell everyone to run `git fetch --prune` to sync with this remote.
+            (you don't have to, yours is synced)
+            ''', stdout)
+        self.assertEqual(['master'], [i.name for i in self.repo.refs])
+
+    def test_will_show_timings(self):
+        """
+        Can report how long each phase took.
+        """
+        self.command('git checkout -b branch1')
+        self.make_commit()
+        self.command('git checkout master')
+        self.command('git merge branch1')
+
+        timingsfile = join(self.repodir, 'timings.json')
+        profilefile = join(self.repodir, 'profile.stats')
+
+        (retcode, stdout, stderr) = self.gscommand(
+            'git-sweep preview --timings --timings-json {0} '
+            '--profile {1}'.format(timingsfile, profilefile))
+
+        self.assertResults('''
+            Fetching from the remote
+            These branches have been merged into master:
+
+              branch1
+
+            To delete them, run again with `git-sweep cleanup --timings '''
+            '''--timings-json {0} --profile {1}`
+            '''.format(timingsfile, profilefile), stdout)
+        self.assertTrue('Timings:' in stderr)
+        self.assertTrue('Git commands:' in stderr)
+
+        with open(timingsfile) as fh:
+            recorded = json.load(fh)
+
+        self.assertEqual(['total', 'fetch', 'inspect', 'inspect.refs',
+            'inspect.known', 'inspect.reachable', 'inspect.save'],
+            [i['name'] for i in recorded['phases']])
+        self.assertEqual(1, recorded['commands']['fetch'])
+        self.assertTrue(exists(profilefile))
+
+    def test_will_sweep_many_repositories(self):
+        """
+        Can preview and clean up several repositories at once.
+        """
+        self.command('git checkout -b branch1')
+        self.make_commit()
+        self.command('git checkout master')
+        self.command('git merge branch1')
+
+        clone = self.remote.working_dir
+        missing = join(self.repodir, 'missing')
+
+        (retcode, stdout, stderr) = self.gscommand(
+            'git-sweep repos preview {0} {1}'.format(clone, missing))
+
+        self.assertResults('''
+            Sweeping 2 repositories
+
+            {0}
+              branch1
+
+            {1}
+              failed: {1}
+
+            Found 1 merged branches in 2 repositories, 1 failed
+
+            To delete them, run again with `git-sweep repos cleanup {0} {1}`
+            '''.format(clone, missing), stdout)
+        self.assertEqual(1, retcode)
+
+        (retcode, stdout, stderr) = self.gscommand(
+            'git-sweep repos --nofetch preview {0}'.format(clone))
+
+        self.assertTrue('To delete them, run again with `git-sweep repos '
+            '--nofetch cleanup {0}`'.format(clone) in stdout)
+
+        (retcode, stdout, stderr) = self.gscommand(
+            'git-sweep repos cleanup {0} --force'.format(clone))
+
+        self.assertResults('''
+            Sweeping 1 repositories
+
+            {0}
+              branch1
+
+            Found 1 merged branches in 1 repositories, 0 failed
+
+            {0}
+              deleting branch1 (done)
+
+            Deleted 1 of 1 branches
+            '''.format(clone), stdout)
+        self.assertEqual(0, retcode)
+        self.assertEqual(['master'], [i.name for i in self.repo.branches])
+
+    def test_will_sweep_several_remotes(self):
+        """
+        Can clean up several remotes at once.
+        """
+        self.command('git checkout -b branch1')
+        self.make_commit()
+        self.command('git checkout master')
+        self.command('git merge branch1')
+
+        forkdir = join(self.repodir, 'fork')
+        fork = Repo.clone(self.repo, forkdir)
+        fork.git.branch('feature', 'origin/branch1')
+        self.remote.create_remote('upstream', forkdir)
+
+        (retcode, stdout, stderr) = self.gscommand(
+            'git-sweep cleanup --origin=origin,upstream --force')
+
+        self.assertResults('''
+            Fetching from the remotes
+            These branches have been merged into master:
+
+              origin/branch1
+              upstream/feature
+
+              deleting origin/branch1 (done)
+              deleting upstream/feature (done)
+
+            All done!
+
+            Tell everyone to run `git fetch --prune` to sync with these remotes.
+            (you don't have to, yours is synced)
+            ''', stdout)
+        self.assertEqual(['master'], [i.name for i in fork.branches])
+
+    def test_will_write_records_for_several_remotes(self):
+        """
+        Several remotes write the same records as one does.
+        """
+        self.command('git checkout -b branch1')
+        self.make_commit()
+        self.command('git checkout master')
+        self.command('git merge branch1')
+
+        forkdir = join(self.repodir, 'fork')
+        fork = Repo.clone(self.repo, forkdir)
+        fork.git.branch('feature', 'origin/branch1')
+        self.remote.create_remote('upstream', forkdir)
+
+        (retcode, stdout, stderr) = self.gscommand(
+            'git-sweep cleanup --origin=origin,upstream --force '
+            '--format=ndjson')
+
+        records = [json.loads(i) for i in stdout.splitlines()]
+
+        self.assertEqual([
+            ('ref', 'origin', 'branch1', True),
+            ('ref', 'upstream', 'feature', True),
+            ('delete', 'origin', 'branch1', True),
+            ('delete', 'upstream', 'feature', True)],
+            [(i['type'], i['remote'], i['name'],
+            i.get('merged', i.get('deleted'))) for i in records[:-1]])
+        self.assertEqual({'type': 'summary', 'action': 'cleanup',
+            'remote': 'origin,upstream', 'master': 'master', 'inspected': 2,
+            'merged': 2, 'deleted': 2, 'failed': 0}, records[-1])
+        self.assertTrue('Fetching from the remotes' in stderr)
+
+    def test_will_write_records(self):
+        """
+        Can write a JSON record for each branch and a summary.
+        """
+        self.command('git checkout -b branch1')
+        self.make_commit()
+        self.command('git checkout master')
+        self.command('git merge branch1')
+        self.command('git checkout -b branch2')
+        self.make_commit()
+        self.command('git checkout master')
+
+        (retcode, stdout, stderr) = self.gscommand(
+            'git-sweep cleanup --format=ndjson --force --no-cache')
+
+        records = [json.loads(i) for i in stdout.splitlines()]
+
+        self.assertEqual([
+            ('ref', 'branch1', True),
+            ('ref', 'branch2', False),
+            ('delete', 'branch1', True)],
+            [(i['type'], i['name'], i.get('merged', i.get('deleted')))
+            for i in records[:-1]])
+        self.assertEqual({'type': 'summary', 'action': 'cleanup',
+            'remote': 'origin', 'master': 'master', 'inspected': 2,
+            'merged': 1, 'deleted': 1, 'failed': 0}, records[-1])
+        self.assertTrue('Fetching from the remote' in stderr)
+
+        (retcode, stdout, stderr) = self.gscommand(
+            'git-sweep preview --format=json --nofetch')
+
+        records = json.loads(stdout)
+
+        self.assertEqual(['branch2'],
+            [i['name'] for i in records if i['type'] == 'ref'])
+
+
+class TestStartup(TestCase):
+
+    """
+    Showing the help does not load what the actions need.
+
+    """
+    def test_help_imports(self):
+        """
+        GitPython and the modules that do the work are not imported.
+        """
+        script = dedent('''
+            import sys
+            sys.argv = ['git-sweep', '-h']
+            from gitsweep.entrypoints import main
+            try:
+                main()
+            except SystemExit:
+                pass
+            sys.stderr.write(' '.join(sys.modules))
+            ''')
+
+        proc = Popen([sys.executable, '-c', script], stdout=PIPE,
+            stderr=PIPE)
+        (stdout, stderr) = proc.communicate()
+        modules = stderr.split()
+
+        self.assertTrue('usage: git-sweep' in stdout)
+        self.assertTrue('gitsweep.cli' in modules)
+        for name in ('git', 'gitsweep.inspector', 'gitsweep.deleter',
+                'multiprocessing'):
+            self.assertFalse(name in modules, name)
@@ -0,0 +1,119 @@
+from mock import patch
+from git.cmd import Git
+
+from gitsweep.commitgraph import CommitGraph
+from gitsweep.inspector import Inspector
+from gitsweep.tests.testcases import GitSweepTestCase, InspectorTestCase
+
+
+class TestCommitGraph(GitSweepTestCase, InspectorTestCase):
+
+    """
+    The commit-graph file can answer which refs are merged.
+
+    """
+    def setUp(self):
+        super(TestCommitGraph, self).setUp()
+
+        # Two branches merged normally, three in one octopus merge and one
+        # that is not merged at all.
+        for i in range(1, 7):
+            self.command('git checkout -b branch{0}'.format(i))
+            self.make_commit()
+            self.command('git checkout master')
+            if i < 3:
+                self.make_commit()
+                self.command('git merge branch{0}'.format(i))
+        self.command('git merge branch3 branch4 branch5')
+
+    def write_graph(self):
+        """
+        Writes the commit-graph file of the clone.
+        """
+        Git(self.remote.working_dir).execute(
+            ['git', 'commit-graph', 'write', '--reachable'])
+
+        return CommitGraph.open(self.remote.git_dir)
+
+    def test_no_graph(self):
+        """
+        Nothing is returned if there is no commit-graph file.
+        """
+        self.assertEqual(None, CommitGraph.open(self.remote.git_dir))
+
+    def test_parents(self):
+        """
+        The parents read from the file are the ones git knows about.
+        """
+        graph = self.write_graph()
+
+        revlist = Git(self.remote.working_dir).execute(
+            ['git', 'rev-list', '--parents', '--all']).splitlines()
+        commits = [i.split() for i in revlist]
+        shas = dict([(graph.position(i[0]), i[0]) for i in commits])
+
+        self.assertEqual(len(commits), len(graph))
+
+        for commit in commits:
+            parents = graph.parents(graph.position(commit[0]))
+            self.assertEqual(commit[1:], [shas[i] for i in parents])
+
+    def test_unknown_commit(self):
+        """
+        A commit that is not in the file has no position.
+        """
+        graph = self.write_graph()
+
+        self.assertEqual(None, graph.position('f' * 40))
+
+    def test_merged_refs_from_graph(self):
+        """
+        The Inspector finds the same refs without asking git which ones are
+        reachable, git is only asked about the commits of the others.
+        """
+        self.write_graph()
+
+        inspector = Inspector(self.remote)
+        reachable = inspector._unreachable_tips
+
+        with patch.object(inspector, '_unreachable_tips',
+                side_effect=reachable) as spy:
+            self.assertEqual(
+                ['branch1', 'branch2', 'branch3', 'branch4', 'branch5'],
+                [i.remote_head for i in inspector.merged_refs()])
+
+        self.assertEqual(1, spy.call_count)
+        self.assertEqual(['branch6'],
+            [i.remote_head for i in spy.call_args[0][1]])
+
+    def test_stale_graph(self):
+        """
+        If master moved on since the file was written git is asked.
+        """
+        self.write_graph()
+
+        self.command('git merge branch6')
+
+        inspector = Inspector(self.remote)
+        reachable = inspector._unreachable_tips
+
+        with patch.object(inspector, '_unreachable_tips',
+                side_effect=reachable) as spy:
+            self.assertEqual(
+                ['branch1', 'branch2', 'branch3', 'branch4', 'branch5',
+                'branch6'], [i.remote_head for i in inspector.merged_refs()])
+
+        self.assertTrue(spy.called)
+
+    def test_graph_can_be_turned_off(self):
+        """
+        The Inspector can be told not to read the file.
+        """
+        self.write_graph()
+
+        inspector = Inspector(self.remote, commit_graph=False)
+
+        with patch.object(inspector, '_graph_unreachable_tips') as graph:
+            inspector.merged_refs()
+
+        self.assertFalse(graph.called)
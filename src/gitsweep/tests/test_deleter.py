@@ -1,3 +1,10 @@
+import time
+from threading import Lock
+
+from git import Remote
+from mock import patch
+
+from gitsweep import timings
 from gitsweep.tests.testcases import (GitSweepTestCase, InspectorTestCase,
     DeleterTestCase)
 
@@ -76,3 +83,154 @@ class TestDeleter(GitSweepTestCase, InspectorTestCase, DeleterTestCase):
         after = [i.name for i in remote.refs]
         # Should be down to just master
         self.assertEqual(['master'], after)
+
+    def test_will_delete_in_one_push(self):
+        """
+        All the refs are deleted with a single push.
+        """
+        with patch.object(Remote, 'push', autospec=True,
+                side_effect=Remote.push) as push:
+            pushes = self.deleter.remove_remote_refs(
+                self.merged_refs(refobjs=True))
+
+        self.assertEqual(1, push.call_count)
+        self.assertEqual([True] * 5, [self.deleter.deleted(i) for i in pushes])
+        self.assertEqual(['master'], [i.name for i in self.repo.refs])
+
+    def test_will_delete_in_chunks(self):
+        """
+        The refs can be split across several pushes.
+        """
+        with patch.object(Remote, 'push', autospec=True,
+                side_effect=Remote.push) as push:
+            pushes = self.deleter.remove_remote_refs(
+                self.merged_refs(refobjs=True), chunk_size=2, atomic=True)
+
+        self.assertEqual(3, push.call_count)
+        self.assertEqual([True] * 5, [self.deleter.deleted(i) for i in pushes])
+        self.assertEqual(['master'], [i.name for i in self.repo.refs])
+
+    def test_will_report_failed_refs(self):
+        """
+        A ref that could not be deleted is reported in the results.
+        """
+        refs = self.merged_refs(refobjs=True)
+
+        # Someone else removes branch2 from the remote first
+        self.command('git branch -D branch2')
+
+        pushes = self.deleter.remove_remote_refs(refs)
+
+        self.assertEqual([True, False, True, True, True],
+            [self.deleter.deleted(i) for i in pushes])
+
+    def test_atomic_failure_keeps_all_refs(self):
+        """
+        An atomic push that fails leaves every ref on the remote.
+        """
+        refs = self.merged_refs(refobjs=True)
+
+        self.command('git branch -D branch2')
+
+        pushes = self.deleter.remove_remote_refs(refs, atomic=True)
+
+        self.assertEqual([False] * 5, [self.deleter.deleted(i) for i in pushes])
+        self.assertEqual(
+            ['branch1', 'branch3', 'branch4', 'branch5', 'master'],
+            sorted([i.name for i in self.repo.refs]))
+
+    def test_will_not_delete_moved_refs(self):
+        """
+        With a lease a branch that moved on the remote is kept.
+        """
+        refs = self.merged_refs(refobjs=True)
+
+        # Someone pushes to branch2 after it was inspected
+        self.command('git checkout branch2')
+        self.make_commit()
+        self.command('git checkout master')
+
+        pushes = self.deleter.remove_remote_refs(refs, lease=True)
+
+        self.assertEqual([True, False, True, True, True],
+            [self.deleter.deleted(i) for i in pushes])
+        self.assertEqual(['branch2', 'master'],
+            sorted([i.name for i in self.repo.refs]))
+
+    def test_will_not_push_moved_refs(self):
+        """
+        With a lease a branch whose remote-tracking branch moved is not
+        pushed at all.
+        """
+        refs = self.merged_refs(refobjs=True)
+
+        # Someone pushes to branch2 and the clone fetches it
+        self.command('git checkout branch2')
+        self.make_commit()
+        self.command('git checkout master')
+        self.update_remote()
+
+        self.assertEqual(set([1]), self.deleter.moved_refs(refs))
+
+        recorded = timings.start()
+        try:
+            pushes = self.deleter.remove_remote_refs(refs, lease=True)
+        finally:
+            timings.stop()
+
+        self.assertEqual([True, False, True, True, True],
+            [self.deleter.deleted(i) for i in pushes])
+        self.assertEqual(None, pushes[1])
+        self.assertEqual(1, recorded.commands['push'])
+        self.assertEqual(['branch2', 'master'],
+            sorted([i.name for i in self.repo.refs]))
+
+    def test_will_push_concurrently(self):
+        """
+        Several pushes run at once and the results keep the order of refs.
+        """
+        refs = self.merged_refs(refobjs=True)
+
+        self.command('git checkout branch2')
+        self.make_commit()
+        self.command('git checkout master')
+
+        original = Remote.push
+        lock = Lock()
+        running = [0, 0]
+
+        def push(remote, *args, **kwargs):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            try:
+                time.sleep(0.2)
+                return original(remote, *args, **kwargs)
+            finally:
+                with lock:
+                    running[0] -= 1
+
+        with patch.object(Remote, 'push', autospec=True, side_effect=push):
+            pushes = self.deleter.remove_remote_refs(refs, chunk_size=1,
+                lease=True, jobs=3)
+
+        self.assertEqual(3, running[1])
+        self.assertEqual([True, False, True, True, True],
+            [self.deleter.deleted(i) for i in pushes])
+        self.assertEqual(['branch2', 'master'],
+            sorted([i.name for i in self.repo.refs]))
+
+    def test_will_stream_results(self):
+        """
+        Each ref is yielded with its result as its push is done.
+        """
+        refs = self.merged_refs(refobjs=True)
+
+        results = list(self.deleter.iter_remove_remote_refs(refs,
+            chunk_size=2, jobs=2))
+
+        self.assertEqual(
+            ['branch1', 'branch2', 'branch3', 'branch4', 'branch5'],
+            sorted([ref.remote_head for ref, push in results]))
+        self.assertEqual([True] * 5,
+            [self.deleter.deleted(push) for ref, push in results])
@@ -0,0 +1,154 @@
+from os.path import join, exists
+from tempfile import mkdtemp
+
+from git import Repo
+
+from gitsweep.fetcher import Fetcher
+from gitsweep.inspector import Inspector
+from gitsweep.refs import RefRecord
+from gitsweep.tests.testcases import GitSweepTestCase
+
+
+class TestFetcher(GitSweepTestCase):
+
+    """
+    Can fetch from the remote before inspecting it.
+
+    """
+    def setUp(self):
+        super(TestFetcher, self).setUp()
+
+        self.clone = self.remote
+        self.fetcher = Fetcher(self.clone)
+
+        # Things that happen on the remote after it was cloned
+        self.command('git checkout -b branch1')
+        self.make_commit()
+        self.command('git checkout master')
+        self.command('git tag v1 branch1')
+
+    def remote_branches(self):
+        """
+        Returns the remote-tracking branches of the clone.
+        """
+        return sorted([i.remote_head for i in self.clone.remotes[0].refs])
+
+    def test_default_fetch(self):
+        """
+        A plain fetch brings in the branches and the tags.
+        """
+        self.fetcher.fetch()
+
+        self.assertEqual(['HEAD', 'branch1', 'master'], self.remote_branches())
+        self.assertEqual(['v1'], [i.name for i in self.clone.tags])
+
+    def test_narrow_fetch(self):
+        """
+        A narrow fetch brings in the branches without the tags.
+        """
+        self.fetcher.fetch(narrow=True)
+
+        self.assertEqual(['HEAD', 'branch1', 'master'], self.remote_branches())
+        self.assertEqual([], self.clone.tags)
+
+    def test_narrow_fetch_prunes(self):
+        """
+        Branches that are gone from the remote are removed from the clone.
+        """
+        self.fetcher.fetch(narrow=True)
+
+        self.command('git branch -D branch1')
+
+        self.fetcher.fetch(narrow=True)
+
+        self.assertEqual(['HEAD', 'master'], self.remote_branches())
+
+    def shallow_clone(self, depth):
+        """
+        Clones the test case's repository with ``depth`` commits of history.
+        """
+        clonedir = mkdtemp()
+        self._clone_dirs.append(clonedir)
+
+        return Repo.clone_from('file://{0}'.format(self.repodir), clonedir,
+            depth=depth, no_single_branch=True)
+
+    def test_fetch_depth_full_clone(self):
+        """
+        A full clone is not made shallow.
+        """
+        self.assertRaises(ValueError, self.fetcher.fetch, narrow=True,
+            depth=1)
+
+        self.assertFalse(exists(join(self.clone.git_dir, 'shallow')))
+
+    def test_fetch_depth_keeps_history(self):
+        """
+        A second sweep after fetching with a depth finds the same branches.
+        """
+        for i in range(3):
+            self.make_commit()
+        self.command('git merge --no-ff -m "Merge branch1" branch1')
+        clone = self.shallow_clone(3)
+        self.assertTrue(exists(join(clone.git_dir, 'shallow')))
+
+        self.assertEqual(['branch1'],
+            [i.remote_head for i in Inspector(clone).merged_refs()])
+
+        # Master moves on further than the depth
+        for i in range(4):
+            self.make_commit()
+        Fetcher(clone).fetch(narrow=True, depth=1)
+
+        self.assertEqual(self.repo.commit('master').hexsha,
+            clone.commit('origin/master').hexsha)
+        self.assertEqual(['branch1'],
+            [i.remote_head for i in Inspector(clone).merged_refs()])
+
+    def test_fetch_filter_needs_opt_in(self):
+        """
+        Fetching with a filter only makes a partial clone when asked to.
+        """
+        self.command('git config uploadpack.allowFilter true')
+
+        self.assertRaises(ValueError, self.fetcher.fetch,
+            filter='blob:none')
+        self.assertEqual('', self.clone.git.config(
+            'remote.origin.promisor', with_exceptions=False))
+
+        self.fetcher.fetch(filter='blob:none', partial=True)
+
+        self.assertEqual(['HEAD', 'branch1', 'master'], self.remote_branches())
+
+    def test_ls_remote(self):
+        """
+        Lists the branches on the remote without fetching them.
+        """
+        refs = self.fetcher.ls_remote()
+
+        self.assertEqual([
+            RefRecord('origin', 'branch1', self.repo.commit('branch1').hexsha),
+            RefRecord('origin', 'master', self.repo.commit('master').hexsha)],
+            refs)
+        self.assertEqual(['HEAD', 'master'], self.remote_branches())
+
+    def test_fetch_missing(self):
+        """
+        Only the branches whose commits are missing are fetched.
+        """
+        refs = self.fetcher.fetch_missing(self.fetcher.ls_remote())
+
+        self.assertEqual(['branch1', 'master'], [i.remote_head for i in refs])
+        self.assertEqual(['HEAD', 'branch1', 'master'], self.remote_branches())
+        self.assertEqual([], self.clone.tags)
+
+    def test_fetch_missing_moved(self):
+        """
+        A branch whose listed commit can't be fetched is left out.
+        """
+        refs = self.fetcher.ls_remote()
+        refs[0].sha = 'f' * 40
+
+        refs = self.fetcher.fetch_missing(refs)
+
+        self.assertEqual(['master'], [i.remote_head for i in refs])
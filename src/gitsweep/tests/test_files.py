@@ -0,0 +1,49 @@
+from os import listdir
+from os.path import join
+from tempfile import mkdtemp
+from shutil import rmtree
+from unittest import TestCase
+
+from gitsweep.files import atomic_write
+
+
+class TestAtomicWrite(TestCase):
+
+    """
+    Files are only replaced once they have been written.
+
+    """
+    def setUp(self):
+        self.directory = mkdtemp()
+        self.filename = join(self.directory, 'data', 'file')
+
+    def tearDown(self):
+        rmtree(self.directory)
+
+    def test_writes_file(self):
+        """
+        The directory is made and the file is moved into place.
+        """
+        with atomic_write(self.filename) as fh:
+            fh.write('new\n')
+
+        with open(self.filename) as fh:
+            self.assertEqual('new\n', fh.read())
+        self.assertEqual(['file'], listdir(join(self.directory, 'data')))
+
+    def test_keeps_old_file_on_error(self):
+        """
+        If writing fails the file that was there is left alone.
+        """
+        with atomic_write(self.filename) as fh:
+            fh.write('old\n')
+
+        def write():
+            with atomic_write(self.filename) as fh:
+                fh.write('half')
+                raise IOError('interrupted')
+
+        self.assertRaises(IOError, write)
+
+        with open(self.filename) as fh:
+            self.assertEqual('old\n', fh.read())
@@ -1,3 +1,9 @@
+from mock import patch
+
+from gitsweep import timings
+from gitsweep.inspector import Inspector
+from gitsweep.cache import MergeCache
+from gitsweep.snapshot import RefSnapshot
 from gitsweep.tests.testcases import GitSweepTestCase, InspectorTestCase
 
 
@@ -123,3 +129,255 @@ class TestInspector(GitSweepTestCase, InspectorTestCase):
         self.assertEqual(
             ['branch1', 'branch2', 'branch3', 'branch4', 'branch5'],
             self.merged_refs())
+
+    def test_cherry_picked_branch(self):
+        """
+        A cherry-picked branch still has commits that master does not.
+        """
+        self.command('git checkout -b branch1')
+
+        self.make_commit()
+
+        self.command('git checkout master')
+
+        self.make_commit()
+
+        self.command('git cherry-pick branch1')
+
+        self.assertEqual([], self.merged_refs())
+
+    def test_reachable_refs_skip_cherry(self):
+        """
+        Branches reachable from master are decided without ``git cherry``.
+        """
+        for i in range(1, 4):
+            self.command('git checkout -b branch{0}'.format(i))
+            self.make_commit()
+            self.command('git checkout master')
+            self.command('git merge branch{0}'.format(i))
+
+        with patch.object(self.inspector, '_cherry') as cherry:
+            self.assertEqual(
+                ['branch1', 'branch2', 'branch3'], self.merged_refs())
+
+        self.assertFalse(cherry.called)
+
+    def test_unreachable_refs_skip_cherry(self):
+        """
+        Branches with commits master does not have are decided without
+        ``git cherry``.
+        """
+        self.command('git checkout -b branch1')
+        self.make_commit()
+        self.command('git checkout master')
+
+        with patch.object(self.inspector, '_cherry') as cherry:
+            self.assertEqual([], self.merged_refs())
+
+        self.assertFalse(cherry.called)
+
+    def test_merges_use_cherry(self):
+        """
+        Branches whose own commits are all merges fall back to ``git
+        cherry``.
+        """
+        self.command('git checkout -b branch1')
+        self.command('git checkout master')
+        self.make_commit()
+        self.command('git checkout branch1')
+        self.command('git merge --no-ff master')
+        self.command('git checkout master')
+
+        with patch.object(self.inspector, '_cherry',
+                side_effect=self.inspector._cherry) as cherry:
+            self.assertEqual(['branch1'], self.merged_refs())
+
+        self.assertEqual(1, cherry.call_count)
+
+    def test_commands(self):
+        """
+        Every ref is decided with one run of git rev-list, however many of
+        them there are.
+        """
+        for i in range(1, 11):
+            self.command('git checkout -b branch{0}'.format(i))
+            self.make_commit()
+            self.command('git checkout master')
+            if i % 2:
+                self.command('git merge branch{0}'.format(i))
+
+        recorded = timings.start()
+        try:
+            self.assertEqual(['branch1', 'branch3', 'branch5', 'branch7',
+                'branch9'], self.merged_refs())
+        finally:
+            timings.stop()
+
+        self.assertEqual({'rev-list': 1}, recorded.commands)
+
+    def test_parallel_workers(self):
+        """
+        Using several workers gives the same refs in the same order.
+        """
+        for i in range(1, 7):
+            self.command('git checkout -b branch{0}'.format(i))
+            self.make_commit()
+            self.command('git checkout master')
+            if i % 2:
+                self.command('git merge branch{0}'.format(i))
+
+        serial = self.merged_refs()
+
+        inspector = Inspector(self.remote, jobs=4)
+
+        self.assertEqual(['branch1', 'branch3', 'branch5'], serial)
+        self.assertEqual(
+            serial, [i.remote_head for i in inspector.merged_refs()])
+
+    def test_cached_results(self):
+        """
+        Refs the cache knows about are not inspected again.
+        """
+        for i in range(1, 4):
+            self.command('git checkout -b branch{0}'.format(i))
+            self.make_commit()
+            self.command('git checkout master')
+            if i != 2:
+                self.command('git merge branch{0}'.format(i))
+
+        cache = MergeCache.for_repo(self.remote)
+        first = Inspector(self.remote, cache=cache)
+
+        self.assertEqual(['branch1', 'branch3'],
+            [i.remote_head for i in first.merged_refs()])
+
+        # A new cache reads what the first run saved
+        second = Inspector(self.remote, cache=MergeCache.for_repo(self.remote))
+
+        with patch.object(second, '_inspect') as inspect:
+            self.assertEqual(['branch1', 'branch3'],
+                [i.remote_head for i in second.merged_refs()])
+
+        self.assertFalse(inspect.called)
+
+    def test_cache_misses_when_master_moves(self):
+        """
+        A new master commit means the refs are inspected again.
+        """
+        self.command('git checkout -b branch1')
+        self.make_commit()
+        self.command('git checkout master')
+
+        cache = MergeCache.for_repo(self.remote)
+
+        self.assertEqual(
+            [], Inspector(self.remote, cache=cache).merged_refs())
+
+        self.command('git merge branch1')
+
+        self.assertEqual(['branch1'], [i.remote_head for i in
+            Inspector(self.remote, cache=cache).merged_refs()])
+
+    def test_snapshot_master_moved_forward(self):
+        """
+        Only new, moved and unmerged refs are inspected after master advances.
+        """
+        for i in range(1, 4):
+            self.command('git checkout -b branch{0}'.format(i))
+            self.make_commit()
+            self.command('git checkout master')
+        self.command('git merge branch1')
+
+        snapshot = RefSnapshot.for_repo(self.remote, 'origin')
+
+        self.assertEqual(['branch1'], [i.remote_head for i in
+            Inspector(self.remote, snapshot=snapshot).merged_refs()])
+
+        # Master moves forward, branch3 moves and branch4 is new
+        self.command('git merge branch2')
+        self.command('git checkout branch3')
+        self.make_commit()
+        self.command('git checkout -b branch4')
+        self.command('git checkout master')
+
+        inspector = Inspector(self.remote, snapshot=snapshot)
+        inspect = inspector._inspect
+
+        with patch.object(inspector, '_inspect', side_effect=inspect) as spy:
+            self.assertEqual(['branch1', 'branch2'],
+                [i.remote_head for i in inspector.merged_refs()])
+
+        inspected = [i.remote_head for i in spy.call_args[0][2]]
+        self.assertEqual(['branch2', 'branch3', 'branch4'], inspected)
+
+    def test_snapshot_master_unchanged(self):
+        """
+        Nothing is inspected if no ref has moved.
+        """
+        self.command('git checkout -b branch1')
+        self.make_commit()
+        self.command('git checkout master')
+        self.command('git checkout -b branch2')
+        self.command('git checkout master')
+
+        snapshot = RefSnapshot.for_repo(self.remote, 'origin')
+        Inspector(self.remote, snapshot=snapshot).merged_refs()
+
+        inspector = Inspector(self.remote, snapshot=snapshot)
+
+        with patch.object(inspector, '_inspect') as inspect:
+            self.assertEqual(['branch2'],
+                [i.remote_head for i in inspector.merged_refs()])
+
+        self.assertFalse(inspect.called)
+
+    def test_streams_merged_refs(self):
+        """
+        Merged refs are yielded before the refs after them are inspected.
+        """
+        # Every branch after the first has only a merge of its own, which
+        # leaves it to git cherry
+        self.command('git checkout -b branch1')
+        self.command('git checkout master')
+        for i in range(2, 5):
+            self.command('git checkout -b branch{0}'.format(i))
+            self.command('git checkout master')
+            self.make_commit()
+            self.command('git checkout branch{0}'.format(i))
+            self.command('git merge --no-ff master')
+            self.command('git checkout master')
+
+        with patch.object(self.inspector, '_cherry') as cherry:
+            cherry.return_value = False
+            refs = self.inspector.iter_merged_refs()
+
+            self.assertEqual('branch1', next(refs).remote_head)
+            self.assertEqual(0, cherry.call_count)
+
+            self.assertEqual([], list(refs))
+            self.assertEqual(3, cherry.call_count)
+
+    def test_verdicts(self):
+        """
+        Every ref comes with its verdict and how it was decided.
+        """
+        self.command('git checkout -b branch1')
+        self.command('git checkout master')
+        self.command('git checkout -b branch2')
+        self.make_commit()
+        self.command('git checkout master')
+
+        cache = MergeCache.for_repo(self.remote)
+        inspector = Inspector(self.remote, cache=cache, commit_graph=False)
+
+        verdicts = [(ref.remote_head, merged, method) for
+            ref, merged, method, seconds in inspector.iter_verdicts()]
+
+        self.assertEqual([('branch1', True, 'rev-list'),
+            ('branch2', False, 'cherry')], verdicts)
+
+        verdicts = [(ref.remote_head, merged, method, seconds) for
+            ref, merged, method, seconds in inspector.iter_verdicts()]
+
+        self.assertEqual([('branch1', True, 'cache', 0.0),
+            ('branch2', False, 'cache', 0.0)], verdicts)
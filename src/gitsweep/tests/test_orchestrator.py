@@ -0,0 +1,96 @@
+from os import mkdir
+from os.path import join
+from tempfile import mkdtemp
+from shutil import rmtree
+
+from git import Repo
+
+from gitsweep.orchestrator import Orchestrator, discover
+from gitsweep.tests.testcases import GitSweepTestCase
+
+
+class TestOrchestrator(GitSweepTestCase):
+
+    """
+    Sweeps several repositories with a pool of processes.
+
+    """
+    def setUp(self):
+        super(TestOrchestrator, self).setUp()
+
+        self.command('git checkout -b branch1')
+        self.make_commit()
+        self.command('git checkout master')
+        self.command('git merge branch1')
+        self.command('git checkout -b branch2')
+        self.make_commit()
+        self.command('git checkout master')
+
+        self.workdir = mkdtemp()
+
+        self.clones = []
+        for name in ('one', 'two'):
+            clonedir = join(self.workdir, name)
+            Repo.clone(self.repo, clonedir)
+            self.clones.append(clonedir)
+
+        # Not a repository, and a repository that is broken
+        mkdir(join(self.workdir, 'notes'))
+        mkdir(join(self.workdir, 'broken'))
+        mkdir(join(self.workdir, 'broken', '.git'))
+
+    def tearDown(self):
+        super(TestOrchestrator, self).tearDown()
+
+        rmtree(self.workdir)
+
+    def test_discover(self):
+        """
+        Finds the repositories below a directory.
+        """
+        self.assertEqual(
+            [join(self.workdir, i) for i in ('broken', 'one', 'two')],
+            discover(self.workdir))
+
+    def test_inspect(self):
+        """
+        Each repository gets its own result, a failure only affects its own.
+        """
+        orchestrator = Orchestrator(discover(self.workdir), processes=2)
+
+        results = list(orchestrator.inspect())
+
+        self.assertEqual([join(self.workdir, i)
+            for i in ('broken', 'one', 'two')], [i.path for i in results])
+        self.assertFalse(results[0].ok)
+        self.assertEqual([['branch1'], ['branch1']],
+            [[name for name, sha in i.merged] for i in results[1:]])
+
+    def test_delete(self):
+        """
+        Deletes the merged branches that were found.
+        """
+        orchestrator = Orchestrator(self.clones[:1], processes=2)
+
+        results = list(orchestrator.delete(list(orchestrator.inspect())))
+
+        self.assertEqual(1, len(results))
+        self.assertEqual(['branch1'], results[0].deleted)
+        self.assertEqual(['branch2', 'master'],
+            sorted([i.name for i in self.repo.branches]))
+
+    def test_delete_moved_branch(self):
+        """
+        A branch that moved after it was inspected is not deleted.
+        """
+        orchestrator = Orchestrator(self.clones[:1], processes=1)
+        results = list(orchestrator.inspect())
+
+        self.command('git checkout branch1')
+        self.make_commit()
+        self.command('git checkout master')
+
+        results = list(orchestrator.delete(results))
+
+        self.assertEqual(['branch1'], results[0].failed)
+        self.assertTrue('branch1' in [i.name for i in self.repo.branches])
@@ -0,0 +1,107 @@
+import json
+from StringIO import StringIO
+from unittest import TestCase
+
+from gitsweep.output import RecordWriter, Progress
+
+
+class TestRecordWriter(TestCase):
+
+    """
+    Records are written as they are made.
+
+    """
+    def test_ndjson(self):
+        """
+        Each record is a line of JSON.
+        """
+        stream = StringIO()
+        writer = RecordWriter(stream, format='ndjson')
+
+        writer.write({'name': 'branch1'})
+        self.assertEqual('{"name": "branch1"}\n', stream.getvalue())
+
+        writer.write({'name': 'branch2'})
+        writer.close()
+
+        self.assertEqual([{'name': 'branch1'}, {'name': 'branch2'}],
+            [json.loads(i) for i in stream.getvalue().splitlines()])
+
+    def test_json(self):
+        """
+        The records make up a JSON array.
+        """
+        stream = StringIO()
+        writer = RecordWriter(stream, format='json')
+
+        writer.write({'name': 'branch1'})
+        writer.write({'name': 'branch2'})
+        writer.close()
+
+        self.assertEqual([{'name': 'branch1'}, {'name': 'branch2'}],
+            json.loads(stream.getvalue()))
+
+    def test_json_without_records(self):
+        """
+        An empty array is written if there are no records.
+        """
+        stream = StringIO()
+        writer = RecordWriter(stream, format='json')
+        writer.close()
+
+        self.assertEqual([], json.loads(stream.getvalue()))
+
+
+class Terminal(StringIO):
+
+    def isatty(self):
+        return True
+
+
+class TestProgress(TestCase):
+
+    """
+    Progress is shown on a terminal with the rate and what is left.
+
+    """
+    def test_line(self):
+        """
+        Describes how fast things are done and estimates the rest.
+        """
+        now = [100.0]
+        progress = Progress(40, Terminal(), clock=lambda: now[0])
+
+        self.assertEqual('0/40 deleted', progress.line())
+
+        now[0] = 104.0
+        progress.update(12)
+
+        self.assertEqual('12/40 deleted, 3.0/s, about 9s left',
+            progress.line())
+
+    def test_terminal(self):
+        """
+        The line is rewritten in place and can be cleared.
+        """
+        now = [100.0]
+        stream = Terminal()
+        progress = Progress(2, stream, clock=lambda: now[0])
+
+        now[0] = 101.0
+        progress.update()
+        progress.clear()
+
+        self.assertEqual('\r\r1/2 deleted, 1.0/s, about 1s left'
+            '\r{0}\r'.format(' ' * 33), stream.getvalue())
+
+    def test_not_a_terminal(self):
+        """
+        Nothing is written when the stream is not a terminal.
+        """
+        stream = StringIO()
+        progress = Progress(2, stream)
+
+        progress.update()
+        progress.clear()
+
+        self.assertEqual('', stream.getvalue())
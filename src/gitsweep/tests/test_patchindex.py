@@ -0,0 +1,190 @@
+from os.path import join
+from tempfile import mkdtemp
+from shutil import rmtree
+
+from mock import patch
+
+from gitsweep import timings
+from gitsweep.inspector import Inspector
+from gitsweep.patchindex import PatchIndex
+from gitsweep.plumbing import CatFile
+from gitsweep.tests.testcases import GitSweepTestCase, InspectorTestCase
+
+
+class TestPatchIndex(GitSweepTestCase, InspectorTestCase):
+
+    """
+    Branches can be matched against the patch-ids of master.
+
+    """
+    def setUp(self):
+        super(TestPatchIndex, self).setUp()
+
+        self.indexdir = mkdtemp()
+
+        # branch1 is cherry-picked into master, branch2 is not merged
+        for i in range(1, 3):
+            self.command('git checkout -b branch{0}'.format(i))
+            self.make_commit()
+            self.command('git checkout master')
+            self.make_commit()
+        self.command('git cherry-pick branch1')
+
+    def tearDown(self):
+        super(TestPatchIndex, self).tearDown()
+
+        rmtree(self.indexdir)
+
+    def tip(self, name):
+        """
+        Returns the commit of the remote branch ``name`` in the clone.
+        """
+        return self.remote.commit('origin/{0}'.format(name)).hexsha
+
+    def index(self, **kwargs):
+        """
+        Returns an index that is up to date with master.
+        """
+        index = PatchIndex(join(self.indexdir, 'patch-ids'), **kwargs)
+        index.update(self.remote.working_dir, self.tip('master'))
+
+        return index
+
+    def test_matching_patches(self):
+        """
+        A branch whose commits were all cherry-picked is merged.
+        """
+        index = self.index()
+
+        self.assertEqual(True,
+            index.merged(self.remote.working_dir, self.tip('branch1')))
+        self.assertEqual(False,
+            index.merged(self.remote.working_dir, self.tip('branch2')))
+
+    def test_saved_between_runs(self):
+        """
+        The index is read back and only grows with new master commits.
+        """
+        first = self.index()
+
+        self.make_commit()
+
+        with patch('gitsweep.patchindex._patch_ids',
+                return_value=[]) as patch_ids:
+            second = self.index()
+
+        self.assertEqual(len(first), len(second))
+        self.assertEqual(self.tip('master'), second.master_sha)
+        self.assertEqual(1, len(patch_ids.call_args[0][1]))
+
+    def test_trimmed_to_window(self):
+        """
+        Commits beyond the newest ``max_commits`` are dropped as master grows.
+        """
+        index = self.index(max_commits=3)
+
+        for i in range(2):
+            self.make_commit()
+            index.update(self.remote.working_dir, self.tip('master'))
+
+        self.assertEqual(3, len(index._commits))
+        self.assertEqual(3, len(PatchIndex(index.filename)._commits))
+
+    def test_revert_of_revert(self):
+        """
+        A patch master only has from before the branch forked does not count.
+        """
+        self.make_commit()
+        self.command('git revert --no-edit HEAD')
+        self.command('git checkout -b reapply')
+        self.command('git revert --no-edit HEAD')
+        self.command('git checkout master')
+        self.make_commit()
+
+        index = self.index()
+
+        self.assertEqual(None,
+            index.merged(self.remote.working_dir, self.tip('reapply')))
+        with CatFile(self.remote.working_dir) as cat_file:
+            self.assertEqual(None, index.merged(
+                self.remote.working_dir, self.tip('reapply'),
+                cat_file=cat_file))
+
+        inspector = Inspector(self.remote, detection='patch-id')
+
+        self.assertEqual(
+            ['branch1'], [i.remote_head for i in inspector.merged_refs()])
+
+    def test_not_far_enough(self):
+        """
+        Nothing is decided if the index does not reach the fork point.
+        """
+        index = self.index(max_commits=1)
+
+        self.assertEqual(None,
+            index.merged(self.remote.working_dir, self.tip('branch1')))
+
+    def test_inspector_modes(self):
+        """
+        Only the patch-id mode counts cherry-picked commits as merged.
+        """
+        self.assertEqual([], self.merged_refs())
+
+        inspector = Inspector(self.remote, detection='patch-id')
+
+        self.assertEqual(
+            ['branch1'], [i.remote_head for i in inspector.merged_refs()])
+
+    def test_inspector_falls_back_to_cherry(self):
+        """
+        A ref the index cannot decide is asked about with git cherry.
+        """
+        inspector = Inspector(self.remote, detection='patch-id')
+
+        def merged_tips(working_dir, tip_shas, **kwargs):
+            return [None] * len(tip_shas)
+
+        with patch.object(PatchIndex, 'merged_tips', side_effect=merged_tips):
+            with patch.object(inspector, '_cherry',
+                    side_effect=inspector._cherry) as cherry:
+                self.assertEqual(['branch1'],
+                    [i.remote_head for i in inspector.merged_refs()])
+
+        self.assertEqual(2, cherry.call_count)
+
+    def test_inspector_commands(self):
+        """
+        The patch-ids of every branch are worked out with one run of git
+        diff-tree and git patch-id, however many branches there are.
+        """
+        for i in range(3, 13):
+            self.command('git checkout -b branch{0}'.format(i))
+            self.make_commit()
+            self.command('git checkout master')
+            if i % 2:
+                self.command('git cherry-pick branch{0}'.format(i))
+
+        inspector = Inspector(self.remote, detection='patch-id',
+            patch_index=self.index())
+
+        recorded = timings.start()
+        try:
+            merged = [i.remote_head for i in inspector.merged_refs()]
+        finally:
+            timings.stop()
+
+        self.assertEqual(['branch1', 'branch11', 'branch3', 'branch5',
+            'branch7', 'branch9'], merged)
+        self.assertEqual({'rev-list': 1, 'diff-tree': 1, 'patch-id': 1},
+            recorded.commands)
+
+    def test_cat_file(self):
+        """
+        Walking the branch through git cat-file finds the same answers.
+        """
+        index = self.index()
+
+        with CatFile(self.remote.working_dir) as cat_file:
+            for name, expected in (('branch1', True), ('branch2', False)):
+                self.assertEqual(expected, index.merged(
+                    self.remote.working_dir, self.tip(name), cat_file=cat_file))
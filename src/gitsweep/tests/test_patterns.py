@@ -0,0 +1,213 @@
+import time
+from os import close, remove
+from tempfile import mkstemp
+from unittest import TestCase
+
+from mock import patch
+
+from gitsweep.patterns import RefMatcher, load_patterns, split_patterns
+from gitsweep.refs import RefTable
+from gitsweep.tests.testcases import GitSweepTestCase, InspectorTestCase
+
+
+class TestRefMatcher(TestCase):
+
+    """
+    Branch names are matched against names, globs and regular expressions.
+
+    """
+    def matches(self, patterns, names):
+        matcher = RefMatcher(patterns)
+        return [i for i in names if matcher.matches(i)]
+
+    def test_names(self):
+        """
+        A pattern without special characters matches that name only.
+        """
+        self.assertEqual(['develop'], self.matches(['develop', ''],
+            ['develop', 'develop2', 'feature/develop']))
+
+    def test_globs(self):
+        """
+        Globs match the whole name.
+        """
+        names = ['release/1.0', 'release', 'hotfix-1', 'hotfix-12',
+            'old/hotfix-1', 'a1', 'b1', 'c1']
+
+        self.assertEqual(['release/1.0'], self.matches(['release/*'], names))
+        self.assertEqual(['hotfix-1'], self.matches(['hotfix-?'], names))
+        self.assertEqual(['hotfix-1', 'old/hotfix-1'],
+            self.matches(['*hotfix-?'], names))
+        self.assertEqual(['a1', 'b1'], self.matches(['[ab]1'], names))
+        self.assertEqual(['c1'], self.matches(['[!ab]1'], names))
+
+    def test_regular_expressions(self):
+        """
+        Regular expressions only have to match part of the name.
+        """
+        names = ['tmp-1', 'tmp-x', 'my-tmp-2', 'tmp.1']
+
+        self.assertEqual(['tmp-1', 'my-tmp-2'],
+            self.matches([r're:tmp-\d'], names))
+        self.assertEqual(['tmp-1'], self.matches([r're:^tmp-\d'], names))
+
+    def test_many_groups(self):
+        """
+        Regular expressions with groups are not limited by how many there
+        are, and each one's backreferences keep pointing at its own groups.
+        """
+        patterns = [r're:^(tmp|old)-{0}$'.format(i) for i in range(150)]
+        patterns.extend([r're:^(x)-(y)\2-\1$', r're:^(?P<a>z)-(?P=a)$'])
+        names = ['tmp-0', 'old-149', 'tmp-150', 'x-yy-x', 'x-yx-y', 'z-z']
+
+        self.assertEqual(['tmp-0', 'old-149', 'x-yy-x', 'z-z'],
+            self.matches(patterns, names))
+
+    def test_empty(self):
+        """
+        A matcher without patterns matches nothing and is false.
+        """
+        self.assertFalse(RefMatcher(['', ' ']))
+        self.assertTrue(RefMatcher(['release/*']))
+        self.assertEqual([], self.matches([], ['master']))
+
+    def test_prefixes(self):
+        """
+        Tells what the matching names start with, where it can.
+        """
+        self.assertEqual(['develop', 'feature/', 'hotfix-'], sorted(
+            RefMatcher(['develop', 'feature/*', 'hotfix-?']).prefixes()))
+        self.assertEqual(None, RefMatcher(['develop', '*-old']).prefixes())
+        self.assertEqual(None, RefMatcher(['develop', 're:^x']).prefixes())
+
+    def test_many_patterns(self):
+        """
+        Thousands of patterns do not make matching each name slower.
+        """
+        patterns = []
+        for i in range(5000):
+            patterns.extend(['name-{0}'.format(i), 'prefix-{0}/*'.format(i),
+                'glob-{0}-?'.format(i)])
+        names = ['branch-{0}'.format(i) for i in range(100000)]
+        names.extend(['name-4999', 'prefix-4999/x', 'glob-4999-x'])
+
+        start = time.time()
+        matched = self.matches(patterns, names)
+
+        self.assertEqual(['name-4999', 'prefix-4999/x', 'glob-4999-x'],
+            matched)
+        self.assertTrue(time.time() - start < 5)
+
+    def test_many_suffix_globs(self):
+        """
+        Globs that share their start are kept by how they end.
+        """
+        patterns = ['feature/*-{0}'.format(i) for i in range(5000)]
+        names = ['feature/x-{0}'.format(i) for i in range(5000, 100000)]
+        names.extend(['feature/x-4999', 'feature/4999', 'feature/a/b-0'])
+
+        start = time.time()
+        matched = self.matches(patterns, names)
+
+        self.assertEqual(['feature/x-4999', 'feature/a/b-0'], matched)
+        self.assertTrue(time.time() - start < 5)
+
+
+class TestLoadPatterns(TestCase):
+
+    """
+    Patterns are read from a file.
+
+    """
+    def setUp(self):
+        (fd, self.filename) = mkstemp()
+        close(fd)
+
+    def tearDown(self):
+        remove(self.filename)
+
+    def write(self, content):
+        with open(self.filename, 'w') as fh:
+            fh.write(content)
+
+    def test_load(self):
+        """
+        Reads the skip and include lines.
+        """
+        self.write('# Long-lived branches\n'
+            'skip release/*\n'
+            '\n'
+            'include feature/*\n'
+            'skip re:^tmp-\\d{1,3}$\n')
+
+        self.assertEqual((['release/*', 're:^tmp-\\d{1,3}$'], ['feature/*']),
+            load_patterns(self.filename))
+
+    def test_invalid(self):
+        """
+        Lines that are not patterns are refused.
+        """
+        self.write('skip release/*\nrelease/*\n')
+
+        self.assertRaises(ValueError, load_patterns, self.filename)
+
+    def test_split(self):
+        """
+        Commas inside a regular expression don't split the list.
+        """
+        self.assertEqual(['develop', 'release/*'],
+            split_patterns('develop, release/*,'))
+        self.assertEqual(['re:^tmp-\\d{2,4}$', 're:^[a,b]x', 'develop'],
+            split_patterns('re:^tmp-\\d{2,4}$,re:^[a,b]x,develop'))
+        self.assertEqual(['re:^a\\{', 'b'], split_patterns('re:^a\\{,b'))
+        self.assertEqual([], split_patterns(''))
+
+
+class TestFilteredRemotes(GitSweepTestCase, InspectorTestCase):
+
+    """
+    Branches are skipped and included by pattern.
+
+    """
+    def setUp(self):
+        super(TestFilteredRemotes, self).setUp()
+
+        for name in ('release/1.0', 'feature/a', 'feature/b'):
+            self.command('git checkout -b {0}'.format(name))
+            self.make_commit()
+            self.command('git checkout master')
+            self.command('git merge {0}'.format(name))
+
+    def test_skip(self):
+        """
+        Branches matching a skip pattern are left out.
+        """
+        self.assertEqual(['feature/a', 'feature/b'],
+            [i.remote_head for i in self.inspector.merged_refs(
+            skip=['release/*'])])
+
+    def test_include(self):
+        """
+        Only branches matching an include pattern are looked at, master is
+        never one of them.
+        """
+        self.assertEqual(['feature/b'],
+            [i.remote_head for i in self.inspector.merged_refs(
+            skip=['feature/a'], include=['feature/*', 'master'])])
+
+    def test_records_for_kept_refs(self):
+        """
+        Records are only made for the refs that are kept.
+        """
+        original = RefTable._record
+        origin = self.inspector._origin
+        table = self.inspector.ref_table(origin)
+
+        with patch.object(RefTable, '_record', autospec=True,
+                side_effect=original) as record:
+            refs = self.inspector._filtered_remotes(origin,
+                skip=['feature/a'], include=['feature/*'], table=table)
+            self.assertEqual(0, record.call_count)
+
+            self.assertEqual(['feature/b'], [i.remote_head for i in refs])
+            self.assertEqual(1, record.call_count)
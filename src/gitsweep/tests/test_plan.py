@@ -0,0 +1,54 @@
+from os.path import join
+from tempfile import mkdtemp
+from shutil import rmtree
+from unittest import TestCase
+
+from gitsweep.plan import Plan
+from gitsweep.refs import RefRecord
+
+
+class TestPlan(TestCase):
+
+    """
+    Plans are saved to and loaded from files.
+
+    """
+    def setUp(self):
+        self.directory = mkdtemp()
+        self.filename = join(self.directory, 'plan.json')
+
+    def tearDown(self):
+        rmtree(self.directory)
+
+    def test_round_trip(self):
+        """
+        A saved plan loads with the same branches and commits.
+        """
+        Plan('origin', 'master', 'a' * 40,
+            [RefRecord('origin', 'branch1', 'b' * 40),
+             RefRecord('origin', 'feature/x', 'c' * 40)],
+            detection='patch-id').save(self.filename)
+
+        plan = Plan.load(self.filename)
+
+        self.assertEqual('origin', plan.remote_name)
+        self.assertEqual('master', plan.master_branch)
+        self.assertEqual('a' * 40, plan.master_sha)
+        self.assertEqual('patch-id', plan.detection)
+        self.assertEqual([('origin', 'branch1', 'b' * 40),
+            ('origin', 'feature/x', 'c' * 40)],
+            [(i.remote_name, i.remote_head, i.sha) for i in plan.refs])
+
+    def test_not_a_plan(self):
+        """
+        Files that are not plans can't be loaded.
+        """
+        with open(self.filename, 'w') as fh:
+            fh.write('not json')
+
+        self.assertRaises(ValueError, Plan.load, self.filename)
+
+        with open(self.filename, 'w') as fh:
+            fh.write('{"version": 99, "refs": []}')
+
+        self.assertRaises(ValueError, Plan.load, self.filename)
@@ -0,0 +1,135 @@
+from threading import Thread
+
+from gitsweep import timings
+from gitsweep.plumbing import CatFile
+from gitsweep.tests.testcases import GitSweepTestCase
+
+
+class TestCatFile(GitSweepTestCase):
+
+    """
+    Objects are looked up through long-lived git cat-file processes.
+
+    """
+    def setUp(self):
+        super(TestCatFile, self).setUp()
+
+        self.make_commit()
+        self.make_commit()
+
+        self.cat_file = CatFile(self.repo.working_dir)
+
+    def tearDown(self):
+        super(TestCatFile, self).tearDown()
+
+        self.cat_file.close()
+        timings.stop()
+
+    def test_info(self):
+        """
+        Finds the type and size of an object.
+        """
+        head = self.repo.head.commit
+
+        (sha, type, size) = self.cat_file.info('HEAD')
+
+        self.assertEqual(head.hexsha, sha)
+        self.assertEqual('commit', type)
+        self.assertEqual(head.size, size)
+        self.assertEqual(None, self.cat_file.info('doesnotexist'))
+
+    def test_infos(self):
+        """
+        Finds the type and size of objects.
+        """
+        head = self.repo.head.commit
+
+        (info, missing) = self.cat_file.infos(['master', 'doesnotexist'])
+
+        self.assertEqual((head.hexsha, 'commit', head.size), info)
+        self.assertEqual(None, missing)
+        self.assertEqual([], self.cat_file.infos([]))
+
+    def test_resolve(self):
+        """
+        Turns a name into the sha of its object.
+        """
+        self.assertEqual(self.repo.head.commit.hexsha,
+            self.cat_file.resolve('master'))
+        self.assertEqual(None, self.cat_file.resolve('doesnotexist'))
+
+    def test_read(self):
+        """
+        Reads the contents of an object.
+        """
+        blob = self.repo.head.commit.tree.blobs[0]
+
+        self.assertEqual((blob.hexsha, 'blob', blob.data_stream.read()),
+            self.cat_file.read(blob.hexsha))
+        self.assertEqual(None, self.cat_file.read('doesnotexist'))
+
+    def test_parents(self):
+        """
+        Finds the parents of a commit.
+        """
+        head = self.repo.head.commit
+        blob = head.tree.blobs[0]
+
+        self.assertEqual([i.hexsha for i in head.parents],
+            self.cat_file.parents(head.hexsha))
+        self.assertEqual([], self.cat_file.parents(
+            self.repo.git.rev_list('--max-parents=0', 'HEAD')))
+        self.assertEqual(None, self.cat_file.parents(blob.hexsha))
+
+    def test_missing(self):
+        """
+        Tells which of several objects are not there.
+        """
+        shas = [i.hexsha for i in self.repo.iter_commits()]
+        unknown = '0' * 40
+
+        self.assertEqual(set([unknown]),
+            self.cat_file.missing(shas + [unknown]))
+        self.assertEqual(set(), self.cat_file.missing([]))
+
+    def test_one_process(self):
+        """
+        Each kind of process is started once, whatever the number of
+        lookups.
+        """
+        recorded = timings.start()
+
+        for commit in self.repo.iter_commits():
+            self.cat_file.info(commit.hexsha)
+            self.cat_file.parents(commit.hexsha)
+
+        self.assertEqual(2, recorded.commands['cat-file'])
+
+    def test_threads(self):
+        """
+        Lookups from several threads at once get their own answers.
+        """
+        shas = [i.hexsha for i in self.repo.iter_commits()]
+        found = []
+
+        def lookup():
+            found.append([self.cat_file.resolve(sha)
+                for i in range(20) for sha in shas])
+
+        threads = [Thread(target=lookup) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([shas * 20] * 4, found)
+
+    def test_close(self):
+        """
+        The processes are started again after they were stopped.
+        """
+        sha = self.repo.head.commit.hexsha
+
+        self.assertEqual(sha, self.cat_file.resolve('HEAD'))
+        self.cat_file.close()
+        self.assertEqual(sha, self.cat_file.resolve('HEAD'))
@@ -0,0 +1,287 @@
+import sys
+from os import makedirs, environ, pathsep
+from subprocess import Popen, PIPE
+from os.path import join, dirname, exists
+from tempfile import mkdtemp
+from shutil import rmtree
+from unittest import TestCase
+
+from mock import patch
+
+from gitsweep.refs import RefRecord, RefTable
+from gitsweep.inspector import Inspector
+from gitsweep.tests.testcases import GitSweepTestCase
+
+
+class TestRefTable(TestCase):
+
+    """
+    Refs can be looked up by name and prefix.
+
+    """
+    def setUp(self):
+        self.shas = {
+            'master': 'a' * 40,
+            'release/1.0': 'a' * 40,
+            'release/2.0': 'b' * 40,
+            'releases': 'c' * 40,
+            'feature': 'd' * 40}
+        self.table = RefTable('origin', self.shas)
+
+    def test_iterate(self):
+        """
+        Yields the refs sorted by name.
+        """
+        self.assertEqual(5, len(self.table))
+        self.assertEqual(sorted(self.shas.items()),
+            [(i.remote_head, i.sha) for i in self.table])
+        self.assertEqual('origin', list(self.table)[0].remote_name)
+
+    def test_by_name(self):
+        """
+        Finds a ref by its name.
+        """
+        self.assertEqual(RefRecord('origin', 'releases', 'c' * 40),
+            self.table.get('releases'))
+        self.assertEqual(None, self.table.get('release'))
+        self.assertTrue('feature' in self.table)
+        self.assertFalse('missing' in self.table)
+
+    def test_by_sha(self):
+        """
+        Finds all of the refs that point at a commit.
+        """
+        self.assertEqual(['master', 'release/1.0'],
+            [i.remote_head for i in self.table.by_sha('a' * 40)])
+        self.assertEqual(['feature'],
+            [i.remote_head for i in self.table.by_sha('d' * 40)])
+        self.assertEqual([], self.table.by_sha('e' * 40))
+
+    def test_prefix(self):
+        """
+        Finds the names that start with a prefix.
+        """
+        self.assertEqual(['release/1.0', 'release/2.0'],
+            list(self.table.names('release/')))
+        self.assertEqual(['release/1.0', 'release/2.0', 'releases'],
+            list(self.table.names('release')))
+        self.assertEqual([], list(self.table.names('zzz')))
+        self.assertEqual(5, len(list(self.table.names())))
+
+    def test_from_records(self):
+        """
+        Can be made from a list of records.
+        """
+        table = RefTable.from_records('origin', list(self.table))
+
+        self.assertEqual(list(self.table), list(table))
+
+    def test_memory_budget(self):
+        """
+        100,000 refs fit in the documented budget.
+        """
+        shas = dict([('feature/team-{0:05d}-some-branch'.format(i),
+            '{0:040x}'.format(i)) for i in range(100000)])
+
+        table = RefTable('origin', shas)
+
+        self.assertTrue(table.memory_size() < RefTable.MEMORY_BUDGET,
+            table.memory_size())
+        self.assertEqual('feature/team-00042-some-branch',
+            table.by_sha('{0:040x}'.format(42))[0].remote_head)
+
+
+class TestReadRemoteRefs(TestCase):
+
+    """
+    Remote refs are read from the files in the Git directory.
+
+    """
+    def setUp(self):
+        self.git_dir = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.git_dir)
+
+    def write(self, filename, content):
+        """
+        Writes ``content`` to ``filename`` inside the Git directory.
+        """
+        filename = join(self.git_dir, filename)
+        if not exists(dirname(filename)):
+            makedirs(dirname(filename))
+        with open(filename, 'w') as fh:
+            fh.write(content)
+
+    def packed_refs(self, names, header='# pack-refs with: peeled sorted \n'):
+        """
+        Writes a packed-refs file with a ref for each of ``names``.
+        """
+        lines = [header] if header else []
+        for i, name in enumerate(names):
+            lines.append('{0:040x} {1}\n'.format(i, name))
+            if name.startswith('refs/tags/'):
+                lines.append('^{0:040x}\n'.format(i + 1000))
+        self.write('packed-refs', ''.join(lines))
+
+    def test_no_refs(self):
+        """
+        An empty Git directory has no remote refs.
+        """
+        self.assertEqual([], list(RefTable.read(self.git_dir, 'origin')))
+
+    def test_packed_refs(self):
+        """
+        Only the packed refs of the remote are returned.
+        """
+        self.packed_refs([
+            'refs/heads/master',
+            'refs/remotes/origin/branch1',
+            'refs/remotes/origin/feature/branch2',
+            'refs/remotes/origin/master',
+            'refs/remotes/origin2/branch3',
+            'refs/tags/v1'])
+
+        self.assertEqual([
+            RefRecord('origin', 'branch1', '{0:040x}'.format(1)),
+            RefRecord('origin', 'feature/branch2', '{0:040x}'.format(2)),
+            RefRecord('origin', 'master', '{0:040x}'.format(3))],
+            list(RefTable.read(self.git_dir, 'origin')))
+
+    def test_many_sorted_packed_refs(self):
+        """
+        The binary search finds the same refs as reading every line.
+        """
+        names = ['refs/heads/{0:05d}'.format(i) for i in range(500)]
+        names += ['refs/remotes/origin/{0:05d}'.format(i) for i in range(300)]
+        names += ['refs/tags/{0:05d}'.format(i) for i in range(500)]
+
+        self.packed_refs(names)
+        with_search = list(RefTable.read(self.git_dir, 'origin'))
+
+        self.packed_refs(names, header='# pack-refs with: peeled \n')
+        without_search = list(RefTable.read(self.git_dir, 'origin'))
+
+        self.assertEqual(300, len(with_search))
+        self.assertEqual(without_search, with_search)
+
+    def test_no_header(self):
+        """
+        Files written by old versions of git have no header.
+        """
+        self.packed_refs(['refs/remotes/origin/branch1'], header=None)
+
+        self.assertEqual(['branch1'], [i.remote_head
+            for i in list(RefTable.read(self.git_dir, 'origin'))])
+
+    def test_loose_refs_win(self):
+        """
+        A loose ref is newer than the packed one with the same name.
+        """
+        self.packed_refs([
+            'refs/remotes/origin/branch1',
+            'refs/remotes/origin/master'])
+        self.write('refs/remotes/origin/branch1', 'f' * 40 + '\n')
+        self.write('refs/remotes/origin/feature/branch2', 'e' * 40 + '\n')
+
+        self.assertEqual([
+            RefRecord('origin', 'branch1', 'f' * 40),
+            RefRecord('origin', 'feature/branch2', 'e' * 40),
+            RefRecord('origin', 'master', '{0:040x}'.format(1))],
+            list(RefTable.read(self.git_dir, 'origin')))
+
+    def test_symbolic_refs(self):
+        """
+        A symbolic ref points at the same commit as its target.
+        """
+        self.write('refs/remotes/origin/master', 'f' * 40 + '\n')
+        self.write('refs/remotes/origin/HEAD',
+            'ref: refs/remotes/origin/master\n')
+
+        self.assertEqual([
+            RefRecord('origin', 'HEAD', 'f' * 40),
+            RefRecord('origin', 'master', 'f' * 40)],
+            list(RefTable.read(self.git_dir, 'origin')))
+
+
+class TestReadRemoteRefsFromClone(GitSweepTestCase):
+
+    """
+    The refs read from a clone match the ones GitPython finds.
+
+    """
+    def test_matches_gitpython(self):
+        """
+        Every remote ref of the clone is found with the right commit.
+        """
+        for i in range(1, 4):
+            self.command('git checkout -b branch{0}'.format(i))
+            self.make_commit()
+            self.command('git checkout master')
+
+        remote = self.remote
+        remote.git.pack_refs('--all')
+
+        # One loose ref on top of the packed ones
+        self.command('git checkout -b branch4')
+        self.make_commit()
+        self.command('git checkout master')
+        remote = self.remote
+
+        expected = sorted([(i.remote_head, i.commit.hexsha)
+            for i in remote.remotes[0].refs])
+
+        self.assertEqual(expected, [(i.remote_head, i.sha)
+            for i in list(RefTable.read(remote.git_dir, 'origin'))])
+
+    def test_table(self):
+        """
+        The table has the refs that are read, and an inspection reads them
+        only once.
+        """
+        self.command('git checkout -b branch1')
+        self.make_commit()
+        self.command('git checkout master')
+
+        remote = self.remote
+
+        self.assertEqual(list(RefTable.read(remote.git_dir, 'origin')),
+            list(RefTable.read(remote.git_dir, 'origin')))
+
+        with patch.object(RefTable, 'read',
+                side_effect=RefTable.read) as read:
+            Inspector(remote).merged_refs()
+
+        self.assertEqual(1, read.call_count)
+
+    def test_memory_budget(self):
+        """
+        A run that inspects 100,000 refs stays within the budget.
+        """
+        sha = self.remote.remotes[0].refs.master.commit.hexsha
+        filename = join(self.remote.git_dir, 'packed-refs')
+        with open(filename, 'w') as fh:
+            fh.write('# pack-refs with: peeled fully-peeled sorted \n')
+            for i in range(100000):
+                fh.write('{0} refs/remotes/origin/feature/'
+                    'team-{1:05d}-some-branch\n'.format(sha, i))
+
+        # A fresh interpreter, so the peak is only this run's. Linux gives
+        # the peak in kilobytes.
+        script = '\n'.join([
+            'import resource',
+            'from git import Repo',
+            'from gitsweep.inspector import Inspector',
+            'repo = Repo({0!r})'.format(self.remote.working_dir),
+            'def peak():',
+            '    usage = resource.getrusage(resource.RUSAGE_SELF)',
+            '    return usage.ru_maxrss * 1024',
+            'before = peak()',
+            'merged = sum([i[1] for i in Inspector(repo).iter_verdicts()])',
+            'print merged, peak() - before'])
+        env = dict(environ, PYTHONPATH=pathsep.join(sys.path))
+        proc = Popen([sys.executable, '-c', script], stdout=PIPE, env=env)
+        (merged, used) = proc.communicate()[0].split()
+
+        self.assertEqual(100000, int(merged))
+        self.assertTrue(int(used) <= RefTable.MEMORY_BUDGET, used)
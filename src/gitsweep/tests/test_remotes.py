@@ -0,0 +1,132 @@
+from tempfile import mkdtemp
+from shutil import rmtree
+
+from git import Repo
+from git.cmd import Git
+
+from mock import patch
+
+from gitsweep import timings
+from gitsweep import patchindex
+from gitsweep.remotes import MultiRemoteInspector, fetch_remotes
+from gitsweep.tests.testcases import GitSweepTestCase
+
+
+class TestMultipleRemotes(GitSweepTestCase):
+
+    """
+    Several remotes can be swept together.
+
+    """
+    def setUp(self):
+        super(TestMultipleRemotes, self).setUp()
+
+        self.command('git checkout -b branch1')
+        self.make_commit()
+        self.command('git checkout master')
+        self.command('git merge branch1')
+        self.command('git checkout -b branch2')
+        self.make_commit()
+        self.command('git checkout master')
+
+        # A fork that has the same branches and one more
+        self.forkdir = mkdtemp()
+        self.fork = Repo.clone(self.repo, self.forkdir)
+        for name in ('branch1', 'branch2'):
+            self.fork.git.branch(name, 'origin/{0}'.format(name))
+        self.fork.git.branch('feature', 'branch1')
+
+        self.clone = self.remote
+        self.clone.create_remote('upstream', self.forkdir)
+
+    def tearDown(self):
+        super(TestMultipleRemotes, self).tearDown()
+
+        timings.stop()
+        rmtree(self.forkdir)
+
+    def merged_refs(self, **kwargs):
+        inspector = MultiRemoteInspector(self.clone, ['origin', 'upstream'],
+            **kwargs)
+        return [i.name for i in inspector.merged_refs()]
+
+    def test_fetch_remotes(self):
+        """
+        Fetches all of the remotes.
+        """
+        fetch_remotes(self.clone, ['origin', 'upstream'])
+
+        self.assertTrue('feature' in
+            [i.remote_head for i in self.clone.remotes.upstream.refs])
+
+    def test_merged_refs(self):
+        """
+        Finds the merged refs of each of the remotes.
+        """
+        fetch_remotes(self.clone, ['origin', 'upstream'])
+
+        self.assertEqual(['origin/branch1', 'upstream/branch1',
+            'upstream/feature'], self.merged_refs())
+
+    def test_shares_work(self):
+        """
+        Remotes with the same master are inspected together, a commit that
+        is on several of them is looked at once.
+        """
+        fetch_remotes(self.clone, ['origin', 'upstream'])
+
+        recorded = timings.start()
+        self.merged_refs(commit_graph=False)
+
+        self.assertEqual(1, recorded.commands['rev-list'])
+        self.assertFalse('cherry' in recorded.commands)
+
+    def test_different_masters(self):
+        """
+        Remotes whose master branches differ are inspected separately.
+        """
+        Git(self.forkdir).execute(['git', 'merge', 'origin/branch2'])
+        fetch_remotes(self.clone, ['origin', 'upstream'])
+
+        self.assertEqual(['origin/branch1', 'upstream/branch1',
+            'upstream/branch2', 'upstream/feature'], self.merged_refs())
+
+    def test_skip(self):
+        """
+        Skipped branches are skipped on every remote.
+        """
+        fetch_remotes(self.clone, ['origin', 'upstream'])
+
+        inspector = MultiRemoteInspector(self.clone, ['origin', 'upstream'])
+
+        self.assertEqual(['upstream/feature'],
+            [i.name for i in inspector.merged_refs(skip=['branch1'])])
+
+    def test_shares_history(self):
+        """
+        Forks whose masters differ by a commit each share the tips merged
+        before it and the patch-ids of the history they have in common.
+        """
+        Git(self.forkdir).execute(['git', 'merge', 'origin/branch2'])
+        self.make_commit()
+        fetch_remotes(self.clone, ['origin', 'upstream'])
+
+        computed = []
+        original = patchindex._patch_ids
+
+        def patch_ids(working_dir, commits):
+            computed.extend(commits)
+            return original(working_dir, commits)
+
+        with patch('gitsweep.patchindex._patch_ids', side_effect=patch_ids):
+            self.assertEqual(['origin/branch1', 'upstream/branch1',
+                'upstream/branch2', 'upstream/feature'],
+                self.merged_refs(detection='patch-id', commit_graph=False))
+
+        # Each master commit had its patch-id worked out once, branch2's
+        # commit is checked as a branch too
+        masters = self.clone.git.rev_list(
+            'origin/master', 'upstream/master', '^origin/branch2').split()
+        computed = [i for i in computed if i in masters]
+        self.assertEqual(sorted(set(computed)), sorted(computed))
+        self.assertEqual(sorted(masters), sorted(computed))
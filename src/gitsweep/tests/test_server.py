@@ -0,0 +1,189 @@
+import socket
+from os.path import join, exists
+from tempfile import mkdtemp
+from shutil import rmtree
+from threading import Thread
+
+from gitsweep import timings
+from gitsweep.server import MergeIndex, SweepServer, query
+from gitsweep.tests.testcases import GitSweepTestCase
+
+
+class ServerTestCase(GitSweepTestCase):
+
+    """
+    Makes a repository with a merged and an unmerged branch.
+
+    """
+    def setUp(self):
+        super(ServerTestCase, self).setUp()
+
+        for name in ('merged', 'unmerged'):
+            self.command('git checkout -b {0}'.format(name))
+            self.make_commit()
+            self.command('git checkout master')
+        self.command('git merge merged')
+
+    def tearDown(self):
+        super(ServerTestCase, self).tearDown()
+
+        timings.stop()
+
+    def merge_another(self, name):
+        """
+        Makes branch ``name``, merges it and fetches it into the clone.
+        """
+        self.command('git checkout -b {0}'.format(name))
+        self.make_commit()
+        self.command('git checkout master')
+        self.command('git merge {0}'.format(name))
+        self.update_remote()
+class TestMergeIndex(ServerTestCase):
+
+    """
+    The verdicts are kept in memory and refreshed as the refs move.
+
+    """
+    def test_refresh(self):
+        """
+        Only refs that moved are inspected again.
+        """
+        index = MergeIndex(self.remote)
+
+        self.assertEqual(2, index.refresh())
+        self.assertEqual(['merged'],
+            [i.remote_head for i in index.merged_refs()])
+
+        recorded = timings.start()
+        self.assertEqual(0, index.refresh())
+        self.assertEqual({}, recorded.commands)
+
+        self.merge_another('another')
+
+        self.assertEqual(2, index.refresh())
+        self.assertEqual(['another', 'merged'],
+            [i.remote_head for i in index.merged_refs()])
+        self.assertEqual(self.remote.commit('origin/master').hexsha,
+            index.master_sha)
+
+    def test_patterns(self):
+        """
+        Queries can skip and include branches.
+        """
+        self.merge_another('another')
+
+        index = MergeIndex(self.remote)
+        index.refresh()
+
+        self.assertEqual(['merged'], [i.remote_head
+            for i in index.merged_refs(skip=['an*'])])
+        self.assertEqual(['another'], [i.remote_head
+            for i in index.merged_refs(include=['an*'])])
+
+
+class TestSweepServer(ServerTestCase):
+
+    """
+    Previews are answered on a Unix socket.
+
+    """
+    def setUp(self):
+        super(TestSweepServer, self).setUp()
+
+        self.socketdir = mkdtemp()
+        self.socket_path = join(self.socketdir, 'serve.sock')
+
+        self.server = SweepServer(self.socket_path, MergeIndex(self.remote))
+        self.thread = Thread(target=self.server.serve)
+        self.thread.start()
+
+    def tearDown(self):
+        if self.thread.is_alive():
+            self.server.stop()
+            self.thread.join()
+
+        rmtree(self.socketdir)
+
+        super(TestSweepServer, self).tearDown()
+
+    def test_preview(self):
+        """
+        Answers with the merged branches.
+        """
+        answer = query(self.socket_path, {'action': 'preview'})
+
+        self.assertEqual(True, answer['ok'])
+        self.assertEqual(0, answer['inspected'])
+        self.assertEqual([{'name': 'merged',
+            'sha': self.remote.commit('origin/merged').hexsha}],
+            answer['merged'])
+
+        self.merge_another('another')
+
+        answer = query(self.socket_path,
+            {'action': 'preview', 'skip': ['merged']})
+
+        self.assertEqual(['another'], [i['name'] for i in answer['merged']])
+
+    def test_status(self):
+        """
+        Describes the index.
+        """
+        answer = query(self.socket_path, {'action': 'status'})
+
+        self.assertEqual(2, answer['refs'])
+        self.assertEqual(1, answer['merged'])
+        self.assertEqual('origin', answer['remote'])
+
+    def test_errors(self):
+        """
+        Requests that can't be answered get an error back.
+        """
+        answer = query(self.socket_path, {'action': 'cleanup'})
+
+        self.assertEqual(False, answer['ok'])
+        self.assertEqual('Unknown action: cleanup', answer['error'])
+
+    def test_stop(self):
+        """
+        Stops and removes the socket.
+        """
+        self.assertEqual({'ok': True},
+            query(self.socket_path, {'action': 'stop'}))
+
+        self.thread.join()
+
+        self.assertFalse(exists(self.socket_path))
+
+    def test_already_serving(self):
+        """
+        A second server can't listen on the same socket.
+        """
+        query(self.socket_path, {'action': 'status'})
+
+        self.assertRaises(RuntimeError, SweepServer, self.socket_path,
+            MergeIndex(self.remote))
+
+    def test_stale_socket(self):
+        """
+        A socket left behind is replaced.
+        """
+        stale_path = join(self.socketdir, 'stale.sock')
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(stale_path)
+        stale.close()
+
+        server = SweepServer(stale_path, MergeIndex(self.remote))
+        server.server_close()
+
+    def test_not_a_socket(self):
+        """
+        A file that is not a socket is left alone.
+        """
+        path = join(self.socketdir, 'file')
+        with open(path, 'w') as fh:
+            fh.write('keep me')
+
+        self.assertRaises(RuntimeError, SweepServer, path,
+            MergeIndex(self.remote))
+        self.assertTrue(exists(path))
@@ -0,0 +1,56 @@
+from os.path import join
+from tempfile import mkdtemp
+from shutil import rmtree
+from unittest import TestCase
+
+from gitsweep.snapshot import RefSnapshot
+
+
+class TestRefSnapshot(TestCase):
+
+    """
+    The refs seen by a run can be saved and read back by the next one.
+
+    """
+    def setUp(self):
+        self.snapshotdir = mkdtemp()
+        self.snapshot = RefSnapshot(
+            join(self.snapshotdir, 'git-sweep', 'refs-origin'))
+
+    def tearDown(self):
+        rmtree(self.snapshotdir)
+
+    def test_no_snapshot(self):
+        """
+        Nothing is loaded before the first save.
+        """
+        self.assertEqual(None, self.snapshot.load('master'))
+
+    def test_save_and_load(self):
+        """
+        The master commit and the refs are read back.
+        """
+        refs = {'branch1': ('a' * 40, True), 'branch2': ('b' * 40, False)}
+
+        self.snapshot.save('master', 'c' * 40, refs)
+
+        self.assertEqual(('c' * 40, refs), self.snapshot.load('master'))
+
+    def test_other_master_branch(self):
+        """
+        A snapshot taken against another master branch is not used.
+        """
+        self.snapshot.save('master', 'c' * 40, {})
+
+        self.assertEqual(None, self.snapshot.load('develop'))
+
+    def test_damaged_file(self):
+        """
+        A snapshot that cannot be read is ignored.
+        """
+        self.snapshot.save('master', 'c' * 40, {})
+
+        with open(self.snapshot.filename, 'w') as fh:
+            fh.write('{"master')
+
+        self.assertEqual(None, self.snapshot.load('master'))
@@ -0,0 +1,106 @@
+from unittest import TestCase
+
+from gitsweep import timings
+from gitsweep.timings import Timings
+
+
+class FakeClock(object):
+
+    """
+    A clock that moves one second every time it is read.
+
+    """
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        self.now += 1
+        return self.now
+
+
+class TestTimings(TestCase):
+
+    """
+    Phases, git commands and refs are recorded.
+
+    """
+    def tearDown(self):
+        timings.stop()
+
+    def test_phases_add_up(self):
+        """
+        A phase entered twice adds up and keeps its place.
+        """
+        recorded = Timings(clock=FakeClock())
+
+        with recorded.phase('fetch'):
+            pass
+        with recorded.phase('inspect'):
+            pass
+        with recorded.phase('fetch'):
+            pass
+
+        self.assertEqual([['fetch', 2], ['inspect', 1]], recorded.phases)
+
+    def test_nested_phases_in_order_entered(self):
+        """
+        An outer phase is listed before the phases inside it.
+        """
+        recorded = Timings(clock=FakeClock())
+
+        with recorded.phase('total'):
+            with recorded.phase('inspect'):
+                pass
+
+        self.assertEqual(['total', 'inspect'],
+            [i[0] for i in recorded.phases])
+
+    def test_slowest_refs(self):
+        """
+        The slowest refs come first.
+        """
+        recorded = Timings()
+        recorded.ref('branch1', 0.5)
+        recorded.ref('branch2', 2.0)
+        recorded.ref('branch3', 1.0)
+
+        self.assertEqual([('branch2', 2.0), ('branch3', 1.0)],
+            recorded.slowest_refs(2))
+
+    def test_as_dict(self):
+        """
+        The timings can be written as JSON.
+        """
+        recorded = Timings(clock=FakeClock())
+        with recorded.phase('fetch'):
+            recorded.command(['fetch', 'origin'])
+        recorded.command(['cherry', 'a', 'b'])
+        recorded.command(['cherry', 'a', 'c'])
+        recorded.ref('branch1', 1.0)
+
+        self.assertEqual({
+            'phases': [{'name': 'fetch', 'seconds': 1}],
+            'commands': {'fetch': 1, 'cherry': 2},
+            'command_count': 3,
+            'refs_checked': 1,
+            'slowest_refs': [{'name': 'branch1', 'seconds': 1.0}]},
+            recorded.as_dict())
+
+    def test_nothing_recorded_unless_started(self):
+        """
+        The module level helpers do nothing until recording starts.
+        """
+        timings.command(['cherry'])
+        with timings.phase('inspect'):
+            pass
+
+        recorded = timings.start()
+        timings.command(['cherry'])
+        with timings.phase('inspect'):
+            pass
+
+        self.assertTrue(recorded is timings.stop())
+        timings.command(['cherry'])
+
+        self.assertEqual({'cherry': 1}, recorded.commands)
+        self.assertEqual(['inspect'], [i[0] for i in recorded.phases])
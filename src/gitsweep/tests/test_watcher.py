@@ -0,0 +1,122 @@
+from os.path import join
+from tempfile import mkdtemp
+from shutil import rmtree
+from unittest import TestCase
+
+from mock import patch
+
+from gitsweep.inotify import Inotify, InotifyUnavailable, IN_CLOSE_WRITE
+from gitsweep.server import MergeIndex
+from gitsweep.watcher import RefWatcher
+from gitsweep.tests.testcases import GitSweepTestCase
+
+
+class TestInotify(TestCase):
+
+    """
+    Files can be watched with inotify.
+
+    """
+    def setUp(self):
+        self.directory = mkdtemp()
+        self.inotify = Inotify()
+
+    def tearDown(self):
+        self.inotify.close()
+        rmtree(self.directory)
+
+    def test_events(self):
+        """
+        Reads the events of a watched directory.
+        """
+        wd = self.inotify.add_watch(self.directory, IN_CLOSE_WRITE)
+
+        self.assertEqual([], self.inotify.read(0))
+
+        with open(join(self.directory, 'packed-refs'), 'w') as fh:
+            fh.write('')
+
+        self.assertEqual([(wd, IN_CLOSE_WRITE, 'packed-refs')],
+            self.inotify.read(1))
+
+    def test_missing(self):
+        """
+        A path that does not exist can't be watched.
+        """
+        self.assertEqual(None, self.inotify.add_watch(
+            join(self.directory, 'missing'), IN_CLOSE_WRITE))
+
+
+class TestRefWatcher(GitSweepTestCase):
+
+    """
+    Changes to the merged branches are reported as the refs move.
+
+    """
+    def setUp(self):
+        super(TestRefWatcher, self).setUp()
+
+        self.merge('merged')
+
+        self.watcher = RefWatcher(MergeIndex(self.remote), settle=0.05,
+            poll_interval=0.05)
+
+    def tearDown(self):
+        self.watcher.close()
+
+        super(TestRefWatcher, self).tearDown()
+
+    def merge(self, name):
+        self.command('git checkout -b {0}'.format(name))
+        self.make_commit()
+        self.command('git checkout master')
+        self.command('git merge {0}'.format(name))
+
+    def names(self, changes):
+        """
+        Returns the branch names of ``(added, removed)``.
+        """
+        return tuple([[i.remote_head for i in refs] for refs in changes])
+
+    def assertWatches(self):
+        self.assertEqual((['merged'], []), self.names(self.watcher.start()))
+        self.assertEqual(([], []), self.names(self.watcher.changes(0.05)))
+
+        # Nested directories that are made later are watched too
+        self.merge('feature/new')
+        self.update_remote()
+        self.assertEqual((['feature/new'], []),
+            self.names(self.watcher.changes(5)))
+
+        self.command('git branch -d merged')
+        self.remote.git.fetch('--prune')
+
+        self.assertEqual(([], ['merged']), self.names(self.watcher.changes(5)))
+
+    def test_inotify(self):
+        """
+        Reports the branches that were merged or deleted.
+        """
+        self.assertWatches()
+
+        self.assertTrue(self.watcher._inotify is not None)
+
+    def test_polling(self):
+        """
+        Without inotify the refs are looked at from time to time.
+        """
+        with patch('gitsweep.watcher.Inotify',
+                side_effect=InotifyUnavailable):
+            self.assertWatches()
+
+        self.assertEqual(None, self.watcher._inotify)
+
+    def test_pack_refs(self):
+        """
+        Packing the refs is noticed but changes nothing.
+        """
+        self.watcher.start()
+
+        self.remote.git.pack_refs('--all')
+
+        self.assertEqual(([], []), self.names(self.watcher.changes(1)))
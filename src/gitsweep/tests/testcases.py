@@ -114,7 +114,15 @@ class GitSweepTestCase(TestCase):
         """
         Clones the test case's repository and tracks it as a remote.
 
-        Returns a ``git.Repo`` object.
+        Returns a ``git.Repo`` object, see :py:meth:`update_remote`.
+        """
+        return self.update_remote()
+
+    def update_remote(self):
+        """
+        Clones the test case's repository the first time and pulls from it.
+
+        Returns the clone as a ``git.Repo`` object.
         """
         if not self._remote:
             clonedir = mkdtemp()
@@ -174,7 +182,7 @@ class InspectorTestCase(TestCase):
         Get a list of branch names from merged refs from self.inspector.
 
         By default, it returns a list of branch names. You can return the
-        actual ``git.RemoteRef`` objects by passing ``refobjs=True``.
+        actual ``gitsweep.refs.RefRecord`` objects by passing ``refobjs=True``.
         """
         refs = self.inspector.merged_refs()
 
@@ -0,0 +1,160 @@
+import time
+from contextlib import contextmanager
+from threading import Lock
+
+
+class Timings(object):
+
+    """
+    How long each phase of a run took and what it asked git to do.
+
+    Phases are named, a phase that is entered more than once adds up. Every
+    git command that is run is counted by its subcommand, and refs that had to
+    be checked on their own record how long that took.
+
+    """
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.phases = []
+        self.commands = {}
+        self.refs = {}
+        self._lock = Lock()
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Times the code run inside the context as phase ``name``.
+        """
+        # Phases are listed in the order they were entered
+        self.add_phase(name, 0)
+
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.add_phase(name, self.clock() - start)
+
+    def add_phase(self, name, seconds):
+        """
+        Adds ``seconds`` to phase ``name``.
+        """
+        with self._lock:
+            for phase in self.phases:
+                if phase[0] == name:
+                    phase[1] += seconds
+                    return
+            self.phases.append([name, seconds])
+
+    def command(self, args):
+        """
+        Counts a run of the git binary with ``args``.
+        """
+        name = args[0] if args else ''
+
+        with self._lock:
+            self.commands[name] = self.commands.get(name, 0) + 1
+
+    def ref(self, name, seconds):
+        """
+        Records that checking the ref ``name`` took ``seconds``.
+        """
+        with self._lock:
+            self.refs[name] = self.refs.get(name, 0) + seconds
+
+    def slowest_refs(self, count=10):
+        """
+        Returns up to ``count`` of ``(name, seconds)``, slowest first.
+        """
+        return sorted(self.refs.items(), key=lambda i: (-i[1], i[0]))[:count]
+
+    def as_dict(self, slowest=10):
+        """
+        Returns the timings in a form that can be written as JSON.
+        """
+        return {
+            'phases': [{'name': name, 'seconds': seconds}
+                for name, seconds in self.phases],
+            'commands': dict(self.commands),
+            'command_count': sum(self.commands.values()),
+            'refs_checked': len(self.refs),
+            'slowest_refs': [{'name': name, 'seconds': seconds}
+                for name, seconds in self.slowest_refs(slowest)]}
+
+    def report(self, slowest=10):
+        """
+        Returns the timings as text for people to read.
+        """
+        lines = ['Timings:', '']
+        for name, seconds in self.phases:
+            lines.append('  {0:<24} {1:8.3f}s'.format(name, seconds))
+
+        lines.extend(['', 'Git commands: {0}'.format(
+            sum(self.commands.values())), ''])
+        for name, count in sorted(self.commands.items()):
+            lines.append('  {0:<24} {1:8d}'.format(name, count))
+
+        refs = self.slowest_refs(slowest)
+        if refs:
+            lines.extend(['', 'Slowest branches:', ''])
+            for name, seconds in refs:
+                lines.append('  {0:<24} {1:8.3f}s'.format(name, seconds))
+
+        return '\n'.join(lines) + '\n'
+
+
+#: The timings being recorded, see :py:func:`start`
+_current = None
+
+
+def start(timings=None):
+    """
+    Starts recording into ``timings``, or a new ``Timings``, and returns it.
+
+    Until :py:func:`stop` is called the phases, git commands and refs that
+    git-sweep reports through this module are added to it.
+    """
+    global _current
+    _current = timings or Timings()
+
+    return _current
+
+
+def stop():
+    """
+    Stops recording and returns the timings that were recorded, if any.
+    """
+    global _current
+    (timings, _current) = (_current, None)
+
+    return timings
+
+
+@contextmanager
+def phase(name):
+    """
+    Times phase ``name`` if timings are being recorded.
+    """
+    timings = _current
+    if timings is None:
+        yield
+    else:
+        with timings.phase(name):
+            yield
+
+
+def command(args):
+    """
+    Counts a git command if timings are being recorded.
+    """
+    timings = _current
+    if timings is not None:
+        timings.command(args)
+
+
+def ref(name, seconds):
+    """
+    Records how long a ref took if timings are being recorded.
+    """
+    timings = _current
+    if timings is not None:
+        timings.ref(name, seconds)
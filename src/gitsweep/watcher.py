@@ -0,0 +1,189 @@
+import time
+from os import walk
+from os.path import join, isdir
+
+from .inotify import Inotify, InotifyUnavailable, IN_MODIFY, \
+    IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE, IN_DELETE, \
+    IN_DELETE_SELF, IN_Q_OVERFLOW, IN_IGNORED, IN_ISDIR
+from .refs import common_dir
+
+#: Events that mean a ref may have moved
+REF_EVENTS = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+    IN_CREATE | IN_DELETE | IN_DELETE_SELF)
+
+#: The files in the Git directory whose changes are watched
+GIT_DIR_FILES = ('packed-refs', 'FETCH_HEAD')
+
+
+class RefWatcher(object):
+
+    """
+    Reports the changes to the merged branches as the remote refs move.
+
+    ``index`` is a :py:class:`gitsweep.server.MergeIndex`. When
+    ``packed-refs``, ``FETCH_HEAD`` or anything below
+    ``refs/remotes/<remote>`` changes, the index is refreshed, which only
+    inspects the refs that moved, and the branches that became or stopped
+    being merged are reported. ``skip`` and ``include`` are patterns, see
+    :py:class:`gitsweep.patterns.RefMatcher`.
+
+    The files are watched with inotify. Where there is none they are looked
+    at every ``poll_interval`` seconds instead. Git writes refs a few files
+    at a time, so after the first change nothing is done until there have
+    been no more for ``settle`` seconds.
+
+    """
+    def __init__(self, index, skip=[], include=[], settle=0.2,
+            poll_interval=2.0):
+        self.index = index
+        self.skip = skip
+        self.include = include
+        self.settle = settle
+        self.poll_interval = poll_interval
+
+        repo = index.repo
+        self.git_dir = repo.git_dir
+        self.common_dir = common_dir(repo.git_dir)
+        self.remotes_dir = join(self.common_dir, 'refs', 'remotes')
+        self.refs_dir = join(self.remotes_dir, index.remote_name)
+
+        self._merged = {}
+        self._inotify = None
+        self._dirs = {}
+
+    def start(self):
+        """
+        Starts watching and returns the merged branches there are now.
+
+        They are returned as the first ``(added, removed)`` change, see
+        :py:meth:`changes`.
+        """
+        try:
+            self._inotify = Inotify()
+        except InotifyUnavailable:
+            self._inotify = None
+
+        if self._inotify is not None:
+            for directory in (self.git_dir, self.common_dir):
+                self._watch_dir(directory, recursive=False)
+            self._watch_dir(self.remotes_dir, recursive=False)
+            self._watch_dir(self.refs_dir, recursive=True)
+
+        return self._refresh()
+
+    def changes(self, timeout=None):
+        """
+        Waits for the refs to move and returns ``(added, removed)``.
+
+        ``added`` are the refs that are merged now and were not before, and
+        ``removed`` the ones that were merged and are not any more, or moved
+        or were deleted. Both are empty if nothing happened within
+        ``timeout`` seconds.
+        """
+        if self._inotify is None:
+            time.sleep(self.poll_interval if timeout is None
+                else min(timeout, self.poll_interval))
+            return self._refresh()
+
+        if not self._relevant(self._inotify.read(timeout)):
+            return ([], [])
+
+        # Wait for git to finish writing
+        while self._relevant(self._inotify.read(self.settle)):
+            pass
+
+        return self._refresh()
+
+    def watch(self):
+        """
+        Yields ``(added, removed)`` for the merged branches there are now and
+        then for every change, until the caller stops.
+        """
+        try:
+            yield self.start()
+
+            while True:
+                (added, removed) = self.changes()
+                if added or removed:
+                    yield (added, removed)
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Stops watching.
+        """
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+        self._dirs = {}
+
+    def _refresh(self):
+        """
+        Refreshes the index and returns what changed since the last time.
+        """
+        self.index.refresh()
+
+        merged = dict([(i.remote_head, i) for i in self.index.merged_refs(
+            skip=self.skip, include=self.include)])
+
+        added = [merged[i] for i in sorted(merged)
+            if self._merged.get(i) != merged[i]]
+        removed = [self._merged[i] for i in sorted(self._merged)
+            if merged.get(i) != self._merged[i]]
+
+        self._merged = merged
+
+        return (added, removed)
+
+    def _watch_dir(self, directory, recursive):
+        """
+        Watches ``directory``, and the directories in it if ``recursive``.
+        """
+        if not isdir(directory):
+            return
+
+        for dirpath, dirnames, filenames in walk(directory):
+            wd = self._inotify.add_watch(dirpath, REF_EVENTS)
+            if wd is not None:
+                self._dirs[wd] = dirpath
+            if not recursive:
+                break
+
+    def _relevant(self, events):
+        """
+        Returns True if any of ``events`` can mean that a remote ref moved.
+
+        Directories that are made below the watched refs are watched too, so
+        nothing written into them is missed.
+        """
+        relevant = False
+
+        for wd, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost, anything may have changed
+                relevant = True
+                continue
+
+            directory = self._dirs.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_IGNORED:
+                del self._dirs[wd]
+                continue
+
+            path = join(directory, name)
+
+            if directory in (self.git_dir, self.common_dir):
+                if name in GIT_DIR_FILES:
+                    relevant = True
+            elif directory == self.remotes_dir:
+                if path == self.refs_dir and mask & IN_ISDIR:
+                    self._watch_dir(path, recursive=True)
+                    relevant = True
+            elif not name.endswith('.lock'):
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                    self._watch_dir(path, recursive=True)
+                relevant = True
+
+        return relevant